@@ -0,0 +1,4 @@
+from app.benchmarks.harness import compare, measure, percentile
+from app.benchmarks.scenarios import SCENARIOS, run_scenarios
+
+__all__ = ["SCENARIOS", "compare", "measure", "percentile", "run_scenarios"]
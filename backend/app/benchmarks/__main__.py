@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+
+import httpx
+
+from app.benchmarks.harness import compare, format_table
+from app.benchmarks.scenarios import SCENARIOS, run_scenarios
+
+# python -m app.benchmarks [--scenario list ...] [--base-url URL]
+#     [--output results.json] [--baseline baseline.json] [--threshold 0.2]
+#
+# By default the app is driven in-process through httpx.ASGITransport,
+# against the database in MONGODB_URL, or the in-process storage engine
+# with STORAGE_BACKEND=memory. --base-url benchmarks a running
+# server instead (e.g. uvicorn app.main:app --workers 4); start it with
+# RATE_LIMIT_ENABLED=false and the same JWT secret as this process.
+
+
+@asynccontextmanager
+async def in_process_client():
+    from asgi_lifespan import LifespanManager
+
+    from app.main import app
+
+    async with LifespanManager(app):
+        # Benchmarks deliberately hammer single users and addresses
+        app.state.rate_limit_backend = None
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            yield client
+
+
+@asynccontextmanager
+async def remote_client(base_url: str):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        yield client
+
+
+async def main(args) -> int:
+    connect = remote_client(args.base_url) if args.base_url else in_process_client()
+    async with connect as client:
+        results = await run_scenarios(
+            client, args.scenario, args.concurrency, args.scale
+        )
+
+    print(format_table(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.benchmarks")
+    parser.add_argument(
+        "--scenario", action="append", choices=list(SCENARIOS),
+        help="scenario to run (repeatable, default: all)",
+    )
+    parser.add_argument("--base-url", help="benchmark a running server")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--scale", type=float, default=1.0,
+        help="multiply every scenario's request count",
+    )
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="fail on regressions against this JSON")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,96 @@
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    # Nearest-rank percentile of the latency samples
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def measure(
+    name: str,
+    requests: int,
+    concurrency: int,
+    call: Callable[[int], Awaitable[httpx.Response]],
+    expected: tuple[int, ...] = (200,),
+) -> dict:
+    # call(i) sends request i; `concurrency` workers share the numbers so
+    # at most that many requests are in flight at once
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                res = await call(i)
+                ok = res.status_code in expected
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(min(concurrency, requests))])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> list[str]:
+    # A scenario regresses when req/s drops, or p95 grows, by more than
+    # `threshold` (0.2 = 20%) against the stored baseline
+    previous = {result["scenario"]: result for result in baseline}
+    regressions = []
+
+    for result in results:
+        base = previous.get(result["scenario"])
+        if base is None:
+            continue
+
+        name = result["scenario"]
+        if result["errors"] > base["errors"]:
+            regressions.append(
+                f"{name}: {result['errors']} errors (baseline {base['errors']})"
+            )
+        if result["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {result['rps']} req/s (baseline {base['rps']})"
+            )
+        if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']} ms (baseline {base['p95_ms']})"
+            )
+
+    return regressions
+
+
+def format_table(results: list[dict]) -> str:
+    header = f"{'scenario':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(
+            f"{r['scenario']:<22}{r['rps']:>10}{r['p50_ms']:>10}"
+            f"{r['p95_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}"
+        )
+    return "\n".join(lines)
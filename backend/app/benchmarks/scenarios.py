@@ -0,0 +1,184 @@
+from typing import Awaitable, Callable
+
+import httpx
+
+from app.benchmarks.harness import measure
+from app.core.jwt import create_access_token
+
+# Everything the benchmarks write lives in this category and is removed
+# afterwards, so a run can target a shared development database.
+CATEGORY = "Benchmark"
+CATALOGUE_SIZE = 500
+BENCH_EMAIL = "benchmark@test.com"
+BENCH_PASSWORD = "benchmark-password"
+
+
+def bearer(sub: str, role: str = "user") -> dict:
+    token = create_access_token({"sub": sub, "role": role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+ADMIN = bearer("benchmark-admin@test.com", "admin")
+USER = bearer("benchmark-user@test.com")
+
+
+def sweet_rows(count: int, prefix: str = "Bench Sweet") -> list[dict]:
+    return [
+        {
+            "name": f"{prefix} {i:05d}",
+            "category": CATEGORY,
+            "price": 1 + i % 50,
+            "quantity": 100,
+        }
+        for i in range(count)
+    ]
+
+
+async def seed(client: httpx.AsyncClient) -> None:
+    res = await client.post(
+        "/api/sweets/bulk", json=sweet_rows(CATALOGUE_SIZE), headers=ADMIN
+    )
+    res.raise_for_status()
+
+
+async def cleanup(client: httpx.AsyncClient) -> None:
+    # Goes through the API so it works against a remote server too
+    res = await client.get(
+        "/api/sweets/search",
+        params={"category": CATEGORY, "fields": "name"},
+        headers=ADMIN,
+    )
+    for sweet in res.json():
+        await client.delete(f"/api/sweets/{sweet['_id']}", headers=ADMIN)
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+# Each takes the client, a request count and a concurrency level, and
+# returns one measure() result.
+async def list_scenario(client, requests, concurrency):
+    return await measure(
+        "list",
+        requests,
+        concurrency,
+        lambda i: client.get("/api/sweets", headers=USER),
+    )
+
+
+async def search_scenario(client, requests, concurrency):
+    # Rotating price bands, so the catalogue cache only absorbs repeats
+    return await measure(
+        "search",
+        requests,
+        concurrency,
+        lambda i: client.get(
+            "/api/sweets/search",
+            params={"category": CATEGORY, "min_price": i % 25, "max_price": i % 25 + 10},
+            headers=USER,
+        ),
+    )
+
+
+async def purchase_contention_scenario(
+    client, requests, concurrency, shards: int = 0
+):
+    # Every buyer hits the same sweet; stock runs out halfway, so both
+    # the success and the sold-out paths are timed. Names are unique, so
+    # each variant gets its own sweet.
+    res = await client.post(
+        "/api/sweets",
+        json={
+            "name": f"Bench Contended Ladoo x{shards or 1}",
+            "category": CATEGORY,
+            "price": 5,
+            "quantity": requests // 2,
+        },
+        headers=ADMIN,
+    )
+    res.raise_for_status()
+    sweet_id = res.json()["_id"]
+    if shards:
+        res = await client.post(
+            f"/api/sweets/{sweet_id}/shards", json={"shards": shards}, headers=ADMIN
+        )
+        res.raise_for_status()
+    buyers = [bearer(f"benchmark-buyer{i}@test.com") for i in range(requests)]
+
+    return await measure(
+        "purchase_contention_sharded" if shards else "purchase_contention",
+        requests,
+        concurrency,
+        lambda i: client.post(f"/api/sweets/{sweet_id}/purchase", headers=buyers[i]),
+        expected=(200, 400),
+    )
+
+
+async def purchase_contention_sharded_scenario(client, requests, concurrency):
+    # The same hot sweet with its stock spread over 16 counters
+    return await purchase_contention_scenario(client, requests, concurrency, 16)
+
+
+async def login_scenario(client, requests, concurrency):
+    # 400 when the user is left over from an earlier run
+    await client.post(
+        "/api/auth/register",
+        json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD},
+    )
+    return await measure(
+        "login",
+        requests,
+        concurrency,
+        lambda i: client.post(
+            "/api/auth/login",
+            json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD},
+        ),
+    )
+
+
+async def bulk_import_scenario(client, requests, concurrency):
+    # Each request upserts a 100-row batch
+    return await measure(
+        "bulk_import",
+        requests,
+        concurrency,
+        lambda i: client.post(
+            "/api/sweets/bulk",
+            json=sweet_rows(100, prefix=f"Bench Import {i:04d}"),
+            headers=ADMIN,
+        ),
+    )
+
+
+Scenario = Callable[[httpx.AsyncClient, int, int], Awaitable[dict]]
+
+# name -> (scenario, default request count); login is Argon2-bound, so
+# it runs far fewer requests
+SCENARIOS: dict[str, tuple[Scenario, int]] = {
+    "list": (list_scenario, 500),
+    "search": (search_scenario, 500),
+    "purchase_contention": (purchase_contention_scenario, 1000),
+    "purchase_contention_sharded": (purchase_contention_sharded_scenario, 1000),
+    "login": (login_scenario, 50),
+    "bulk_import": (bulk_import_scenario, 20),
+}
+
+
+async def run_scenarios(
+    client: httpx.AsyncClient,
+    names: list[str] | None = None,
+    concurrency: int = 50,
+    scale: float = 1.0,
+) -> list[dict]:
+    # scale shrinks or grows every scenario's request count
+    results = []
+    await seed(client)
+    try:
+        for name in names or list(SCENARIOS):
+            scenario, requests = SCENARIOS[name]
+            results.append(
+                await scenario(client, max(1, int(requests * scale)), concurrency)
+            )
+    finally:
+        await cleanup(client)
+    return results
@@ -0,0 +1,71 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+CATALOGUE_CACHE_TTL = float(os.getenv("CATALOGUE_CACHE_TTL", "30"))
+CATALOGUE_CACHE_SIZE = int(os.getenv("CATALOGUE_CACHE_SIZE", "256"))
+
+
+# Size-bounded LRU cache whose entries expire after a TTL
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped by clear(); loads that started before a clear are dropped
+        self.generation = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        if generation is not None and generation != self.generation:
+            # A write invalidated the cache while this value was loading
+            return
+
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.generation += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_catalogue_cache() -> Optional[TTLCache]:
+    # CATALOGUE_CACHE_TTL=0 turns catalogue caching off
+    if CATALOGUE_CACHE_TTL <= 0:
+        return None
+    return TTLCache(CATALOGUE_CACHE_SIZE, CATALOGUE_CACHE_TTL)
@@ -1,23 +1,64 @@
+import hashlib
+import os
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
 
-from app.core.jwt import SECRET_KEY, ALGORITHM
+from app.core.cache import TTLCache
+from app.core.jwt import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    InvalidTokenError,
+    decode_access_token,
+)
+from app.core.metrics import JWT_DECODE_LATENCY, TOKEN_CACHE_LOOKUPS
+from app.core.profiling import span
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Verified claims keyed by token hash, so repeat requests skip the HMAC
+# check and JSON parsing. Entries expire with the token itself.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+token_cache = (
+    TTLCache(TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    if TOKEN_CACHE_SIZE > 0
+    else None
+)
+
+
+def verify_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest() if token_cache else None
+    if key:
+        claims = token_cache.get(key)
+        if claims is not None:
+            TOKEN_CACHE_LOOKUPS.inc("hit")
+            return claims
+        TOKEN_CACHE_LOOKUPS.inc("miss")
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
+        with JWT_DECODE_LATENCY.time():
+            claims = decode_access_token(token)
+    except InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
         )
 
-def require_admin(user: dict = Depends(get_current_user)) -> dict:
+    if key:
+        remaining = claims.get("exp", 0) - time.time()
+        if remaining > 0:
+            token_cache.set(key, claims, ttl=remaining)
+    return claims
+
+
+# Both dependencies are async so they run on the event loop instead of
+# taking a threadpool hop on every authenticated request.
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    with span("auth"):
+        return verify_token(token)
+
+
+async def require_admin(user: dict = Depends(get_current_user)) -> dict:
     if user.get("role") != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
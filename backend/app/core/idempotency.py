@@ -0,0 +1,170 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Request, Response, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.responses import dumps
+
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+# "mongo" shares keys across workers; "memory" is per process (tests, dev)
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "mongo").lower()
+MAX_KEY_LENGTH = 255
+
+PENDING = "pending"
+DONE = "done"
+
+
+# -----------------------------
+# Stores
+# -----------------------------
+# claim() reserves a key in one round trip: it returns None when the key is
+# new (the caller now owns it) or the existing record when it is a replay.
+class MongoIdempotencyStore:
+    def __init__(self, collection, ttl: int = IDEMPOTENCY_KEY_TTL):
+        self.collection = collection
+        self.ttl = ttl
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[dict]:
+        # expires_at drives the TTL index on idempotency_keys
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        try:
+            return await self.collection.find_one_and_update(
+                {"_id": key},
+                {
+                    "$setOnInsert": {
+                        "fingerprint": fingerprint,
+                        "status": PENDING,
+                        "expires_at": expires_at,
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            # Lost the upsert race to a concurrent request with this key
+            return {"fingerprint": fingerprint, "status": PENDING}
+
+    async def complete(self, key: str, status_code: int, body: bytes) -> None:
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {"status": DONE, "status_code": status_code, "body": body}},
+        )
+
+    async def release(self, key: str) -> None:
+        await self.collection.delete_one({"_id": key, "status": PENDING})
+
+
+class MemoryIdempotencyStore:
+    def __init__(self, ttl: int = IDEMPOTENCY_KEY_TTL):
+        self.ttl = ttl
+        self._records: dict[str, tuple[float, dict]] = {}
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[dict]:
+        now = time.monotonic()
+        entry = self._records.get(key)
+
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        self._records[key] = (
+            now + self.ttl,
+            {"fingerprint": fingerprint, "status": PENDING},
+        )
+        return None
+
+    async def complete(self, key: str, status_code: int, body: bytes) -> None:
+        entry = self._records.get(key)
+        if entry is not None:
+            entry[1].update(status=DONE, status_code=status_code, body=body)
+
+    async def release(self, key: str) -> None:
+        entry = self._records.get(key)
+        if entry is not None and entry[1]["status"] == PENDING:
+            del self._records[key]
+
+
+def create_idempotency_store(db):
+    if IDEMPOTENCY_STORE == "memory":
+        return MemoryIdempotencyStore()
+    return MongoIdempotencyStore(db["idempotency_keys"])
+
+
+# -----------------------------
+# Request handling
+# -----------------------------
+def _fingerprint(request: Request, body: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _replay(record: dict) -> Response:
+    return Response(
+        record["body"],
+        status_code=record["status_code"],
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def run_idempotent(
+    request: Request,
+    key: Optional[str],
+    user: dict,
+    run: Callable[[], Awaitable[Any]],
+) -> Any:
+    # Without a key (or a store) the write simply runs as before
+    store = getattr(request.app.state, "idempotency_store", None)
+    if not key or store is None:
+        return await run()
+
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Idempotency-Key is too long",
+        )
+
+    # Keys are per user, so clients cannot replay each other's results
+    scoped_key = f"{user['sub']}:{key}"
+    fingerprint = _fingerprint(request, await request.body())
+    record = await store.claim(scoped_key, fingerprint)
+
+    if record is not None:
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="Idempotency-Key was already used for a different request",
+            )
+        if record["status"] != DONE:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is in progress",
+            )
+        return _replay(record)
+
+    try:
+        result = await run()
+    except HTTPException as exc:
+        if exc.status_code >= 500:
+            await store.release(scoped_key)
+            raise
+        # Client errors (out of stock, not found) are part of the outcome
+        # and replay like a success would
+        await store.complete(
+            scoped_key, exc.status_code, dumps({"detail": exc.detail})
+        )
+        raise
+    except BaseException:
+        # Nothing was recorded, so the client may retry with the same key
+        await store.release(scoped_key)
+        raise
+
+    body = dumps(result)
+    await store.complete(scoped_key, status.HTTP_200_OK, body)
+    return Response(body, media_type="application/json")
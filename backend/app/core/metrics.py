@@ -0,0 +1,222 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Minimal Prometheus text-format metrics. Labels are passed positionally
+# in labelnames order to keep the per-request cost to a dict lookup.
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+REGISTRY: list["Metric"] = []
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        # Driver and hashing threads report alongside the event loop
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _labels(self, labels: tuple) -> str:
+        if not labels:
+            return ""
+        pairs = ",".join(
+            f'{name}="{value}"' for name, value in zip(self.labelnames, labels)
+        )
+        return "{" + pairs + "}"
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            return [
+                f"{self.name}{self._labels(labels)} {value}"
+                for labels, value in self._values.items()
+            ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket counts (+Inf last), sum, count
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[labels] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def samples(self) -> list[str]:
+        lines = []
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        with self._lock:
+            for labels, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(bounds, counts):
+                    cumulative += bucket_count
+                    lines.append(
+                        f"{self.name}_bucket{self._bucket_labels(labels, bound)} "
+                        f"{cumulative}"
+                    )
+                lines.append(f"{self.name}_sum{self._labels(labels)} {total}")
+                lines.append(f"{self.name}_count{self._labels(labels)} {count}")
+        return lines
+
+    def _bucket_labels(self, labels: tuple, bound: str) -> str:
+        pairs = [
+            f'{name}="{value}"' for name, value in zip(self.labelnames, labels)
+        ]
+        pairs.append(f'le="{bound}"')
+        return "{" + ",".join(pairs) + "}"
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# Application metrics
+# -----------------------------
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by method, route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by method and route template.",
+    ("method", "route"),
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served.",
+    ("method",),
+)
+MONGO_COMMANDS = Counter(
+    "mongodb_commands_total",
+    "MongoDB commands sent, by command name and outcome.",
+    ("command", "outcome"),
+)
+MONGO_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command round-trip time by command name.",
+    ("command",),
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    "password_hash_duration_seconds",
+    "Argon2 time per operation, excluding time queued for a worker.",
+    ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+JWT_DECODE_LATENCY = Histogram(
+    "jwt_decode_duration_seconds",
+    "Time spent verifying and decoding access tokens on cache misses.",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001),
+)
+TOKEN_CACHE_LOOKUPS = Counter(
+    "token_cache_lookups_total",
+    "Verified-token cache lookups by result.",
+    ("result",),
+)
+PURCHASE_BATCH_SIZE = Histogram(
+    "purchase_coalesced_batch_size",
+    "Purchases written together by the purchase coalescer.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250),
+)
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests rejected with 429 by rate limiter name.",
+    ("limiter",),
+)
+
+
+# -----------------------------
+# Request instrumentation
+# -----------------------------
+class MetricsMiddleware:
+    # Plain ASGI middleware: avoids BaseHTTPMiddleware's per-request task
+    # and body wrapping, so the hot catalogue routes pay almost nothing.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec(method)
+
+            # Label by route template, never the raw path, to keep
+            # cardinality bounded (/api/sweets/{sweet_id}/purchase)
+            route = scope.get("route")
+            path = route.path if route else "unmatched"
+            HTTP_REQUESTS.inc(method, path, str(status_code))
+            HTTP_LATENCY.observe(elapsed, method, path)
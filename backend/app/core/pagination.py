@@ -0,0 +1,53 @@
+import base64
+import json
+from typing import Literal
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+
+# Orders a listing can be paged in; routes take the Literal as their
+# `sort` parameter, so FastAPI rejects anything else with a 422
+SortField = Literal["id", "price"]
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort: str, last: dict) -> str:
+    payload = {"s": sort, "id": str(last["_id"])}
+    if sort == "price":
+        payload["p"] = last["price"]
+
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        last_id = ObjectId(payload["id"])
+        if payload["s"] != sort:
+            raise ValueError("cursor was issued for a different sort")
+        last_price = payload.get("p")
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+    # Keyset condition: strictly after the last document of the previous page
+    if sort == "price":
+        return {
+            "$or": [
+                {"price": {"$gt": last_price}},
+                {"price": last_price, "_id": {"$gt": last_id}},
+            ]
+        }
+    return {"_id": {"$gt": last_id}}
+
+
+def sort_spec(sort: str) -> list[tuple[str, int]]:
+    if sort == "price":
+        return [("price", 1), ("_id", 1)]
+    return [("_id", 1)]
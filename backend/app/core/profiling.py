@@ -0,0 +1,323 @@
+import cProfile
+import functools
+import heapq
+import inspect
+import io
+import itertools
+import os
+import pstats
+import random
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+
+from app.core.jwt import InvalidTokenError, decode_access_token
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+# Share of requests given a span breakdown without being asked for one
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# How many of the slowest profiled requests are kept
+PROFILE_SLOW_REQUESTS = int(os.getenv("PROFILE_SLOW_REQUESTS", "20"))
+PROFILE_STACK_LINES = int(os.getenv("PROFILE_STACK_LINES", "40"))
+PROFILE_HEADER = b"x-profile"
+# Per-command spans from the MongoDB driver. Off by default: Motor drops
+# context variables on its thread pool, and carrying them over means
+# wrapping one of its internals (see app.db.monitoring).
+PROFILE_DRIVER_COMMANDS = (
+    os.getenv("PROFILE_DRIVER_COMMANDS", "false").lower() == "true"
+)
+
+# The profile of the request being served, if it is being profiled. Every
+# hook starts with one lookup here, which is all an unprofiled request pays.
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar(
+    "request_profile", default=None
+)
+
+
+class RequestProfile:
+    def __init__(self, trigger: str):
+        self.trigger = trigger
+        self.started = time.perf_counter()
+        self.spans: list[dict] = []
+        self.depth = 0
+        self.validation: Optional[_Span] = None
+
+    def elapsed_ms(self, since: Optional[float] = None) -> float:
+        return round((time.perf_counter() - (since or self.started)) * 1000, 3)
+
+
+class _Span:
+    __slots__ = ("profile", "name", "started")
+
+    def __init__(self, profile: RequestProfile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.profile.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        profile = self.profile
+        profile.depth -= 1
+        profile.spans.append(
+            {
+                "name": self.name,
+                "depth": profile.depth,
+                "start_ms": round((self.started - profile.started) * 1000, 3),
+                "duration_ms": profile.elapsed_ms(self.started),
+            }
+        )
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    # Times a block of the current request: `with span("auth"): ...`
+    profile = _current.get()
+    if profile is None:
+        return _NO_SPAN
+    return _Span(profile, name)
+
+
+def add_span(name: str, duration: float) -> None:
+    # A span that has just ended, for work timed elsewhere (database
+    # commands). Only appends, so driver threads may call it too.
+    profile = _current.get()
+    if profile is None:
+        return
+    started = time.perf_counter() - duration
+    profile.spans.append(
+        {
+            "name": name,
+            "depth": profile.depth,
+            "start_ms": round((started - profile.started) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        }
+    )
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+def profiled(func):
+    # Span per call of an async method, named Class.method
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return await func(*args, **kwargs)
+        with _Span(profile, name):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    # Route class for every router: profiled requests get a "validate" span
+    # from the route being matched to its endpoint starting, i.e. reading
+    # the body, running dependencies and validating parameters with
+    # Pydantic. Dependencies with spans of their own (auth) nest inside.
+    def __init__(self, path: str, endpoint, **kwargs):
+        if PROFILING_ENABLED and inspect.iscoroutinefunction(endpoint):
+            endpoint = _ends_validation(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not PROFILING_ENABLED:
+            return handler
+
+        async def profiled_handler(request):
+            profile = _current.get()
+            if profile is None:
+                return await handler(request)
+
+            profile.validation = _Span(profile, "validate").__enter__()
+            try:
+                return await handler(request)
+            finally:
+                # Still open when validation failed and the endpoint never ran
+                _end_validation(profile)
+
+        return profiled_handler
+
+
+def _ends_validation(endpoint):
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is not None:
+            _end_validation(profile)
+        return await endpoint(*args, **kwargs)
+
+    return wrapper
+
+
+def _end_validation(profile: RequestProfile) -> None:
+    validation, profile.validation = profile.validation, None
+    if validation:
+        validation.__exit__(None, None, None)
+
+
+# -----------------------------
+# Slow request log
+# -----------------------------
+class SlowRequestLog:
+    # The slowest N profiled requests; once full, a new one only gets in
+    # by pushing out the fastest kept
+    def __init__(self, size: int = PROFILE_SLOW_REQUESTS):
+        self.size = size
+        self._heap: list[tuple[float, int, dict]] = []
+        self._ids = itertools.count(1)
+
+    def add(self, entry: dict) -> None:
+        entry["id"] = next(self._ids)
+        item = (entry["duration_ms"], entry["id"], entry)
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    def list(self) -> list[dict]:
+        # Slowest first, without the (long) call-stack reports
+        return [
+            {k: v for k, v in entry.items() if k != "stack"}
+            for _, _, entry in sorted(self._heap, reverse=True)
+        ]
+
+    def get(self, entry_id: int) -> dict:
+        for _, _, entry in self._heap:
+            if entry["id"] == entry_id:
+                return entry
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    def clear(self) -> None:
+        self._heap = []
+
+
+slow_requests = SlowRequestLog()
+
+
+# -----------------------------
+# Request instrumentation
+# -----------------------------
+class ProfilingMiddleware:
+    # Profiles a request when an admin sends X-Profile: 1, or at random
+    # at PROFILE_SAMPLE_RATE. Sampled requests get spans only; asked-for
+    # ones also get a cProfile call-stack report. cProfile sees the whole
+    # thread, so the report also covers whatever else the event loop ran
+    # meanwhile, and only one request is stack-profiled at a time.
+    def __init__(self, app, log: SlowRequestLog = slow_requests):
+        self.app = app
+        self.log = log
+        self._stack_busy = False
+
+    async def __call__(self, scope, receive, send):
+        trigger = self._trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(trigger)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Spans finished so far, for browser dev tools
+                timing = ", ".join(
+                    f"{s['name']};dur={s['duration_ms']}" for s in profile.spans
+                )
+                if timing:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"server-timing", timing.encode()),
+                    ]
+            await send(message)
+
+        stack = None
+        if trigger == "header" and not self._stack_busy:
+            stack = cProfile.Profile()
+            try:
+                stack.enable()
+                self._stack_busy = True
+            except ValueError:
+                # Another profiler (a debugger, say) owns the thread
+                stack = None
+
+        token = _current.set(profile)
+        started_at = datetime.now(timezone.utc)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if stack:
+                stack.disable()
+                self._stack_busy = False
+
+            route = scope.get("route")
+            self.log.add(
+                {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route.path if route else None,
+                    "status": status_code,
+                    "trigger": trigger,
+                    "started_at": started_at.isoformat(),
+                    "duration_ms": profile.elapsed_ms(),
+                    "spans": sorted(profile.spans, key=lambda s: s["start_ms"]),
+                    "stack": self._report(stack) if stack else None,
+                }
+            )
+
+    @staticmethod
+    def _trigger(scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                if value not in (b"0", b"false") and _is_admin(scope):
+                    return "header"
+                break
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            return "sample"
+        return None
+
+    @staticmethod
+    def _report(stack: cProfile.Profile) -> str:
+        out = io.StringIO()
+        stats = pstats.Stats(stack, stream=out)
+        stats.sort_stats("cumulative").print_stats(PROFILE_STACK_LINES)
+        return out.getvalue()
+
+
+def _is_admin(scope) -> bool:
+    # Only admins may ask for a profile: it exposes internals and costs
+    # the worker real time. Only checked when the header is present.
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return False
+            try:
+                return decode_access_token(token).get("role") == "admin"
+            except InvalidTokenError:
+                return False
+    return False
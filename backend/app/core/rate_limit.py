@@ -0,0 +1,192 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from pymongo import ReturnDocument
+
+from app.core.dependencies import verify_token
+from app.core.metrics import RATE_LIMITED
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "memory" limits per worker; "mongo" shares buckets between workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Proxies in front of the app (1 on Render). Each appends the address it
+# saw to X-Forwarded-For, so the caller is the entry this many places from
+# the end; anything before it came from the caller and is not trusted.
+# 0 uses the connection's address.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+
+# Per-router limits as "<requests>/<second|minute|hour>"; empty disables
+AUTH_RATE_LIMIT = os.getenv("AUTH_RATE_LIMIT", "10/minute")
+INVENTORY_RATE_LIMIT = os.getenv("INVENTORY_RATE_LIMIT", "20/second")
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+def parse_rate(limit: str) -> Optional[tuple[float, float]]:
+    # "10/minute" -> (refill rate in tokens per second, burst size)
+    if not limit:
+        return None
+    try:
+        count, period = limit.split("/")
+        burst = float(count)
+        seconds = PERIODS[period.strip().lower()]
+    except (ValueError, KeyError):
+        raise ValueError(f"Invalid rate limit: {limit!r}")
+    if burst <= 0:
+        return None
+    return burst / seconds, burst
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+# take() spends one token from the bucket at key and returns 0 when the
+# request may proceed, otherwise the seconds until a token is available.
+class MemoryRateLimitBackend:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [tokens, updated_at], least recently used first
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                # Evicts one bucket per new key, so a full table costs the
+                # same as any other request; idle clients are at the front
+                self._buckets.popitem(last=False)
+            tokens = burst
+        else:
+            self._buckets.move_to_end(key)
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / rate
+
+        self._buckets[key] = [tokens, now]
+        return wait
+
+
+class MongoRateLimitBackend:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        # Refill and spend in one atomic pipeline update, so concurrent
+        # workers never hand out the same token twice
+        now = time.time()
+        refilled = {
+            "$min": [
+                burst,
+                {
+                    "$add": [
+                        {"$ifNull": ["$tokens", burst]},
+                        {
+                            "$multiply": [
+                                {"$subtract": [now, {"$ifNull": ["$updated_at", now]}]},
+                                rate,
+                            ]
+                        },
+                    ]
+                },
+            ]
+        }
+        bucket = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {
+                    "$set": {
+                        "tokens": {
+                            "$cond": [
+                                "$allowed",
+                                {"$subtract": ["$tokens", 1]},
+                                "$tokens",
+                            ]
+                        },
+                        # Idle buckets are full again by then; the TTL
+                        # index drops them
+                        "expires_at": datetime.now(timezone.utc)
+                        + timedelta(seconds=burst / rate),
+                    }
+                },
+            ],
+            projection={"tokens": 1, "allowed": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        if bucket["allowed"]:
+            return 0.0
+        return (1 - bucket["tokens"]) / rate
+
+
+def create_rate_limit_backend(db):
+    if not RATE_LIMIT_ENABLED:
+        return None
+    if RATE_LIMIT_BACKEND == "mongo":
+        return MongoRateLimitBackend(db["rate_limits"])
+    return MemoryRateLimitBackend()
+
+
+# -----------------------------
+# Router dependency
+# -----------------------------
+def client_key(request: Request) -> str:
+    # Authenticated callers are limited per user (verify_token is cached),
+    # everyone else per client address
+    authorization = request.headers.get("authorization")
+    if authorization and authorization[:7].lower() == "bearer ":
+        try:
+            return "user:" + verify_token(authorization[7:])["sub"]
+        except (HTTPException, KeyError):
+            pass
+
+    return "ip:" + client_address(request)
+
+
+def client_address(request: Request) -> str:
+    forwarded = request.headers.get("x-forwarded-for")
+    if RATE_LIMIT_TRUSTED_PROXIES and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        # Fewer hops than proxies: the first one is as close as it gets
+        return hops[max(len(hops) - RATE_LIMIT_TRUSTED_PROXIES, 0)]
+
+    client = request.client
+    return client.host if client else "unknown"
+
+
+class RateLimit:
+    # Used as a router (or route) dependency:
+    #   APIRouter(dependencies=[Depends(RateLimit("auth", AUTH_RATE_LIMIT))])
+    def __init__(self, name: str, limit: str):
+        self.name = name
+        self.limit = parse_rate(limit)
+
+    async def __call__(self, request: Request) -> None:
+        backend = getattr(request.app.state, "rate_limit_backend", None)
+        if backend is None or self.limit is None:
+            return
+
+        rate, burst = self.limit
+        wait = await backend.take(f"{self.name}:{client_key(request)}", rate, burst)
+
+        if wait:
+            RATE_LIMITED.inc(self.name)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
@@ -0,0 +1,66 @@
+import hashlib
+from typing import Any, Awaitable, Callable
+
+import orjson
+from bson import ObjectId
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from app.core.profiling import span
+
+
+def _default(value: Any) -> Any:
+    # Repository documents keep their raw ObjectId; it is only turned into
+    # a string here, while orjson walks the payload.
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    with span("serialize"):
+        return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    # Routes that return this directly also skip FastAPI's
+    # jsonable_encoder pass, which dominates the cost of large listings.
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix is ignored
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+async def cached_json_response(
+    request: Request, key: tuple, load: Callable[[], Awaitable[Any]]
+) -> Response:
+    # Catalogue reads are cached as rendered bodies with a strong ETag
+    # (a hash of the body), so a repeat poll is answered from memory and
+    # an unchanged catalogue costs a 304 without a query or serialisation.
+    # Writes clear the cache and bump its generation, the catalogue version.
+    cache = getattr(request.app.state, "catalogue_cache", None)
+    entry = cache.get(key) if cache else None
+
+    if entry is None:
+        generation = cache.generation if cache else None
+        body = dumps(await load())
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        entry = (body, etag)
+        if cache:
+            cache.set(key, entry, generation=generation)
+
+    body, etag = entry
+    # no-cache: clients may store the body but must revalidate each time
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
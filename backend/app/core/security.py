@@ -1,14 +1,87 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
+from app.core.metrics import PASSWORD_HASH_LATENCY
+from app.core.profiling import span
+
+# Argon2 cost parameters. Changing them is safe: existing hashes still
+# verify and are transparently upgraded on the user's next login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# Hashing runs on a dedicated pool (argon2-cffi releases the GIL), so a
+# burst of logins cannot stall the event loop. Requests beyond the queue
+# limit are turned away with 503 instead of piling up.
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
 pwd_context = CryptContext(
     schemes=["argon2"],
-    deprecated="auto"
+    deprecated="auto",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
 )
 
+_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="argon2",
+)
+_pending = 0
+
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    with PASSWORD_HASH_LATENCY.time("hash"):
+        return pwd_context.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with PASSWORD_HASH_LATENCY.time("verify"):
+        return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    # Returns a fresh hash when the stored one uses outdated parameters
+    with PASSWORD_HASH_LATENCY.time("verify"):
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def _run_in_pool(func, *args):
+    global _pending
+
+    if _pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        # Includes time queued for a worker, unlike the histogram
+        with span(f"password.{func.__name__}"):
+            return await loop.run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_pool(hash_password, password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await _run_in_pool(
+        verify_and_update_password, plain_password, hashed_password
+    )
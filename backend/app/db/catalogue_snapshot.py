@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Optional
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_SNAPSHOT = os.getenv("CATALOGUE_SNAPSHOT", "false").lower() == "true"
+SNAPSHOT_POLL_INTERVAL = float(os.getenv("CATALOGUE_SNAPSHOT_POLL_INTERVAL", "5"))
+SNAPSHOT_RETRY_DELAY = 1.0
+
+
+# In-memory copy of the sweets collection kept current by a background task.
+# On replica sets the task tails a change stream; standalone servers (and
+# test doubles without change streams) fall back to periodic reloads.
+class CatalogueSnapshot:
+    def __init__(
+        self,
+        collection,
+        use_change_stream: bool,
+        poll_interval: float = SNAPSHOT_POLL_INTERVAL,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self.collection = collection
+        self.use_change_stream = use_change_stream
+        self.poll_interval = poll_interval
+        self.on_change = on_change
+        self.sweets: dict[str, dict] = {}
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def mode(self) -> str:
+        return "change_stream" if self.use_change_stream else "polling"
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def list(self) -> list[dict]:
+        return list(self.sweets.values())
+
+    # Local writes are applied straight away so a worker reads its own
+    # writes before the change event (or next poll) comes round.
+    def put(self, sweet: dict) -> None:
+        self.sweets[str(sweet["_id"])] = {**sweet, "_id": str(sweet["_id"])}
+
+    def remove(self, sweet_id: str) -> None:
+        self.sweets.pop(str(sweet_id), None)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.use_change_stream:
+                    await self._watch()
+                else:
+                    await self._reload()
+                    await asyncio.sleep(self.poll_interval)
+            except PyMongoError as exc:
+                logger.warning("Catalogue snapshot sync failed: %s", exc)
+                await asyncio.sleep(SNAPSHOT_RETRY_DELAY)
+
+    async def _watch(self) -> None:
+        async with self.collection.watch(full_document="updateLookup") as stream:
+            # Load after the stream is open so no change falls in between
+            await self._reload()
+            async for change in stream:
+                self._apply(change)
+
+    def _apply(self, change: dict) -> None:
+        operation = change["operationType"]
+
+        if operation in ("insert", "update", "replace"):
+            sweet = change.get("fullDocument")
+            if sweet is None:
+                # Deleted again before the update lookup ran
+                self.remove(change["documentKey"]["_id"])
+            else:
+                self.put(sweet)
+        elif operation == "delete":
+            self.remove(change["documentKey"]["_id"])
+        elif operation in ("drop", "rename", "dropDatabase"):
+            self.sweets = {}
+        else:
+            return
+
+        if self.on_change:
+            self.on_change()
+
+    async def _reload(self) -> None:
+        sweets = {}
+        async for sweet in self.collection.find():
+            sweet["_id"] = str(sweet["_id"])
+            sweets[sweet["_id"]] = sweet
+
+        changed = sweets != self.sweets
+        self.sweets = sweets
+        self.ready = True
+
+        if changed and self.on_change:
+            self.on_change()
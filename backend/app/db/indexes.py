@@ -0,0 +1,107 @@
+import logging
+
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    ],
+    "sweets": [
+        # Category filter with a price range, and price-sorted pages
+        IndexModel(
+            [("category", ASCENDING), ("price", ASCENDING)],
+            name="category_price",
+        ),
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price_id"),
+        # Bulk imports upsert by name, so it must identify one sweet; also
+        # serves anchored prefix search. Relevance-ranked word search.
+        IndexModel([("name", ASCENDING)], unique=True, name="name_unique"),
+        IndexModel([("name", TEXT)], name="name_text"),
+    ],
+    "stock_shards": [
+        # One counter per shard; also serves the per-sweet lookups
+        IndexModel(
+            [("sweet_id", ASCENDING), ("shard", ASCENDING)],
+            unique=True,
+            name="sweet_shard_unique",
+        ),
+    ],
+    "reservations": [
+        # The sweeper's scan for expired holds
+        IndexModel(
+            [("status", ASCENDING), ("expires_at", ASCENDING)],
+            name="status_expires_at",
+        ),
+        # Settled reservations only; live holds have no purge_at
+        IndexModel(
+            [("purge_at", ASCENDING)],
+            expireAfterSeconds=0,
+            name="purge_at_ttl",
+        ),
+    ],
+    "inventory_events": [
+        # History of one sweet, oldest first
+        IndexModel(
+            [("sweet_id", ASCENDING), ("at", ASCENDING)], name="sweet_at"
+        ),
+    ],
+    "sales_rollups": [
+        # The upsert key of each rollup; also serves report ranges
+        IndexModel(
+            [
+                ("period", ASCENDING),
+                ("scope", ASCENDING),
+                ("start", ASCENDING),
+                ("key", ASCENDING),
+            ],
+            unique=True,
+            name="period_scope_start_key",
+        ),
+    ],
+    "idempotency_keys": [
+        # Expired purchase/restock replay records are removed by the server
+        IndexModel(
+            [("expires_at", ASCENDING)],
+            expireAfterSeconds=0,
+            name="expires_at_ttl",
+        ),
+    ],
+    "rate_limits": [
+        # Shared token buckets, dropped once they would be full again
+        IndexModel(
+            [("expires_at", ASCENDING)],
+            expireAfterSeconds=0,
+            name="expires_at_ttl",
+        ),
+    ],
+}
+
+# Older indexes on the same keys as a replacement above. MongoDB holds only
+# one index per key pattern, so they are dropped before it is built, and
+# put back if it cannot be.
+RETIRED_INDEXES = {
+    "sweets": [IndexModel([("name", ASCENDING)], name="name")],
+}
+
+
+async def ensure_indexes(db) -> None:
+    # create_indexes is a no-op for indexes that already exist with the same
+    # spec, so this is safe to run on every startup.
+    for collection, indexes in INDEXES.items():
+        retired = []
+        try:
+            existing = await db[collection].index_information()
+            for index in RETIRED_INDEXES.get(collection, []):
+                if index.document["name"] in existing:
+                    await db[collection].drop_index(index.document["name"])
+                    retired.append(index)
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as exc:
+            # e.g. legacy duplicate emails or sweet names blocking a unique
+            # index; keep serving and let an operator clean the data up.
+            logger.warning("Could not create %s indexes: %s", collection, exc)
+            if retired:
+                await db[collection].create_indexes(retired)
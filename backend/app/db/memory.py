@@ -0,0 +1,1292 @@
+import asyncio
+import functools
+import itertools
+import re
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+from typing import Any, Hashable, Iterable, Optional
+
+from bson import ObjectId
+from pymongo import (
+    DeleteMany,
+    DeleteOne,
+    InsertOne,
+    ReplaceOne,
+    ReturnDocument,
+    UpdateMany,
+    UpdateOne,
+)
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+from app.core.metrics import MONGO_COMMANDS, MONGO_LATENCY
+from app.core.profiling import add_span
+
+# In-process storage engine exposing the subset of the Motor API the app
+# uses, so repositories run unchanged against it (STORAGE_BACKEND=memory).
+#
+# Documents live in a dict keyed by _id. The leading field of every index
+# created through create_indexes gets a hash index (equality lookups and
+# unique constraints) and a sorted index over its numeric values (range
+# scans), e.g. a category hash index and a sorted price index for sweets.
+# Indexes only narrow the candidates; every candidate is still matched
+# against the full filter, so results never depend on which index was used.
+#
+# Each operation runs without yielding to the event loop, which makes
+# single-document updates atomic just like on the server. Documents are
+# flat, so they are stored and returned as shallow copies.
+#
+# Every operation is counted in the driver command metrics under the
+# command a server would have received, and TTL indexes are enforced by a
+# periodic sweep, as on the server.
+
+DUPLICATE_KEY_ERROR = 11000
+WORD = re.compile(r"\w+")
+INF = float("inf")
+# How often expired documents are removed, like the server's TTL monitor
+TTL_SWEEP_INTERVAL = 60.0
+
+
+def _observe(command: str, started: float, outcome: str = "success") -> None:
+    elapsed = time.perf_counter() - started
+    MONGO_COMMANDS.inc(command, outcome)
+    MONGO_LATENCY.observe(elapsed, command)
+    add_span(f"mongo.{command}", elapsed)
+
+
+def _command(name: str):
+    # Counts each call as one round trip of the named server command. Each
+    # yields to the event loop first, as a real round trip would: a single
+    # command stays atomic, but separate commands of concurrent requests
+    # interleave, so read-then-write races show up here too.
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            await asyncio.sleep(0)
+            started = time.perf_counter()
+            outcome = "success"
+            try:
+                return await func(*args, **kwargs)
+            except (DuplicateKeyError, BulkWriteError):
+                # Write errors come back in a successful reply
+                raise
+            except Exception:
+                outcome = "failure"
+                raise
+            finally:
+                _observe(name, started, outcome)
+
+        return wrapper
+
+    return decorate
+
+
+# -----------------------------
+# Values and comparison
+# -----------------------------
+def _utc(value: datetime) -> datetime:
+    # Naive datetimes are UTC, as the driver stores them
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _rank(value: Any) -> int:
+    # BSON comparison order between types
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, list):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _sort_key(value: Any) -> tuple:
+    rank = _rank(value)
+    if rank in (1, 2, 5, 7, 8, 9):
+        return (rank, value)
+    return (rank, 0)
+
+
+def _index_key(value: Any) -> Optional[tuple]:
+    # Hashable key that keeps 1 == 1.0 but True != 1, like the server
+    if isinstance(value, (dict, list)):
+        return None
+    return (_rank(value), value)
+
+
+def _get(doc: dict, path: str) -> Any:
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _set(doc: dict, path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset(doc: dict, path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def _compare(value: Any, bound: Any, op) -> bool:
+    # Range operators only match values of the same type as the bound
+    if _rank(value) != _rank(bound):
+        return False
+    try:
+        return op(value, bound)
+    except TypeError:
+        return False
+
+
+COMPARISONS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if isinstance(expected, (dict, list)):
+        return value == expected
+    if isinstance(value, list):
+        return any(_equals(item, expected) for item in value)
+    return _index_key(value) == _index_key(expected)
+
+
+def _is_operator_dict(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(
+        key.startswith("$") for key in value
+    )
+
+
+# -----------------------------
+# Query matching
+# -----------------------------
+def _match_condition(value: Any, condition: Any) -> bool:
+    if not _is_operator_dict(condition):
+        return _equals(value, condition)
+
+    for op, operand in condition.items():
+        if op == "$eq":
+            ok = _equals(value, operand)
+        elif op == "$ne":
+            ok = not _equals(value, operand)
+        elif op in COMPARISONS:
+            values = value if isinstance(value, list) else [value]
+            ok = any(_compare(item, operand, COMPARISONS[op]) for item in values)
+        elif op == "$in":
+            ok = any(_equals(value, item) for item in operand)
+        elif op == "$nin":
+            ok = not any(_equals(value, item) for item in operand)
+        elif op == "$exists":
+            ok = (value is not None) == bool(operand)
+        elif op == "$regex":
+            flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+            pattern = operand if hasattr(operand, "search") else re.compile(operand, flags)
+            ok = isinstance(value, str) and pattern.search(value) is not None
+        elif op == "$options":
+            ok = True
+        elif op == "$not":
+            ok = not _match_condition(value, operand)
+        else:
+            raise OperationFailure(f"unknown operator: {op}")
+
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc: dict, query: dict, text: Optional["_TextIndex"] = None) -> bool:
+    for key, condition in query.items():
+        if key == "$and":
+            ok = all(matches(doc, part, text) for part in condition)
+        elif key == "$or":
+            ok = any(matches(doc, part, text) for part in condition)
+        elif key == "$nor":
+            ok = not any(matches(doc, part, text) for part in condition)
+        elif key == "$text":
+            if text is None:
+                raise OperationFailure("text index required for $text query")
+            ok = text.score(doc, condition["$search"]) > 0
+        else:
+            ok = _match_condition(_get(doc, key), condition)
+
+        if not ok:
+            return False
+    return True
+
+
+def _equality_fields(query: dict) -> dict:
+    # Fields an upsert copies from its filter into the new document
+    fields = {}
+    for key, condition in query.items():
+        if key == "$and":
+            for part in condition:
+                fields.update(_equality_fields(part))
+        elif key.startswith("$"):
+            continue
+        elif not _is_operator_dict(condition):
+            fields[key] = condition
+        elif "$eq" in condition:
+            fields[key] = condition["$eq"]
+    return fields
+
+
+# -----------------------------
+# Updates and projections
+# -----------------------------
+def apply_update(doc: dict, update: dict, inserting: bool = False) -> dict:
+    if isinstance(update, list):
+        raise OperationFailure("pipeline updates are not supported in memory")
+
+    if not any(key.startswith("$") for key in update):
+        # Replacement document
+        return {"_id": doc["_id"], **update}
+
+    updated = dict(doc)
+    for op, fields in update.items():
+        for path, value in fields.items():
+            current = _get(updated, path)
+            if op == "$set":
+                _set(updated, path, value)
+            elif op == "$setOnInsert":
+                if inserting:
+                    _set(updated, path, value)
+            elif op == "$inc":
+                _set(updated, path, (current or 0) + value)
+            elif op == "$min":
+                if current is None or _sort_key(value) < _sort_key(current):
+                    _set(updated, path, value)
+            elif op == "$max":
+                if current is None or _sort_key(value) > _sort_key(current):
+                    _set(updated, path, value)
+            elif op == "$unset":
+                _unset(updated, path)
+            else:
+                raise OperationFailure(f"unknown update operator: {op}")
+    return updated
+
+
+def project(doc: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return dict(doc)
+
+    include_id = projection.get("_id", 1)
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+
+    if fields and all(fields.values()):
+        projected = {key: doc[key] for key in fields if key in doc}
+        if include_id and "_id" in doc:
+            projected = {"_id": doc["_id"], **projected}
+        return projected
+
+    projected = {key: value for key, value in doc.items() if key not in fields}
+    if not include_id:
+        projected.pop("_id", None)
+    return projected
+
+
+def _sort_docs(docs: list[dict], spec: list[tuple[str, int]]) -> list[dict]:
+    # Stable sorts applied from the last key to the first
+    for field, direction in reversed(spec):
+        docs.sort(key=lambda doc: _sort_key(_get(doc, field)), reverse=direction < 0)
+    return docs
+
+
+# -----------------------------
+# Indexes
+# -----------------------------
+class _HashIndex:
+    def __init__(self, field: str, unique: bool, name: str):
+        self.field = field
+        self.unique = unique
+        self.name = name
+        self.entries: dict[Hashable, set] = {}
+
+    def keys(self, doc: dict) -> list:
+        value = _get(doc, self.field)
+        values = value if isinstance(value, list) else [value]
+        return [key for key in map(_index_key, values) if key is not None]
+
+    def add(self, doc: dict) -> None:
+        for key in self.keys(doc):
+            self.entries.setdefault(key, set()).add(doc["_id"])
+
+    def remove(self, doc: dict) -> None:
+        for key in self.keys(doc):
+            ids = self.entries.get(key)
+            if ids is not None:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del self.entries[key]
+
+    def conflict(self, doc: dict) -> bool:
+        if not self.unique:
+            return False
+        return any(
+            self.entries.get(key, set()) - {doc["_id"]} for key in self.keys(doc)
+        )
+
+    def lookup(self, value: Any) -> set:
+        return self.entries.get(_index_key(value), set())
+
+
+class _SortedIndex:
+    # (sort key, sequence) pairs for the numbers, strings and ObjectIds of
+    # one field, in BSON order; serves range filters and anchored regexes
+    RANKS = (1, 2, 7)
+
+    def __init__(self, field: str):
+        self.field = field
+        self.entries: list[tuple[tuple, int]] = []
+        self.ids: dict[int, Any] = {}
+
+    def _key(self, doc: dict) -> Optional[tuple]:
+        value = _get(doc, self.field)
+        return _sort_key(value) if _rank(value) in self.RANKS else None
+
+    def add(self, doc: dict, seq: int) -> None:
+        key = self._key(doc)
+        if key is not None:
+            insort(self.entries, (key, seq))
+            self.ids[seq] = doc["_id"]
+
+    def remove(self, doc: dict, seq: int) -> None:
+        key = self._key(doc)
+        if key is not None:
+            index = bisect_left(self.entries, (key, seq))
+            if index < len(self.entries) and self.entries[index] == (key, seq):
+                del self.entries[index]
+            self.ids.pop(seq, None)
+
+    def _slice(self, start: int, end: int) -> list:
+        return [self.ids[seq] for _, seq in self.entries[start:end]]
+
+    def range(self, condition: dict) -> Optional[list]:
+        ranks = {_rank(bound) for bound in condition.values()}
+        if not set(condition) <= set(COMPARISONS) or len(ranks) != 1:
+            return None
+        rank = ranks.pop()
+        if rank not in self.RANKS:
+            return None
+
+        # Type bracketing: a bound only matches values of its own type
+        start = bisect_left(self.entries, ((rank,), -1))
+        end = bisect_left(self.entries, ((rank + 1,), -1))
+        for op, bound in condition.items():
+            key = (rank, bound)
+            if op == "$gt":
+                start = max(start, bisect_right(self.entries, (key, INF)))
+            elif op == "$gte":
+                start = max(start, bisect_left(self.entries, (key, -1)))
+            elif op == "$lt":
+                end = min(end, bisect_left(self.entries, (key, -1)))
+            else:
+                end = min(end, bisect_right(self.entries, (key, INF)))
+        return self._slice(start, end)
+
+    def prefix(self, prefix: str) -> list:
+        # Every string starting with prefix sorts in [prefix, next prefix)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        start = bisect_left(self.entries, ((2, prefix), -1))
+        end = bisect_left(self.entries, ((2, upper), -1))
+        return self._slice(start, end)
+
+
+def _literal_prefix(pattern: str) -> str:
+    # Literal text an anchored regex must start with: ^Sweet 4\.2 -> Sweet 4.2
+    if not pattern.startswith("^") or "|" in pattern:
+        return ""
+    prefix = []
+    i = 1
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            char, step = pattern[i + 1], 2
+        elif char in ".^$*+?{}[]|()\\":
+            break
+        else:
+            step = 1
+        if pattern[i + step:i + step + 1] in ("*", "?", "{"):
+            # Optional character: the prefix ends before it
+            break
+        prefix.append(char)
+        i += step
+    return "".join(prefix)
+
+
+class _TextIndex:
+    # Inverted index of lower-cased words; no stemming or stop words
+    def __init__(self, fields: list[str]):
+        self.fields = fields
+        self.words: dict[str, set] = {}
+
+    def tokens(self, doc: dict) -> list[str]:
+        words: list[str] = []
+        for field in self.fields:
+            value = _get(doc, field)
+            if isinstance(value, str):
+                words.extend(WORD.findall(value.lower()))
+        return words
+
+    def add(self, doc: dict) -> None:
+        for word in set(self.tokens(doc)):
+            self.words.setdefault(word, set()).add(doc["_id"])
+
+    def remove(self, doc: dict) -> None:
+        for word in set(self.tokens(doc)):
+            ids = self.words.get(word)
+            if ids is not None:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del self.words[word]
+
+    def lookup(self, search: str) -> set:
+        terms = WORD.findall(search.lower())
+        return set().union(*(self.words.get(term, set()) for term in terms))
+
+    def score(self, doc: dict, search: str) -> float:
+        terms = set(WORD.findall(search.lower()))
+        return float(sum(1 for word in self.tokens(doc) if word in terms))
+
+
+# -----------------------------
+# Aggregation
+# -----------------------------
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return _index_key(value)
+
+
+def _is_number(value: Any) -> bool:
+    return _rank(value) == 1
+
+
+EXPRESSION_COMPARISONS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    **COMPARISONS,
+}
+
+
+def evaluate(expr: Any, doc: dict) -> Any:
+    if isinstance(expr, str) and expr.startswith("$"):
+        return _get(doc, expr[1:])
+    if isinstance(expr, list):
+        return [evaluate(item, doc) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if not _is_operator_dict(expr) or len(expr) != 1:
+        return {key: evaluate(value, doc) for key, value in expr.items()}
+
+    op, args = next(iter(expr.items()))
+    if op == "$literal":
+        return args
+    if op == "$cond":
+        if isinstance(args, dict):
+            args = [args["if"], args["then"], args["else"]]
+        condition, then, otherwise = args
+        return evaluate(then if evaluate(condition, doc) else otherwise, doc)
+    if op == "$ifNull":
+        for arg in args:
+            value = evaluate(arg, doc)
+            if value is not None:
+                return value
+        return None
+
+    values = evaluate(args if isinstance(args, list) else [args], doc)
+    if op in EXPRESSION_COMPARISONS:
+        # Aggregation compares across types in BSON order
+        left, right = map(_sort_key, values)
+        return EXPRESSION_COMPARISONS[op](left, right)
+    if op == "$and":
+        return all(values)
+    if op == "$or":
+        return any(values)
+    if op == "$not":
+        return not values[0]
+    if op in ("$add", "$subtract", "$multiply", "$divide"):
+        if any(value is None for value in values):
+            return None
+        if op == "$add":
+            return sum(values)
+        if op == "$multiply":
+            result = 1
+            for value in values:
+                result *= value
+            return result
+        left, right = values
+        return left - right if op == "$subtract" else left / right
+    raise OperationFailure(f"unsupported expression operator: {op}")
+
+
+def _accumulate(spec: dict, docs: list[dict]) -> Any:
+    op, expr = next(iter(spec.items()))
+    values = [evaluate(expr, doc) for doc in docs]
+
+    if op == "$sum":
+        return sum(value for value in values if _is_number(value))
+    if op == "$avg":
+        numbers = [value for value in values if _is_number(value)]
+        return sum(numbers) / len(numbers) if numbers else None
+    if op in ("$min", "$max"):
+        present = [value for value in values if value is not None]
+        if not present:
+            return None
+        pick = min if op == "$min" else max
+        return pick(present, key=_sort_key)
+    if op == "$first":
+        return values[0] if values else None
+    if op == "$last":
+        return values[-1] if values else None
+    if op == "$push":
+        return values
+    if op == "$addToSet":
+        return list({_freeze(value): value for value in values}.values())
+    raise OperationFailure(f"unsupported accumulator: {op}")
+
+
+def _group(docs: list[dict], spec: dict) -> list[dict]:
+    groups: dict[Hashable, tuple[Any, list]] = {}
+    for doc in docs:
+        key = evaluate(spec["_id"], doc)
+        groups.setdefault(_freeze(key), (key, []))[1].append(doc)
+
+    return [
+        {
+            "_id": key,
+            **{
+                field: _accumulate(accumulator, members)
+                for field, accumulator in spec.items()
+                if field != "_id"
+            },
+        }
+        for key, members in groups.values()
+    ]
+
+
+def _bucket(docs: list[dict], spec: dict) -> list[dict]:
+    boundaries = spec["boundaries"]
+    output = spec.get("output", {"count": {"$sum": 1}})
+    buckets: dict[int, list] = {}
+
+    for doc in docs:
+        value = evaluate(spec["groupBy"], doc)
+        key = _sort_key(value)
+        index = bisect_right([_sort_key(b) for b in boundaries], key) - 1
+        if 0 <= index < len(boundaries) - 1:
+            buckets.setdefault(index, []).append(doc)
+        elif "default" in spec:
+            buckets.setdefault(len(boundaries), []).append(doc)
+        else:
+            raise OperationFailure("$bucket value outside boundaries, no default")
+
+    return [
+        {
+            "_id": spec["default"] if index == len(boundaries) else boundaries[index],
+            **{
+                field: _accumulate(accumulator, buckets[index])
+                for field, accumulator in output.items()
+            },
+        }
+        for index in sorted(buckets)
+    ]
+
+
+def _project(doc: dict, spec: dict) -> dict:
+    fields = {key: value for key, value in spec.items() if key != "_id"}
+    if fields and all(value in (0, False) for value in fields.values()):
+        return project(doc, spec)
+
+    projected = {}
+    if spec.get("_id", 1) not in (0, False) and "_id" in doc:
+        projected["_id"] = doc["_id"]
+    for key, value in fields.items():
+        if value is True or (type(value) is int and value == 1):
+            if key in doc:
+                projected[key] = doc[key]
+        else:
+            projected[key] = evaluate(value, doc)
+    return projected
+
+
+def run_pipeline(docs: list[dict], pipeline: list[dict]) -> list[dict]:
+    for stage in pipeline:
+        name, spec = next(iter(stage.items()))
+        if name == "$match":
+            docs = [doc for doc in docs if matches(doc, spec)]
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$bucket":
+            docs = _bucket(docs, spec)
+        elif name == "$facet":
+            docs = [
+                {field: run_pipeline(docs, stages) for field, stages in spec.items()}
+            ]
+        elif name == "$sort":
+            docs = _sort_docs(list(docs), list(spec.items()))
+        elif name == "$skip":
+            docs = docs[spec:]
+        elif name == "$limit":
+            docs = docs[:spec]
+        elif name == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == "$project":
+            docs = [_project(doc, spec) for doc in docs]
+        elif name in ("$addFields", "$set"):
+            docs = [
+                {**doc, **{key: evaluate(expr, doc) for key, expr in spec.items()}}
+                for doc in docs
+            ]
+        elif name == "$unwind":
+            path = (spec if isinstance(spec, str) else spec["path"])[1:]
+            docs = [
+                {**doc, path: item}
+                for doc in docs
+                for item in (_get(doc, path) or [])
+            ]
+        else:
+            raise OperationFailure(f"unsupported aggregation stage: {name}")
+    return docs
+
+
+class _ListCursor:
+    # Cursor over results that are already materialised (aggregations)
+    def __init__(self, results: list[dict]):
+        self._results = results
+        self._position = 0
+
+    async def to_list(self, length: Optional[int] = None) -> list[dict]:
+        end = len(self._results) if length is None else self._position + length
+        batch = self._results[self._position:end]
+        self._position += len(batch)
+        return batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        if self._position >= len(self._results):
+            raise StopAsyncIteration
+        self._position += 1
+        return self._results[self._position - 1]
+
+
+# -----------------------------
+# Cursor
+# -----------------------------
+class MemoryCursor:
+    def __init__(self, collection: "MemoryCollection", query, projection):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort: list = []
+        self._skip = 0
+        self._limit = 0
+        self._scan = False
+        self._results: Optional[list[dict]] = None
+        self._position = 0
+
+    def sort(self, key_or_list, direction=None) -> "MemoryCursor":
+        if isinstance(key_or_list, str):
+            key_or_list = [(key_or_list, direction or 1)]
+        self._sort = list(key_or_list)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> "MemoryCursor":
+        return self
+
+    def hint(self, index) -> "MemoryCursor":
+        # Only [("$natural", 1)] changes anything: it forces a full scan
+        self._scan = isinstance(index, list) and index[0][0] == "$natural"
+        return self
+
+    def clone(self) -> "MemoryCursor":
+        cursor = MemoryCursor(self.collection, self.query, self.projection)
+        cursor._sort = list(self._sort)
+        cursor._skip = self._skip
+        cursor._limit = self._limit
+        cursor._scan = self._scan
+        return cursor
+
+    def _evaluate(self) -> list[dict]:
+        if self._results is None:
+            started = time.perf_counter()
+            self._results = self.collection._run_find(
+                self.query,
+                self.projection,
+                self._sort,
+                self._skip,
+                self._limit,
+                self._scan,
+            )
+            _observe("find", started)
+        return self._results
+
+    async def to_list(self, length: Optional[int] = None) -> list[dict]:
+        if self._results is None:
+            await asyncio.sleep(0)
+        results = self._evaluate()
+        end = len(results) if length is None else self._position + length
+        batch = results[self._position:end]
+        self._position += len(batch)
+        return batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        if self._results is None:
+            await asyncio.sleep(0)
+        results = self._evaluate()
+        if self._position >= len(results):
+            raise StopAsyncIteration
+        self._position += 1
+        return results[self._position - 1]
+
+
+# -----------------------------
+# Collection
+# -----------------------------
+class MemoryCollection:
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._docs: dict[Any, dict] = {}
+        self._seq: dict[Any, int] = {}
+        self._counter = itertools.count()
+        self._hash: dict[str, _HashIndex] = {}
+        self._sorted: dict[str, _SortedIndex] = {}
+        self._text: Optional[_TextIndex] = None
+        self._index_names: set[str] = set()
+        # TTL indexes, field -> expireAfterSeconds
+        self._ttl: dict[str, float] = {}
+        self._next_expiry = 0.0
+
+    def with_options(self, **options) -> "MemoryCollection":
+        # Read preferences and write concerns mean nothing in one process
+        return self
+
+    # -----------------------------
+    # Indexes
+    # -----------------------------
+    @_command("createIndexes")
+    async def create_indexes(self, indexes: list, **kwargs) -> list[str]:
+        return [self._create_index(index.document) for index in indexes]
+
+    @_command("createIndexes")
+    async def create_index(self, keys, **kwargs) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = kwargs.get("name") or "_".join(f"{k}_{v}" for k, v in keys)
+        return self._create_index({"key": dict(keys), "name": name, **kwargs})
+
+    def _create_index(self, spec: dict) -> str:
+        keys = list(spec["key"].items())
+        name = spec["name"]
+        self._index_names.add(name)
+        if "expireAfterSeconds" in spec:
+            self._ttl[keys[0][0]] = spec["expireAfterSeconds"]
+
+        text_fields = [field for field, kind in keys if kind == "text"]
+        if text_fields:
+            self._text = _TextIndex(text_fields)
+            for doc in self._docs.values():
+                self._text.add(doc)
+            return name
+
+        field = keys[0][0]
+        unique = spec.get("unique", False) and len(keys) == 1
+        index = self._hash.get(field)
+        if index is None or (unique and not index.unique):
+            index = _HashIndex(field, unique, name)
+            for doc in self._docs.values():
+                if index.conflict(doc):
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error index: {name}",
+                        DUPLICATE_KEY_ERROR,
+                    )
+                index.add(doc)
+            self._hash[field] = index
+
+        if field not in self._sorted:
+            self._sorted[field] = _SortedIndex(field)
+            for doc in self._docs.values():
+                self._sorted[field].add(doc, self._seq[doc["_id"]])
+        return name
+
+    @_command("listIndexes")
+    async def index_information(self) -> dict:
+        return {name: {} for name in sorted(self._index_names | {"_id_"})}
+
+    # -----------------------------
+    # Internal storage
+    # -----------------------------
+    def _check_unique(self, doc: dict) -> None:
+        for index in self._hash.values():
+            if index.conflict(doc):
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} "
+                    f"index: {index.name}",
+                    DUPLICATE_KEY_ERROR,
+                )
+
+    def _expire(self) -> None:
+        # Expired documents are removed at most once per sweep interval,
+        # checked as documents come in (the only way a collection grows)
+        now = time.monotonic()
+        if not self._ttl or now < self._next_expiry:
+            return
+        self._next_expiry = now + TTL_SWEEP_INTERVAL
+
+        cutoff = datetime.now(timezone.utc)
+        for field, seconds in self._ttl.items():
+            expired = [
+                doc
+                for doc in self._docs.values()
+                if isinstance(doc.get(field), datetime)
+                and _utc(doc[field]) + timedelta(seconds=seconds) <= cutoff
+            ]
+            for doc in expired:
+                self._remove(doc)
+
+    def _insert(self, doc: dict) -> Any:
+        self._expire()
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name} index: _id_",
+                DUPLICATE_KEY_ERROR,
+            )
+        stored = dict(doc)
+        self._check_unique(stored)
+
+        seq = next(self._counter)
+        self._docs[stored["_id"]] = stored
+        self._seq[stored["_id"]] = seq
+        for index in self._hash.values():
+            index.add(stored)
+        for index in self._sorted.values():
+            index.add(stored, seq)
+        if self._text:
+            self._text.add(stored)
+        return stored["_id"]
+
+    def _replace(self, old: dict, new: dict) -> None:
+        self._check_unique(new)
+        seq = self._seq[old["_id"]]
+        for index in self._hash.values():
+            index.remove(old)
+            index.add(new)
+        for index in self._sorted.values():
+            index.remove(old, seq)
+            index.add(new, seq)
+        if self._text:
+            self._text.remove(old)
+            self._text.add(new)
+        self._docs[old["_id"]] = new
+
+    def _remove(self, doc: dict) -> None:
+        seq = self._seq.pop(doc["_id"])
+        for index in self._hash.values():
+            index.remove(doc)
+        for index in self._sorted.values():
+            index.remove(doc, seq)
+        if self._text:
+            self._text.remove(doc)
+        del self._docs[doc["_id"]]
+
+    def _candidates(self, query: dict) -> Iterable[dict]:
+        # Pick the narrowest index for the filter; fall back to a scan
+        if "_id" in query:
+            condition = query["_id"]
+            if not _is_operator_dict(condition):
+                doc = self._docs.get(condition)
+                return [doc] if doc else []
+            if set(condition) == {"$in"}:
+                ids = dict.fromkeys(condition["$in"])
+                return [self._docs[_id] for _id in ids if _id in self._docs]
+
+        best: Optional[list] = None
+        for field, condition in query.items():
+            ids = None
+            if field == "$text":
+                if self._text:
+                    ids = self._text.lookup(condition["$search"])
+            elif field.startswith("$"):
+                continue
+            elif not _is_operator_dict(condition):
+                if field in self._hash and not isinstance(condition, (dict, list)):
+                    ids = self._hash[field].lookup(condition)
+            elif set(condition) == {"$in"}:
+                if field in self._hash:
+                    ids = set().union(
+                        *(self._hash[field].lookup(v) for v in condition["$in"])
+                    )
+            elif set(condition) == {"$regex"}:
+                prefix = _literal_prefix(condition["$regex"])
+                if field in self._sorted and prefix:
+                    ids = self._sorted[field].prefix(prefix)
+            elif field in self._sorted:
+                ids = self._sorted[field].range(condition)
+
+            if ids is not None and (best is None or len(ids) < len(best)):
+                best = list(ids)
+
+        if best is None:
+            return self._docs.values()
+        # Keep natural (insertion) order for unsorted results
+        best.sort(key=self._seq.__getitem__)
+        return [self._docs[_id] for _id in best]
+
+    def _matching(self, query: dict, scan: bool = False) -> Iterable[dict]:
+        query = query or {}
+        candidates = self._docs.values() if scan else self._candidates(query)
+        for doc in candidates:
+            if matches(doc, query, self._text):
+                yield doc
+
+    def _run_find(self, query, projection, sort, skip, limit, scan) -> list[dict]:
+        docs = list(self._matching(query, scan))
+
+        text_sort = [
+            spec for spec in sort if isinstance(spec[1], dict)
+        ]
+        if text_sort:
+            # {"$meta": "textScore"}: most relevant first
+            search = query["$text"]["$search"]
+            docs.sort(key=lambda doc: self._text.score(doc, search), reverse=True)
+        plain_sort = [spec for spec in sort if not isinstance(spec[1], dict)]
+        if plain_sort:
+            docs = _sort_docs(docs, plain_sort)
+
+        docs = docs[skip:]
+        if limit:
+            docs = docs[:limit]
+        return [project(doc, projection) for doc in docs]
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def find(self, filter=None, projection=None, **kwargs) -> MemoryCursor:
+        return MemoryCursor(self, filter, projection)
+
+    @_command("find")
+    async def find_one(self, filter=None, projection=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        for doc in self._matching(filter):
+            return project(doc, projection)
+        return None
+
+    @_command("aggregate")
+    async def count_documents(self, filter: dict, **kwargs) -> int:
+        return sum(1 for _ in self._matching(filter))
+
+    @_command("count")
+    async def estimated_document_count(self, **kwargs) -> int:
+        return len(self._docs)
+
+    def aggregate(self, pipeline: list[dict], **kwargs) -> _ListCursor:
+        # A leading $match (including $text) is answered from the indexes
+        started = time.perf_counter()
+        pipeline = list(pipeline)
+        query = pipeline.pop(0)["$match"] if pipeline and "$match" in pipeline[0] else {}
+        docs = [dict(doc) for doc in self._matching(query)]
+        results = run_pipeline(docs, pipeline)
+        _observe("aggregate", started)
+        return _ListCursor(results)
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("change streams are not supported in memory")
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    @_command("insert")
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        return InsertOneResult(self._insert(document), True)
+
+    @_command("insert")
+    async def insert_many(self, documents, ordered=True, **kwargs) -> InsertManyResult:
+        # Like the server: duplicates come back as write errors, and an
+        # unordered insert carries on past them
+        inserted, errors = [], []
+        for index, doc in enumerate(documents):
+            try:
+                inserted.append(self._insert(doc))
+            except DuplicateKeyError as exc:
+                errors.append({
+                    "index": index,
+                    "code": DUPLICATE_KEY_ERROR,
+                    "errmsg": str(exc),
+                    "op": doc,
+                })
+                if ordered:
+                    break
+
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors,
+                "writeConcernErrors": [],
+                "nInserted": len(inserted),
+                "nUpserted": 0,
+                "nMatched": 0,
+                "nModified": 0,
+                "nRemoved": 0,
+                "upserted": [],
+            })
+        return InsertManyResult(inserted, True)
+
+    def _update(self, filter, update, upsert, multi) -> dict:
+        result = {"n": 0, "nModified": 0}
+        for doc in list(self._matching(filter)):
+            updated = apply_update(doc, update)
+            result["n"] += 1
+            if updated != doc:
+                self._replace(doc, updated)
+                result["nModified"] += 1
+            if not multi:
+                break
+
+        if result["n"] == 0 and upsert:
+            doc = apply_update(
+                {"_id": ObjectId(), **_equality_fields(filter)}, update, inserting=True
+            )
+            result["upserted"] = self._insert(doc)
+            result["n"] = 1
+        return result
+
+    @_command("update")
+    async def update_one(self, filter, update, upsert=False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._update(filter, update, upsert, multi=False), True)
+
+    @_command("update")
+    async def update_many(self, filter, update, upsert=False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._update(filter, update, upsert, multi=True), True)
+
+    @_command("update")
+    async def replace_one(self, filter, replacement, upsert=False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._update(filter, replacement, upsert, multi=False), True)
+
+    @_command("findAndModify")
+    async def find_one_and_update(
+        self,
+        filter,
+        update,
+        projection=None,
+        sort=None,
+        upsert=False,
+        return_document=ReturnDocument.BEFORE,
+        **kwargs,
+    ):
+        docs = list(self._matching(filter))
+        if sort:
+            docs = _sort_docs(docs, list(sort))
+
+        if docs:
+            before = docs[0]
+            after = apply_update(before, update)
+            if after != before:
+                self._replace(before, after)
+        elif upsert:
+            before = None
+            after = apply_update(
+                {"_id": ObjectId(), **_equality_fields(filter)}, update, inserting=True
+            )
+            self._insert(after)
+        else:
+            return None
+
+        doc = after if return_document == ReturnDocument.AFTER else before
+        return project(doc, projection) if doc is not None else None
+
+    @_command("findAndModify")
+    async def find_one_and_delete(self, filter, projection=None, **kwargs):
+        for doc in self._matching(filter):
+            self._remove(doc)
+            return project(doc, projection)
+        return None
+
+    @_command("delete")
+    async def delete_one(self, filter, **kwargs) -> DeleteResult:
+        for doc in self._matching(filter):
+            self._remove(doc)
+            return DeleteResult({"n": 1}, True)
+        return DeleteResult({"n": 0}, True)
+
+    @_command("delete")
+    async def delete_many(self, filter, **kwargs) -> DeleteResult:
+        docs = list(self._matching(filter))
+        for doc in docs:
+            self._remove(doc)
+        return DeleteResult({"n": len(docs)}, True)
+
+    @_command("drop")
+    async def drop(self, **kwargs) -> None:
+        self.database._collections.pop(self.name, None)
+
+    async def bulk_write(self, requests: list, ordered=True, **kwargs) -> BulkWriteResult:
+        # pymongo write models keep their arguments in private attributes.
+        # The driver sends one command per kind of operation in the batch.
+        started = time.perf_counter()
+        commands = dict.fromkeys(
+            "insert"
+            if isinstance(request, InsertOne)
+            else "delete"
+            if isinstance(request, (DeleteOne, DeleteMany))
+            else "update"
+            for request in requests
+        )
+        result = {
+            "writeErrors": [],
+            "writeConcernErrors": [],
+            "nInserted": 0,
+            "nUpserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nRemoved": 0,
+            "upserted": [],
+        }
+
+        for index, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    result["nInserted"] += 1
+                elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    outcome = self._update(
+                        request._filter,
+                        request._doc,
+                        bool(request._upsert),
+                        multi=isinstance(request, UpdateMany),
+                    )
+                    if "upserted" in outcome:
+                        result["nUpserted"] += 1
+                        result["upserted"].append(
+                            {"index": index, "_id": outcome["upserted"]}
+                        )
+                    else:
+                        result["nMatched"] += outcome["n"]
+                        result["nModified"] += outcome["nModified"]
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    docs = list(self._matching(request._filter))
+                    if isinstance(request, DeleteOne):
+                        docs = docs[:1]
+                    for doc in docs:
+                        self._remove(doc)
+                    result["nRemoved"] += len(docs)
+                else:
+                    raise TypeError(f"unsupported bulk operation: {request!r}")
+            except DuplicateKeyError as exc:
+                result["writeErrors"].append({
+                    "index": index,
+                    "code": DUPLICATE_KEY_ERROR,
+                    "errmsg": str(exc),
+                    "op": request,
+                })
+                if ordered:
+                    break
+
+        for command in commands:
+            _observe(command, started)
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+
+# -----------------------------
+# Database and client
+# -----------------------------
+class MemoryDatabase:
+    def __init__(self, client: "MemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self._collections: dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(self, name)
+        return collection
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    @_command("listCollections")
+    async def list_collection_names(self, **kwargs) -> list[str]:
+        return list(self._collections)
+
+    async def command(self, command, **kwargs) -> dict:
+        # ping/hello succeed; there is no replica set, so no transactions
+        name = command if isinstance(command, str) else next(iter(command))
+        _observe(name, time.perf_counter())
+        return {"ok": 1.0}
+
+
+class MemoryClient:
+    def __init__(self):
+        self._databases: dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        database = self._databases.get(name)
+        if database is None:
+            database = self._databases[name] = MemoryDatabase(self, name)
+        return database
+
+    def get_database(self, name: str, **kwargs) -> MemoryDatabase:
+        return self[name]
+
+    @property
+    def admin(self) -> MemoryDatabase:
+        return self["admin"]
+
+    def close(self) -> None:
+        pass
+
+
+# One engine per process, so data outlives app restarts within it (the
+# test suite starts the lifespan once per test)
+memory_client = MemoryClient()
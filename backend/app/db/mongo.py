@@ -1,8 +1,28 @@
+import asyncio
+import logging
 import os
+from typing import Callable, Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference
+from pymongo.errors import PyMongoError
+
+from app.core.profiling import PROFILE_DRIVER_COMMANDS, PROFILING_ENABLED
+from app.db.indexes import ensure_indexes
+from app.db.monitoring import (
+    carry_profile_to_driver,
+    command_monitor,
+    pool_monitor,
+)
+
+logger = logging.getLogger(__name__)
 
 ENV = os.getenv("ENV", "development")
 
+# "mongo", or "memory" for the in-process engine in app.db.memory (tests,
+# offline kiosks); memory data does not survive a restart
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()
+
 if ENV == "development":
     # Local development defaults
     MONGODB_URL = os.getenv(
@@ -25,9 +45,137 @@ else:
         raise RuntimeError("MONGODB_DB_NAME is not set in production")
 
 
+# Connection pool tuning; unset values keep the driver defaults
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS")
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000")
+)
+# e.g. "zstd,snappy,zlib"; zstd and snappy need their python packages
+MONGODB_COMPRESSORS = os.getenv("MONGODB_COMPRESSORS")
+# Startup gives up warming the pool after this long and serves anyway
+MONGODB_WARM_UP_TIMEOUT_MS = int(os.getenv("MONGODB_WARM_UP_TIMEOUT_MS", "5000"))
+# How often setup is retried while the database is unreachable
+MONGODB_SETUP_RETRY_INTERVAL = float(os.getenv("MONGODB_SETUP_RETRY_INTERVAL", "5"))
+
+# Where catalogue listings and searches are read from
+CATALOGUE_READ_PREFERENCE = os.getenv("CATALOGUE_READ_PREFERENCE", "primary")
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+if CATALOGUE_READ_PREFERENCE not in READ_PREFERENCES:
+    raise RuntimeError(
+        f"CATALOGUE_READ_PREFERENCE must be one of {', '.join(READ_PREFERENCES)}"
+    )
+
+
 def get_client() -> AsyncIOMotorClient:
-    return AsyncIOMotorClient(MONGODB_URL)
+    options = {
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [pool_monitor, command_monitor],
+    }
+    if MONGODB_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = int(MONGODB_WAIT_QUEUE_TIMEOUT_MS)
+    if MONGODB_COMPRESSORS:
+        options["compressors"] = MONGODB_COMPRESSORS
+    if PROFILING_ENABLED and PROFILE_DRIVER_COMMANDS:
+        carry_profile_to_driver()
+
+    return AsyncIOMotorClient(MONGODB_URL, **options)
 
 
 def get_database(client: AsyncIOMotorClient):
     return client[MONGODB_DB_NAME]
+
+
+def catalogue_reads(collection):
+    # Catalogue reads tolerate slightly stale data, so they may go to
+    # secondaries; writes and stock checks always use the primary.
+    if CATALOGUE_READ_PREFERENCE == "primary":
+        return collection
+    return collection.with_options(
+        read_preference=READ_PREFERENCES[CATALOGUE_READ_PREFERENCE]
+    )
+
+
+async def warm_up(client: AsyncIOMotorClient) -> bool:
+    # Concurrent pings force the pool to open min_pool_size connections
+    # now, instead of the first requests after a deploy paying for them.
+    # False when the database did not answer in time: the app still
+    # starts, and requests fail (and recover) on their own.
+    pings = max(1, MONGODB_MIN_POOL_SIZE)
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(client.admin.command("ping") for _ in range(pings))),
+            MONGODB_WARM_UP_TIMEOUT_MS / 1000,
+        )
+    except (PyMongoError, asyncio.TimeoutError) as exc:
+        logger.warning("Could not warm up the MongoDB connection pool: %r", exc)
+        return False
+    return True
+
+
+async def supports_transactions(client: AsyncIOMotorClient) -> bool:
+    # Multi-document transactions need a replica set (Atlas always is one);
+    # a standalone local mongod is not. Raises when the server is down.
+    hello = await client.admin.command("hello")
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
+class DatabaseSetup:
+    # The startup steps that need the server: the transaction probe and
+    # the index build. Unique indexes are what reject duplicate emails and
+    # sweet names, so a start during an outage keeps retrying both in the
+    # background until they succeed, then reports the probe to on_ready.
+    def __init__(
+        self,
+        client: AsyncIOMotorClient,
+        on_ready: Callable[[bool], None],
+        interval: float = MONGODB_SETUP_RETRY_INTERVAL,
+    ):
+        self.client = client
+        self.on_ready = on_ready
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, reachable: bool = True) -> None:
+        # Tried straight away when the server answered the warm-up, so a
+        # normal start is ready before it serves
+        if not (reachable and await self._attempt()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if await self._attempt():
+                    return
+            except Exception:
+                logger.exception("Database setup failed")
+
+    async def _attempt(self) -> bool:
+        try:
+            transactions = await supports_transactions(self.client)
+            await ensure_indexes(get_database(self.client))
+        except PyMongoError as exc:
+            logger.warning("Database setup failed, will retry: %r", exc)
+            return False
+        self.on_ready(transactions)
+        return True
@@ -0,0 +1,117 @@
+import contextvars
+import functools
+import threading
+from collections import defaultdict
+
+from motor.frameworks import asyncio as motor_asyncio
+from pymongo import monitoring
+
+from app.core.metrics import MONGO_COMMANDS, MONGO_LATENCY
+from app.core.profiling import add_span, current_profile
+
+
+# Pool utilisation per server, fed by the driver's connection pool events.
+# Events arrive on driver threads, hence the lock.
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: dict[str, dict[str, int]] = defaultdict(
+            lambda: {
+                "open": 0,
+                "in_use": 0,
+                "waiting": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "cleared": 0,
+            }
+        )
+
+    def _bump(self, event, **deltas) -> None:
+        address = "%s:%s" % event.address
+        with self._lock:
+            pool = self._pools[address]
+            for name, delta in deltas.items():
+                pool[name] += delta
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+    def connection_created(self, event):
+        self._bump(event, open=1)
+
+    def connection_closed(self, event):
+        self._bump(event, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._bump(event, waiting=1)
+
+    def connection_checked_out(self, event):
+        self._bump(event, waiting=-1, in_use=1, checkouts=1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(event, waiting=-1, checkout_failures=1)
+
+    def connection_checked_in(self, event):
+        self._bump(event, in_use=-1)
+
+    def pool_cleared(self, event):
+        self._bump(event, cleared=1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+pool_monitor = PoolMonitor()
+
+
+# Per-command round-trip counts and timings, as measured by the driver.
+# Commands of a profiled request also become spans of its profile.
+class CommandMonitor(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._observe(event, "success")
+
+    def failed(self, event):
+        self._observe(event, "failure")
+
+    @staticmethod
+    def _observe(event, outcome: str) -> None:
+        duration = event.duration_micros / 1e6
+        MONGO_COMMANDS.inc(event.command_name, outcome)
+        MONGO_LATENCY.observe(duration, event.command_name)
+        add_span(f"mongo.{event.command_name}", duration)
+
+
+command_monitor = CommandMonitor()
+
+
+# Motor runs every operation on a thread pool, which does not carry the
+# caller's context variables, so the listener above would never see the
+# request's profile. With PROFILE_DRIVER_COMMANDS on, profiled requests
+# have their context carried over; everything else goes straight through.
+_run_on_executor = motor_asyncio.run_on_executor
+
+
+def _run_in_context(loop, fn, *args, **kwargs):
+    if current_profile() is None:
+        return _run_on_executor(loop, fn, *args, **kwargs)
+    context = contextvars.copy_context()
+    return _run_on_executor(
+        loop, context.run, functools.partial(fn, *args, **kwargs)
+    )
+
+
+def carry_profile_to_driver() -> None:
+    motor_asyncio.run_on_executor = _run_in_context
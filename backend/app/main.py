@@ -1,21 +1,107 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 
-from app.db.mongo import get_client, get_database
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+from app.core.cache import create_catalogue_cache
+from app.core.idempotency import create_idempotency_store
+from app.core.metrics import MetricsMiddleware, render
+from app.core.profiling import PROFILING_ENABLED, ProfilingMiddleware
+from app.core.rate_limit import create_rate_limit_backend
+from app.core.responses import FastJSONResponse
+from app.db.catalogue_snapshot import CATALOGUE_SNAPSHOT, CatalogueSnapshot
+from app.db.memory import memory_client
+from app.db.mongo import (
+    STORAGE_BACKEND,
+    DatabaseSetup,
+    get_client,
+    get_database,
+    warm_up,
+)
+from app.repositories.ledger_repository import create_ledger_writer
+from app.repositories.purchase_coalescer import create_purchase_coalescer
+from app.repositories.reservation_repository import ReservationSweeper
+from app.routes.admin import router as admin_router
 from app.routes.auth import router as auth_router
+from app.routes.reports import router as reports_router
 from app.routes.sweets import router as sweets_router
 from app.routes.inventory import router as inventory_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create MongoDB client on startup
-    client = get_client()
+    # Create the database client on startup: MongoDB, or the in-process
+    # engine when STORAGE_BACKEND=memory
+    client = memory_client if STORAGE_BACKEND == "memory" else get_client()
     app.state.mongo_client = client
     app.state.db = get_database(client)
+    # A database that is down does not stop the app from starting; the
+    # transaction probe and the index build then run once it is back.
+    # Until then checkout runs without transactions and the snapshot polls.
+    reachable = await warm_up(client)
+    app.state.supports_transactions = False
+    app.state.catalogue_snapshot = None
+
+    def database_ready(transactions: bool) -> None:
+        app.state.supports_transactions = transactions
+        if app.state.catalogue_snapshot:
+            app.state.catalogue_snapshot.use_change_stream = transactions
+
+    app.state.database_setup = DatabaseSetup(client, database_ready)
+    await app.state.database_setup.start(reachable)
+
+    app.state.catalogue_cache = create_catalogue_cache()
+    app.state.idempotency_store = create_idempotency_store(app.state.db)
+    app.state.rate_limit_backend = create_rate_limit_backend(app.state.db)
+    app.state.ledger = create_ledger_writer(app.state.db)
+    # Sweets this worker has seen with sharded stock, id -> shard count
+    app.state.sharded_sweets = {}
+    app.state.purchase_coalescer = create_purchase_coalescer(
+        app.state.db["sweets"]
+    )
+
+    # Optional live copy of the catalogue, kept coherent across workers
+    if CATALOGUE_SNAPSHOT:
+        cache = app.state.catalogue_cache
+        snapshot = CatalogueSnapshot(
+            app.state.db["sweets"],
+            use_change_stream=app.state.supports_transactions,
+            on_change=cache.clear if cache else None,
+        )
+        await snapshot.start()
+        app.state.catalogue_snapshot = snapshot
+
+    # Puts the stock of abandoned cart reservations back on sale, and
+    # shows it in this worker's cache and snapshot straight away
+    def released(sweets: list[dict]) -> None:
+        if app.state.catalogue_cache:
+            app.state.catalogue_cache.clear()
+        if app.state.catalogue_snapshot:
+            for sweet in sweets:
+                app.state.catalogue_snapshot.put(sweet)
+
+    app.state.reservation_sweeper = ReservationSweeper(
+        app.state.db, app.state.ledger, on_release=released
+    )
+    await app.state.reservation_sweeper.start()
 
     yield  # Application runs here
 
+    await app.state.reservation_sweeper.stop()
+    await app.state.database_setup.stop()
+
+    if app.state.catalogue_snapshot:
+        await app.state.catalogue_snapshot.stop()
+    if app.state.purchase_coalescer:
+        await app.state.purchase_coalescer.close()
+    # Last, as everything above may still record stock changes
+    await app.state.ledger.flush()
+
     # Close MongoDB client on shutdown
     client.close()
 
@@ -24,6 +110,7 @@ app = FastAPI(
     title="Sweet Shop Management System",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 
@@ -35,6 +122,13 @@ def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(
+        render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 # --------------------
 # Route registration
 # --------------------
@@ -51,6 +145,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large bodies (full catalogue listings, exports). Brotli is used
+# when the optional brotli-asgi package is installed; it falls back to
+# gzip for clients that do not accept br.
+if BrotliMiddleware:
+    app.add_middleware(BrotliMiddleware, minimum_size=1024)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Span breakdowns and call stacks for requests an admin asks about (or a
+# sampled few); unprofiled requests only pay for a header scan
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Per-route request counts, latency histograms and in-flight gauges
+app.add_middleware(MetricsMiddleware)
+
 
 # Auth routes: register, login
 app.include_router(auth_router)
@@ -59,4 +169,10 @@ app.include_router(auth_router)
 app.include_router(sweets_router)
 
 # Inventory router: purchase, restock
-app.include_router(inventory_router)
\ No newline at end of file
+app.include_router(inventory_router)
+
+# Admin routes: operational stats
+app.include_router(admin_router)
+
+# Report routes: sales rollups
+app.include_router(reports_router)
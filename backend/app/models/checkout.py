@@ -0,0 +1,19 @@
+from bson import ObjectId
+from pydantic import BaseModel, Field, field_validator
+
+
+class CartItem(BaseModel):
+    sweet_id: str
+    quantity: int = Field(default=1, gt=0)
+
+    @field_validator("sweet_id")
+    @classmethod
+    def sweet_id_is_object_id(cls, value: str) -> str:
+        # Rejected here with a 422, before checkout turns it into an ObjectId
+        if not ObjectId.is_valid(value):
+            raise ValueError("sweet_id is not a valid id")
+        return value
+
+
+class CheckoutRequest(BaseModel):
+    items: list[CartItem] = Field(min_length=1)
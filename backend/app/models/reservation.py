@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+
+
+class ReservationRequest(BaseModel):
+    quantity: int = Field(default=1, gt=0)
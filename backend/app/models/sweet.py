@@ -13,5 +13,45 @@ class SweetCreate(SweetBase):
     pass
 
 
+class SweetUpdate(BaseModel):
+    name: Optional[str] = None
+    category: Optional[str] = None
+    price: Optional[float] = None
+    quantity: Optional[int] = None
+
+
 class SweetInDB(SweetBase):
     id: Optional[str] = Field(alias="_id")
+    # Set on sweets whose stock is spread over stock_shards
+    shards: Optional[int] = None
+    # Held by open cart reservations, on top of the available quantity
+    reserved: Optional[int] = None
+
+
+class SweetPage(BaseModel):
+    items: list[SweetInDB]
+    next_cursor: Optional[str] = None
+
+
+class CategoryCount(BaseModel):
+    category: str
+    count: int
+
+
+class PriceRange(BaseModel):
+    min: float
+    max: Optional[float] = None
+    count: int
+
+
+class SweetFacets(BaseModel):
+    total: int
+    in_stock: int
+    categories: list[CategoryCount]
+    price_ranges: list[PriceRange]
+    # Priced below the first range
+    prices_out_of_range: int = 0
+
+
+class FacetedSweetPage(SweetPage):
+    facets: SweetFacets
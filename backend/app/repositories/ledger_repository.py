@@ -0,0 +1,301 @@
+import asyncio
+import contextvars
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.core.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+# Event kinds that count as sales in the rollups
+SALES = {"purchase", "checkout", "reservation"}
+PERIODS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+# Reports cover this many periods when no range is given
+DEFAULT_REPORT_SPAN = {"hour": 48, "day": 30}
+# How long recorded events wait to be written together
+LEDGER_FLUSH_INTERVAL_MS = float(os.getenv("LEDGER_FLUSH_INTERVAL_MS", "200"))
+# A buffer this large is written straight away
+LEDGER_MAX_BATCH = int(os.getenv("LEDGER_MAX_BATCH", "500"))
+# Failed writes are retried after a delay that doubles up to this
+LEDGER_RETRY_MAX_DELAY_MS = float(os.getenv("LEDGER_RETRY_MAX_DELAY_MS", "30000"))
+DUPLICATE_KEY_ERROR = 11000
+
+
+def period_start(at: datetime, period: str) -> datetime:
+    start = at.replace(minute=0, second=0, microsecond=0)
+    return start.replace(hour=0) if period == "day" else start
+
+
+def _utc(at: datetime) -> datetime:
+    # The driver hands back naive UTC datetimes
+    return at if at.tzinfo else at.replace(tzinfo=timezone.utc)
+
+
+# Append-only history of stock changes in inventory_events, plus hourly
+# and daily totals per sweet and per category in sales_rollups. The
+# rollups are kept up to date with upserted $inc's as events are written,
+# so a report reads a few dozen small documents instead of every event.
+class LedgerRepository:
+    def __init__(self, db):
+        self.events = db["inventory_events"]
+        self.rollups = db["sales_rollups"]
+
+    async def insert(self, events: list[dict]) -> list[dict]:
+        # Returns the events that were not written. Events carry their _id,
+        # so one the server took on an attempt that still failed comes
+        # back as a duplicate next time, and counts as written then.
+        try:
+            await self.events.insert_many(events, ordered=False)
+        except BulkWriteError as exc:
+            failed = {
+                error["index"]
+                for error in exc.details["writeErrors"]
+                if error["code"] != DUPLICATE_KEY_ERROR
+            }
+            return [events[index] for index in sorted(failed)]
+        except PyMongoError:
+            return events
+        return []
+
+    async def roll_up(self, updates: list[UpdateOne]) -> list[UpdateOne]:
+        # Returns the rollup updates that were not applied. A batch lost on
+        # the wire may have applied anyway; the driver's retryable writes
+        # settle most of those before an error gets this far.
+        try:
+            await self.rollups.bulk_write(updates, ordered=False)
+        except BulkWriteError as exc:
+            return [updates[error["index"]] for error in exc.details["writeErrors"]]
+        except PyMongoError:
+            return updates
+        return []
+
+    @staticmethod
+    def rollup_updates(events: list[dict]) -> list[UpdateOne]:
+        # Events are merged first, so a batch touching one category many
+        # times still costs one upsert per rollup document
+        totals: dict[tuple, dict] = {}
+        for event in events:
+            if event["kind"] in SALES:
+                field = "units_sold"
+            elif event["kind"] == "restock":
+                field = "units_restocked"
+            else:
+                continue
+
+            for period in PERIODS:
+                start = period_start(event["at"], period)
+                for scope, key in (
+                    ("sweet", str(event["sweet_id"])),
+                    ("category", event["category"]),
+                ):
+                    total = totals.setdefault(
+                        (period, scope, key, start),
+                        {"inc": {"events": 0}, "event": event},
+                    )
+                    total["inc"][field] = (
+                        total["inc"].get(field, 0) + event["quantity"]
+                    )
+                    total["inc"]["events"] += 1
+                    if field == "units_sold":
+                        total["inc"]["revenue"] = (
+                            total["inc"].get("revenue", 0)
+                            + event["price"] * event["quantity"]
+                        )
+
+        updates = []
+        for (period, scope, key, start), total in totals.items():
+            labels = {"category": total["event"]["category"]}
+            if scope == "sweet":
+                labels["name"] = total["event"]["name"]
+            updates.append(
+                UpdateOne(
+                    {"period": period, "scope": scope, "key": key, "start": start},
+                    {"$inc": total["inc"], "$set": labels},
+                    upsert=True,
+                )
+            )
+        return updates
+
+    # -----------------------------
+    # Sales Report
+    # -----------------------------
+    @profiled
+    async def sales_report(
+        self,
+        period: str = "day",
+        group: str = "category",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        category: Optional[str] = None,
+    ) -> dict:
+        if period not in PERIODS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown period: {period}",
+            )
+        if group not in ("sweet", "category"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown group: {group}",
+            )
+
+        end = _utc(end) if end else datetime.now(timezone.utc)
+        if start:
+            start = _utc(start)
+        else:
+            start = period_start(end, period) - (
+                PERIODS[period] * (DEFAULT_REPORT_SPAN[period] - 1)
+            )
+
+        query = {
+            "period": period,
+            "scope": group,
+            "start": {"$gte": period_start(start, period), "$lt": end},
+        }
+        if category:
+            query["category"] = category
+
+        cursor = self.rollups.find(
+            query, {"_id": 0, "period": 0, "scope": 0}
+        ).sort([("start", 1), ("key", 1)])
+
+        rows = []
+        async for rollup in cursor:
+            rollup["start"] = _utc(rollup["start"])
+            rows.append(
+                {
+                    "units_sold": 0,
+                    "revenue": 0,
+                    "units_restocked": 0,
+                    **rollup,
+                }
+            )
+
+        return {
+            "period": period,
+            "group": group,
+            "start": start,
+            "end": end,
+            "rows": rows,
+        }
+
+
+# Group commit for the ledger. Events are buffered per worker and written
+# with their rollups every LEDGER_FLUSH_INTERVAL_MS, as one insert_many and
+# one bulk_write for every purchase, checkout and restock in between, so
+# recording costs a request no round trip. Rollups are only taken from the
+# events that were inserted. Whatever fails (during a failover, say) goes
+# back in the buffer and is retried with backoff. Buffered events are lost
+# if the worker dies before a flush; reports flush first, so they see this
+# worker's sales.
+class LedgerWriter:
+    def __init__(
+        self,
+        repository: LedgerRepository,
+        interval: float = LEDGER_FLUSH_INTERVAL_MS / 1000,
+        max_batch: int = LEDGER_MAX_BATCH,
+    ):
+        self.repository = repository
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending: list[dict] = []
+        # Rollups of inserted events that could not be applied yet
+        self._rollups: list[UpdateOne] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: set[asyncio.Task] = set()
+        self._failures = 0
+
+    @profiled
+    async def record(self, kind: str, lines: list[tuple[dict, int]]) -> None:
+        # lines: (sweet after the change, quantity moved)
+        if not lines:
+            return
+
+        at = datetime.now(timezone.utc)
+        self._pending.extend(
+            {
+                "_id": ObjectId(),
+                "kind": kind,
+                "sweet_id": ObjectId(sweet["_id"]),
+                "name": sweet["name"],
+                "category": sweet["category"],
+                "quantity": quantity,
+                "price": sweet["price"],
+                "at": at,
+            }
+            for sweet, quantity in lines
+        )
+
+        # Flushes run in a fresh context, outside the request that happened
+        # to trigger them (and its profile)
+        loop = asyncio.get_running_loop()
+        if len(self._pending) >= self.max_batch and not self._failures:
+            loop.call_soon(self._flush, context=contextvars.Context())
+        elif self._timer is None:
+            self._timer = loop.call_later(
+                self.interval, self._flush, context=contextvars.Context()
+            )
+
+    async def flush(self) -> None:
+        # Writes everything recorded so far, and waits for earlier flushes
+        self._flush()
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def _flush(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        events, self._pending = self._pending, []
+        rollups, self._rollups = self._rollups, []
+        if not events and not rollups:
+            return
+
+        task = asyncio.create_task(self._write(events, rollups))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _write(self, events: list[dict], rollups: list[UpdateOne]) -> None:
+        failed = await self.repository.insert(events) if events else []
+        if len(failed) < len(events):
+            failed_ids = {event["_id"] for event in failed}
+            rollups += self.repository.rollup_updates(
+                [event for event in events if event["_id"] not in failed_ids]
+            )
+        unapplied = await self.repository.roll_up(rollups) if rollups else []
+
+        if not failed and not unapplied:
+            self._failures = 0
+            return
+
+        # Back in the buffer, ahead of anything recorded meanwhile
+        self._pending[:0] = failed
+        self._rollups[:0] = unapplied
+        self._failures += 1
+        delay = min(
+            self.interval * 2 ** self._failures, LEDGER_RETRY_MAX_DELAY_MS / 1000
+        )
+        logger.warning(
+            "Could not record %d events and %d rollups in the sales ledger; "
+            "retrying in %.1fs",
+            len(failed),
+            len(unapplied),
+            delay,
+        )
+        if self._timer:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(
+            delay, self._flush, context=contextvars.Context()
+        )
+
+
+def create_ledger_writer(db) -> LedgerWriter:
+    return LedgerWriter(LedgerRepository(db))
@@ -0,0 +1,139 @@
+import asyncio
+import os
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.core.metrics import PURCHASE_BATCH_SIZE
+from app.core.profiling import profiled
+
+PURCHASE_COALESCING = os.getenv("PURCHASE_COALESCING", "false").lower() == "true"
+# How long the first purchase of a batch waits for others to join it
+PURCHASE_COALESCE_WINDOW_MS = float(os.getenv("PURCHASE_COALESCE_WINDOW_MS", "2"))
+# A batch this large is written straight away
+PURCHASE_COALESCE_MAX_BATCH = int(os.getenv("PURCHASE_COALESCE_MAX_BATCH", "100"))
+
+
+# Group commit for purchases. Concurrent purchases of the same sweet are
+# held for a few milliseconds and then written as one guarded update,
+# so a rush on a hot sweet costs one write round trip per batch instead
+# of one per buyer. Each caller still gets its own outcome.
+class PurchaseCoalescer:
+    def __init__(
+        self,
+        collection,
+        window: float = PURCHASE_COALESCE_WINDOW_MS / 1000,
+        max_batch: int = PURCHASE_COALESCE_MAX_BATCH,
+    ):
+        self.collection = collection
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[ObjectId, list[tuple[int, asyncio.Future]]] = {}
+        self._timers: dict[ObjectId, asyncio.TimerHandle] = {}
+        self._flushing: set[asyncio.Task] = set()
+
+    @profiled
+    async def purchase(self, sweet_id: ObjectId, quantity: int) -> Optional[dict]:
+        # The sweet after this caller's batch, or None when the purchase
+        # failed (missing sweet or not enough stock)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._pending.setdefault(sweet_id, [])
+        batch.append((quantity, future))
+        if len(batch) == 1:
+            self._timers[sweet_id] = loop.call_later(
+                self.window, self._flush, sweet_id
+            )
+        elif len(batch) >= self.max_batch:
+            self._flush(sweet_id)
+
+        return await future
+
+    async def close(self) -> None:
+        # Writes whatever is still waiting, so shutdown drops no purchase
+        for sweet_id in list(self._pending):
+            self._flush(sweet_id)
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def _flush(self, sweet_id: ObjectId) -> None:
+        timer = self._timers.pop(sweet_id, None)
+        if timer:
+            timer.cancel()
+
+        # Callers that gave up before the write are left out of it
+        batch = [
+            (quantity, future)
+            for quantity, future in self._pending.pop(sweet_id, [])
+            if not future.done()
+        ]
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._apply(sweet_id, batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _apply(
+        self, sweet_id: ObjectId, batch: list[tuple[int, asyncio.Future]]
+    ) -> None:
+        PURCHASE_BATCH_SIZE.observe(len(batch))
+        try:
+            results = await self._write(sweet_id, [quantity for quantity, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _write(
+        self, sweet_id: ObjectId, quantities: list[int]
+    ) -> list[Optional[dict]]:
+        # Smallest purchases first, so a short batch serves as many buyers
+        # as the stock allows. The batch is taken as one guarded update of
+        # its total; only when that does not fit is the stock read, and the
+        # longest run of purchases that fits it is taken instead.
+        order = sorted(range(len(quantities)), key=quantities.__getitem__)
+        results: list[Optional[dict]] = [None] * len(quantities)
+
+        fits = len(order)
+        while fits:
+            total = sum(quantities[index] for index in order[:fits])
+            sweet = await self.collection.find_one_and_update(
+                {"_id": sweet_id, "quantity": {"$gte": total}},
+                {"$inc": {"quantity": -total}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if sweet:
+                for index in order[:fits]:
+                    # Callers finish the document off on their own copy
+                    results[index] = dict(sweet)
+                return results
+
+            # Failure path only: is the sweet there, and how much is left
+            current = await self.collection.find_one(
+                {"_id": sweet_id}, {"quantity": 1}
+            )
+            if current is None:
+                return results
+
+            fits, total = 0, 0
+            for index in order:
+                total += quantities[index]
+                if total > current["quantity"]:
+                    break
+                fits += 1
+
+        return results
+
+
+def create_purchase_coalescer(collection) -> Optional[PurchaseCoalescer]:
+    if not PURCHASE_COALESCING:
+        return None
+    return PurchaseCoalescer(collection)
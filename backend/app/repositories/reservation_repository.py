@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, Request, status
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from app.core.profiling import profiled
+from app.repositories.ledger_repository import LedgerWriter
+from app.repositories.sweet_repository import SweetRepository
+
+logger = logging.getLogger(__name__)
+
+# How long a cart may hold stock before it goes back on sale
+RESERVATION_TTL = int(os.getenv("RESERVATION_TTL", "900"))
+# Settled reservations are kept this long, then removed by the TTL index
+RESERVATION_RETENTION = int(os.getenv("RESERVATION_RETENTION", "86400"))
+RESERVATION_SWEEP_INTERVAL = float(os.getenv("RESERVATION_SWEEP_INTERVAL", "15"))
+
+HELD = "held"
+
+
+def _settled(state: str) -> dict:
+    # purge_at is only set once a hold is over, so the TTL index can never
+    # delete a reservation that still owns stock
+    purge_at = datetime.now(timezone.utc) + timedelta(seconds=RESERVATION_RETENTION)
+    return {"$set": {"status": state, "purge_at": purge_at}}
+
+
+def _reservation_oid(reservation_id: str) -> ObjectId:
+    # A malformed id names no reservation
+    if not ObjectId.is_valid(reservation_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reservation not found",
+        )
+    return ObjectId(reservation_id)
+
+
+def _serialize(reservation: dict) -> dict:
+    reservation.pop("purge_at", None)
+    reservation["_id"] = str(reservation["_id"])
+    reservation["sweet_id"] = str(reservation["sweet_id"])
+    return reservation
+
+
+class ReservationRepository:
+    def __init__(self, request: Request):
+        self.collection = request.app.state.db["reservations"]
+        self.sweets = SweetRepository(request)
+
+    # -----------------------------
+    # Reserve Stock
+    # -----------------------------
+    @profiled
+    async def reserve(self, sweet_id: str, quantity: int, user: str) -> dict:
+        # The sweet's quantity stays the available stock, so listings and
+        # purchases need no knowledge of reservations
+        sweet = await self.sweets.reserve_stock(sweet_id, quantity)
+
+        reservation = {
+            "sweet_id": ObjectId(sweet_id),
+            "user": user,
+            "quantity": quantity,
+            "status": HELD,
+            "expires_at": datetime.now(timezone.utc)
+            + timedelta(seconds=RESERVATION_TTL),
+        }
+        try:
+            result = await self.collection.insert_one(reservation)
+        except PyMongoError:
+            # Nothing holds the stock without its record: put it back
+            await self.sweets.settle_reserved(
+                reservation["sweet_id"], quantity, sold=False
+            )
+            raise
+
+        reservation["_id"] = result.inserted_id
+        return {**_serialize(reservation), "sweet": sweet}
+
+    # -----------------------------
+    # Confirm / Release
+    # -----------------------------
+    @profiled
+    async def confirm(self, reservation_id: str, user: str) -> dict:
+        # Only a live hold can be paid for; the expiry is checked by the
+        # same update that settles it, so the sweeper cannot race it
+        reservation = await self.collection.find_one_and_update(
+            {
+                "_id": _reservation_oid(reservation_id),
+                "user": user,
+                "status": HELD,
+                "expires_at": {"$gt": datetime.now(timezone.utc)},
+            },
+            _settled("confirmed"),
+            return_document=ReturnDocument.AFTER,
+        )
+        if not reservation:
+            await self._explain(reservation_id, user)
+
+        await self.sweets.settle_reserved(
+            reservation["sweet_id"], reservation["quantity"], sold=True
+        )
+        return _serialize(reservation)
+
+    @profiled
+    async def release(self, reservation_id: str, user: str) -> dict:
+        reservation = await self.collection.find_one_and_update(
+            {"_id": _reservation_oid(reservation_id), "user": user, "status": HELD},
+            _settled("released"),
+            return_document=ReturnDocument.AFTER,
+        )
+        if not reservation:
+            await self._explain(reservation_id, user)
+
+        await self.sweets.settle_reserved(
+            reservation["sweet_id"], reservation["quantity"], sold=False
+        )
+        return _serialize(reservation)
+
+    async def _explain(self, reservation_id: str, user: str) -> None:
+        # Failure path only: why the reservation could not be settled
+        reservation = await self.collection.find_one(
+            {"_id": _reservation_oid(reservation_id), "user": user}, {"status": 1}
+        )
+
+        if not reservation:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Reservation not found",
+            )
+
+        # Still held here means it ran out before the sweeper came round
+        if reservation["status"] in (HELD, "expired"):
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Reservation has expired",
+            )
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Reservation is already {reservation['status']}",
+        )
+
+
+# -----------------------------
+# Expired Reservations
+# -----------------------------
+async def release_expired(db, ledger: LedgerWriter) -> list[dict]:
+    # Each expired hold is claimed by one atomic update before its stock
+    # is returned, so concurrent sweepers (one per worker) never release
+    # the same reservation twice. Returns the sweets it restocked.
+    released = []
+    while True:
+        reservation = await db["reservations"].find_one_and_update(
+            {"status": HELD, "expires_at": {"$lte": datetime.now(timezone.utc)}},
+            _settled("expired"),
+            projection={"sweet_id": 1, "quantity": 1},
+        )
+        if reservation is None:
+            return released
+
+        sweet = await db["sweets"].find_one_and_update(
+            {"_id": reservation["sweet_id"]},
+            {
+                "$inc": {
+                    "quantity": reservation["quantity"],
+                    "reserved": -reservation["quantity"],
+                }
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if sweet:
+            released.append(sweet)
+            await ledger.record("expire", [(sweet, reservation["quantity"])])
+
+
+class ReservationSweeper:
+    def __init__(
+        self,
+        db,
+        ledger: LedgerWriter,
+        interval: float = RESERVATION_SWEEP_INTERVAL,
+        on_release: Optional[Callable[[list[dict]], None]] = None,
+    ):
+        self.db = db
+        self.ledger = ledger
+        self.interval = interval
+        self.on_release = on_release
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            # Nothing may end this loop, or abandoned holds would keep
+            # their stock for good
+            try:
+                released = await release_expired(self.db, self.ledger)
+                if released and self.on_release:
+                    self.on_release(released)
+            except Exception:
+                logger.exception("Reservation sweep failed")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,134 @@
+import random
+
+from bson import ObjectId
+from pymongo import InsertOne
+
+
+def fill_levels(levels: list[int], amount: int) -> list[int]:
+    # How much to add to each shard so the lowest ones are raised first and
+    # the shards end up as even as the amount allows; never negative, so
+    # it is safe against concurrent purchases.
+    order = sorted(range(len(levels)), key=levels.__getitem__)
+    for count in range(len(levels), 0, -1):
+        lowest = order[:count]
+        level, extra = divmod(sum(levels[i] for i in lowest) + amount, count)
+        if level >= levels[lowest[-1]]:
+            adds = [0] * len(levels)
+            for rank, i in enumerate(lowest):
+                adds[i] = level - levels[i] + (1 if rank < extra else 0)
+            return adds
+    return []
+
+
+# Sub-counters for hot sweets. A sharded sweet keeps its own quantity as a
+# base counter and spreads the rest of its stock over N documents here, so
+# concurrent purchases update different documents instead of queueing on
+# one. Its stock is always base + sum(shards).
+class StockShardRepository:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def create(self, sweet_id: ObjectId, shards: int, quantity: int) -> None:
+        amounts = fill_levels([0] * shards, quantity)
+        await self.collection.bulk_write(
+            [
+                InsertOne({"sweet_id": sweet_id, "shard": shard, "quantity": amount})
+                for shard, amount in enumerate(amounts)
+            ]
+        )
+
+    async def take(
+        self, sweet_id: ObjectId, shards: int, quantity: int, session=None
+    ) -> int:
+        # How much of quantity came out of the shards. Anything short is for
+        # the caller to find on the base counter, or to give back.
+        # A random shard first, so concurrent buyers spread out
+        taken = await self.collection.find_one_and_update(
+            {
+                "sweet_id": sweet_id,
+                "shard": random.randrange(shards),
+                "quantity": {"$gte": quantity},
+            },
+            {"$inc": {"quantity": -quantity}},
+            projection={"_id": 1},
+            session=session,
+        )
+        if taken:
+            return quantity
+
+        # That one ran low: take from whichever shard has the most left
+        taken = await self.collection.find_one_and_update(
+            {"sweet_id": sweet_id, "quantity": {"$gte": quantity}},
+            {"$inc": {"quantity": -quantity}},
+            projection={"_id": 1},
+            sort=[("quantity", -1)],
+            session=session,
+        )
+        if taken:
+            return quantity
+
+        # No shard holds it all: piece it together, fullest shards first
+        remaining = quantity
+        stocked = await self.collection.find(
+            {"sweet_id": sweet_id, "quantity": {"$gt": 0}},
+            {"quantity": 1},
+            session=session,
+        ).sort("quantity", -1).to_list(length=None)
+        for shard in stocked:
+            part = min(shard["quantity"], remaining)
+            result = await self.collection.update_one(
+                {"_id": shard["_id"], "quantity": {"$gte": part}},
+                {"$inc": {"quantity": -part}},
+                session=session,
+            )
+            if result.modified_count:
+                remaining -= part
+                if not remaining:
+                    break
+        return quantity - remaining
+
+    async def give(self, sweet_id: ObjectId, quantity: int, session=None) -> int:
+        # Restocks go to the emptiest shards, rebalancing as they fill.
+        # Returns what could not be placed (no shards, or shards drained
+        # meanwhile) for the caller to put on the base counter.
+        shards = await self.collection.find(
+            {"sweet_id": sweet_id}, {"quantity": 1}, session=session
+        ).to_list(length=None)
+        if not shards:
+            return quantity
+
+        leftover = 0
+        amounts = fill_levels([shard["quantity"] for shard in shards], quantity)
+        for shard, amount in zip(shards, amounts):
+            if amount:
+                result = await self.collection.update_one(
+                    {"_id": shard["_id"]},
+                    {"$inc": {"quantity": amount}},
+                    session=session,
+                )
+                if not result.matched_count:
+                    leftover += amount
+        return leftover
+
+    async def totals(self, sweet_ids: list) -> dict[str, int]:
+        # One aggregation for every sharded sweet on a page
+        pipeline = [
+            {"$match": {"sweet_id": {"$in": [ObjectId(i) for i in sweet_ids]}}},
+            {"$group": {"_id": "$sweet_id", "quantity": {"$sum": "$quantity"}}},
+        ]
+        cursor = self.collection.aggregate(pipeline)
+        return {str(doc["_id"]): doc["quantity"] async for doc in cursor}
+
+    async def drain(self, sweet_id: ObjectId) -> int:
+        # Each shard is removed atomically with whatever stock it held
+        total = 0
+        while True:
+            shard = await self.collection.find_one_and_delete(
+                {"sweet_id": sweet_id}, projection={"quantity": 1}
+            )
+            if shard is None:
+                return total
+            total += shard["quantity"]
+
+    async def remove(self, sweet_id: ObjectId) -> None:
+        await self.collection.delete_many({"sweet_id": sweet_id})
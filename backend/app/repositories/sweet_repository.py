@@ -1,47 +1,157 @@
+import logging
+import os
+import re
+
 from fastapi import HTTPException, status, Request
+from pydantic import ValidationError
 from bson import ObjectId
-from typing import Optional
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import AsyncIterable, AsyncIterator, Callable, Optional
+
+from app.core.pagination import (
+    DEFAULT_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+    sort_spec,
+)
+from app.core.profiling import profiled
+from app.db.mongo import catalogue_reads
+from app.models.checkout import CartItem
+from app.models.sweet import SweetBase, SweetCreate, SweetUpdate
+from app.repositories.stock_shard_repository import StockShardRepository
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 500
+BULK_BATCH_SIZE = 1000
+MAX_STOCK_SHARDS = 64
+# Lower bounds of the price facet buckets; the last one is open-ended
+PRICE_FACET_BOUNDARIES = [
+    float(bound)
+    for bound in os.getenv("PRICE_FACET_BOUNDARIES", "0,5,10,20,50,100").split(",")
+]
+
+
+def _stock_filter(name: str) -> dict:
+    # A sharded sweet's stock is not a single field to overwrite
+    return {"name": name, "shards": {"$exists": False}}
 
-from app.models.sweet import SweetCreate
+
+def _sweet_oid(sweet_id: str) -> ObjectId:
+    # A malformed id names no sweet
+    if not ObjectId.is_valid(sweet_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sweet not found",
+        )
+    return ObjectId(sweet_id)
+
+
+def _name_taken(name: str) -> HTTPException:
+    # Names are unique (bulk imports are keyed on them)
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"A sweet named {name!r} already exists",
+    )
 
 
 class SweetRepository:
     def __init__(self, request: Request):
+        self.client = request.app.state.mongo_client
         self.collection = request.app.state.db["sweets"]
+        self.reads = catalogue_reads(self.collection)
+        self.supports_transactions = getattr(
+            request.app.state, "supports_transactions", False
+        )
+        self.cache = getattr(request.app.state, "catalogue_cache", None)
+        self.snapshot = getattr(request.app.state, "catalogue_snapshot", None)
+        self.shards = StockShardRepository(request.app.state.db["stock_shards"])
+        # sweet id -> shard count for sweets this worker has seen sharded
+        self.sharded = getattr(request.app.state, "sharded_sweets", {})
+        self.coalescer = getattr(request.app.state, "purchase_coalescer", None)
+        self.ledger = request.app.state.ledger
 
     # -----------------------------
     # Create Sweet
     # -----------------------------
+    @profiled
     async def create(self, sweet: SweetCreate) -> dict:
         data = sweet.model_dump()
-        result = await self.collection.insert_one(data)
+        try:
+            result = await self.collection.insert_one(data)
+        except DuplicateKeyError:
+            raise _name_taken(data["name"])
+        self._invalidate(data)
         data["_id"] = str(result.inserted_id)
         return data
 
     # -----------------------------
     # List All Sweets
     # -----------------------------
-    async def list_all(self) -> list[dict]:
-        sweets = []
-        async for sweet in self.collection.find():
-            sweet["_id"] = str(sweet["_id"])
-            sweets.append(sweet)
-        return sweets
+    @profiled
+    async def list_all(
+        self,
+        fields: Optional[list[str]] = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        sort: str = "id",
+    ) -> list[dict] | dict:
+        if self.snapshot and self.snapshot.ready and not (limit or after):
+            # Served from the live in-memory copy, no query needed
+            sweets = self.snapshot.list()
+            if fields:
+                keep = self._projection(fields, "id")
+                sweets = [
+                    {k: v for k, v in sweet.items() if k == "_id" or k in keep}
+                    for sweet in sweets
+                ]
+            return await self._with_shard_totals(sweets, fields)
+
+        return await self._find({}, fields, limit, after, sort)
 
     # -----------------------------
     # Search Sweets
     # -----------------------------
+    @profiled
     async def search(
         self,
         name: Optional[str] = None,
         category: Optional[str] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
-    ) -> list[dict]:
+        match: str = "contains",
+        fields: Optional[list[str]] = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        sort: str = "id",
+    ) -> list[dict] | dict:
+        query, ranked = self._search_query(
+            name, category, min_price, max_price, match
+        )
+        return await self._find(query, fields, limit, after, sort, ranked)
+
+    @staticmethod
+    def _search_query(
+        name: Optional[str],
+        category: Optional[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        match: str,
+    ) -> tuple[dict, bool]:
+        name = name.strip() if name else None
         query: dict = {}
+        ranked = False
 
-        if name:
-            query["name"] = {"$regex": name, "$options": "i"}
+        if name and match == "text":
+            # Word search on the text index, ranked by relevance
+            query["$text"] = {"$search": name}
+            ranked = True
+        elif name and match == "prefix":
+            # Anchored, case-sensitive regex can walk the name index
+            query["name"] = {"$regex": f"^{re.escape(name)}"}
+        elif name:
+            query["name"] = {"$regex": re.escape(name), "$options": "i"}
 
         if category:
             query["category"] = category
@@ -53,43 +163,756 @@ class SweetRepository:
             if max_price is not None:
                 query["price"]["$lte"] = max_price
 
-        sweets = []
-        async for sweet in self.collection.find(query):
-            sweet["_id"] = str(sweet["_id"])
-            sweets.append(sweet)
+        return query, ranked
 
+    # -----------------------------
+    # Search Facets
+    # -----------------------------
+    @profiled
+    async def facets(
+        self,
+        name: Optional[str] = None,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        match: str = "contains",
+    ) -> dict:
+        # One aggregation: the $match runs on the catalogue indexes and
+        # $facet computes every count from that single pass
+        query, _ = self._search_query(name, category, min_price, max_price, match)
+        # The last range is closed with an infinite bound, so $bucket's
+        # default only catches prices below the first boundary
+        boundaries = [*PRICE_FACET_BOUNDARIES, float("inf")]
+        pipeline = [
+            {"$match": query},
+            {
+                "$facet": {
+                    "categories": [
+                        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                        {"$sort": {"count": -1, "_id": 1}},
+                    ],
+                    "prices": [
+                        {
+                            "$bucket": {
+                                "groupBy": "$price",
+                                "boundaries": boundaries,
+                                "default": "out_of_range",
+                                "output": {"count": {"$sum": 1}},
+                            }
+                        }
+                    ],
+                    "stock": [
+                        {
+                            "$group": {
+                                "_id": None,
+                                "total": {"$sum": 1},
+                                "in_stock": {
+                                    "$sum": {
+                                        "$cond": [{"$gt": ["$quantity", 0]}, 1, 0]
+                                    }
+                                },
+                            }
+                        }
+                    ],
+                    # Sharded sweets with an empty base counter may still
+                    # have stock in stock_shards; added up below
+                    "sharded": [
+                        {"$match": {"shards": {"$gt": 0}, "quantity": {"$lte": 0}}},
+                        {"$project": {"_id": 1}},
+                    ],
+                }
+            },
+        ]
+        [result] = await self.reads.aggregate(pipeline).to_list(length=1)
+
+        # Empty buckets are left out by $bucket; report them as zero
+        counts = {bucket["_id"]: bucket["count"] for bucket in result["prices"]}
+        price_ranges = [
+            {
+                "min": low,
+                "max": None if high == float("inf") else high,
+                "count": counts.get(low, 0),
+            }
+            for low, high in zip(boundaries, boundaries[1:])
+        ]
+        stock = result["stock"][0] if result["stock"] else {}
+        in_stock = stock.get("in_stock", 0)
+        if result["sharded"]:
+            totals = await self.shards.totals(
+                [sweet["_id"] for sweet in result["sharded"]]
+            )
+            in_stock += sum(1 for total in totals.values() if total > 0)
+
+        return {
+            "total": stock.get("total", 0),
+            "in_stock": in_stock,
+            "categories": [
+                {"category": group["_id"], "count": group["count"]}
+                for group in result["categories"]
+            ],
+            "price_ranges": price_ranges,
+            "prices_out_of_range": counts.get("out_of_range", 0),
+        }
+
+    async def _find(
+        self,
+        query: dict,
+        fields: Optional[list[str]],
+        limit: Optional[int],
+        after: Optional[str],
+        sort: str,
+        ranked: bool = False,
+    ) -> list[dict] | dict:
+        projection = self._projection(fields, sort)
+
+        # Without paging parameters keep returning the plain list
+        if limit is None and after is None:
+            cursor = self.reads.find(query, projection)
+            if ranked:
+                cursor = cursor.sort([("score", {"$meta": "textScore"})])
+
+            # _id stays an ObjectId; the response encoder stringifies it
+            sweets = await cursor.to_list(length=None)
+            return await self._with_shard_totals(sweets, fields)
+
+        limit = limit or DEFAULT_PAGE_SIZE
+        if after:
+            keyset = decode_cursor(after, sort)
+            query = {"$and": [query, keyset]} if query else keyset
+
+        # Fetch one extra document to learn whether another page exists
+        cursor = (
+            self.reads.find(query, projection)
+            .sort(sort_spec(sort))
+            .limit(limit + 1)
+        )
+        sweets = await cursor.to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(sweets) > limit:
+            sweets = sweets[:limit]
+            next_cursor = encode_cursor(sort, sweets[-1])
+        sweets = await self._with_shard_totals(sweets, fields)
+
+        if fields and sort == "price" and "price" not in fields:
+            for sweet in sweets:
+                sweet.pop("price")
+
+        return {"items": sweets, "next_cursor": next_cursor}
+
+    async def _with_shard_totals(
+        self, sweets: list[dict], fields: Optional[list[str]] = None
+    ) -> list[dict]:
+        # Sharded sweets report base + shard stock as their quantity; the
+        # documents are replaced, never edited, as they may be snapshot's
+        sharded = [
+            index
+            for index, sweet in enumerate(sweets)
+            if sweet.get("shards") and "quantity" in sweet
+        ]
+        if not sharded:
+            return sweets
+
+        totals = await self.shards.totals([sweets[i]["_id"] for i in sharded])
+        for index in sharded:
+            sweet = sweets[index]
+            self.sharded[str(sweet["_id"])] = sweet["shards"]
+            sweets[index] = {
+                **sweet,
+                "quantity": sweet["quantity"] + totals.get(str(sweet["_id"]), 0),
+            }
+            if fields:
+                # Only projected to add up the stock
+                sweets[index].pop("shards")
         return sweets
 
+    def _invalidate(self, *sweets: dict, deleted: Optional[str] = None) -> None:
+        # Any write can change any listing, so drop every cached response;
+        # clearing also bumps the cache generation (the catalogue version)
+        if self.cache is not None:
+            self.cache.clear()
+
+        if self.snapshot is not None:
+            for sweet in sweets:
+                self.snapshot.put(sweet)
+            if deleted:
+                self.snapshot.remove(deleted)
+
+    @staticmethod
+    def _projection(fields: Optional[list[str]], sort: str) -> Optional[dict]:
+        if not fields:
+            return None
+
+        unknown = set(fields) - set(SweetBase.model_fields)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+
+        projection = {field: 1 for field in fields}
+        if "quantity" in projection:
+            # Needed to add up the stock of sharded sweets
+            projection["shards"] = 1
+        if sort == "price":
+            # The sort key is needed to build the next cursor
+            projection["price"] = 1
+        return projection
+
+    # -----------------------------
+    # Bulk Import / Update Sweets
+    # -----------------------------
+    @profiled
+    async def bulk_upsert(
+        self,
+        rows: AsyncIterable[dict],
+        batch_size: int = BULK_BATCH_SIZE,
+    ) -> dict:
+        # Full rows, upserted by name: new sweets are inserted and existing
+        # ones overwritten, which covers both seeding and repricing.
+        def operation(row: dict) -> tuple[UpdateOne, Optional[str]]:
+            sweet = SweetCreate.model_validate(row).model_dump()
+            return (
+                UpdateOne(_stock_filter(sweet["name"]), {"$set": sweet}, upsert=True),
+                sweet["name"],
+            )
+
+        return await self._bulk_apply(rows, operation, batch_size)
+
+    @profiled
+    async def bulk_update(
+        self,
+        rows: AsyncIterable[dict],
+        batch_size: int = BULK_BATCH_SIZE,
+    ) -> dict:
+        # Partial rows keyed by name; sweets that do not exist are skipped
+        def operation(row: dict) -> tuple[UpdateOne, Optional[str]]:
+            changes = SweetUpdate.model_validate(row).model_dump(
+                exclude_unset=True, exclude_none=True
+            )
+            name = changes.pop("name", None)
+            if not name or not changes:
+                raise ValueError("Row needs a name and at least one field")
+            if "quantity" in changes:
+                return UpdateOne(_stock_filter(name), {"$set": changes}), name
+            return UpdateOne({"name": name}, {"$set": changes}), None
+
+        return await self._bulk_apply(rows, operation, batch_size)
+
+    async def _bulk_apply(
+        self,
+        rows: AsyncIterable[dict],
+        operation: Callable[[dict], tuple[UpdateOne, Optional[str]]],
+        batch_size: int,
+    ) -> dict:
+        # operation turns a row into its write, plus the sweet's name when
+        # the row sets the stock level
+        report = {
+            "received": 0,
+            "upserted": 0,
+            "matched": 0,
+            "modified": 0,
+            "errors": [],
+        }
+        operations: list[UpdateOne] = []
+        row_numbers: list[int] = []
+        # Row numbers of this batch's stock-setting rows, by sweet name
+        stock_rows: dict[str, int] = {}
+
+        async for row in rows:
+            row_number = report["received"]
+            report["received"] += 1
+
+            try:
+                update, sets_stock = operation(row)
+                operations.append(update)
+                row_numbers.append(row_number)
+                if sets_stock:
+                    stock_rows[sets_stock] = row_number
+            except ValidationError as exc:
+                report["errors"].append({
+                    "row": row_number,
+                    "errors": exc.errors(
+                        include_url=False,
+                        include_context=False,
+                        include_input=False,
+                    ),
+                })
+            except (ValueError, TypeError) as exc:
+                report["errors"].append({"row": row_number, "errors": str(exc)})
+
+            if len(operations) >= batch_size:
+                await self._flush_bulk(operations, row_numbers, stock_rows, report)
+                operations, row_numbers, stock_rows = [], [], {}
+
+        if operations:
+            await self._flush_bulk(operations, row_numbers, stock_rows, report)
+
+        report["errors"].sort(key=lambda error: error["row"])
+        self._invalidate()
+        return report
+
+    async def _flush_bulk(
+        self,
+        operations: list[UpdateOne],
+        row_numbers: list[int],
+        stock_rows: dict[str, int],
+        report: dict,
+    ) -> None:
+        # Unordered: one bad row does not stop the rest of the batch
+        errors = []
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as exc:
+            details = exc.details
+            errors = details["writeErrors"]
+
+        # Rows that set the stock of a sharded sweet match nothing (an
+        # upsert then collides with the sweet's name); say why instead
+        skipped = set()
+        if stock_rows:
+            async for sweet in self.collection.find(
+                {"name": {"$in": list(stock_rows)}, "shards": {"$exists": True}},
+                {"name": 1},
+            ):
+                row_number = stock_rows[sweet["name"]]
+                skipped.add(row_number)
+                report["errors"].append({
+                    "row": row_number,
+                    "errors": "Stock is sharded; restock or unshard it instead",
+                })
+
+        for error in errors:
+            row_number = row_numbers[error["index"]]
+            if row_number not in skipped:
+                report["errors"].append({"row": row_number, "errors": error["errmsg"]})
+
+        report["upserted"] += details["nUpserted"]
+        report["matched"] += details["nMatched"]
+        report["modified"] += details["nModified"]
+
+    # -----------------------------
+    # Export Sweets
+    # -----------------------------
+    async def export(
+        self, batch_size: int = EXPORT_BATCH_SIZE
+    ) -> AsyncIterator[list[dict]]:
+        # Yields the catalogue one driver batch at a time, so memory stays
+        # bounded by batch_size no matter how large the collection is.
+        cursor = self.reads.find().batch_size(batch_size)
+        while batch := await cursor.to_list(length=batch_size):
+            yield await self._with_shard_totals(batch)
+
     # -----------------------------
     # Purchase Sweet
     # -----------------------------
-    async def purchase(self, sweet_id: str) -> dict:
-        sweet = await self.collection.find_one({"_id": ObjectId(sweet_id)})
+    @profiled
+    async def purchase(self, sweet_id: str, quantity: int = 1) -> dict:
+        sweet = await self._take_stock(sweet_id, quantity)
+        await self.ledger.record("purchase", [(sweet, quantity)])
+        return sweet
+
+    async def _take_stock(
+        self, sweet_id: str, quantity: int, reserve: bool = False
+    ) -> dict:
+        if quantity <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Quantity must be greater than zero",
+            )
+
+        # Checked up front: every path below makes an ObjectId of it
+        _sweet_oid(sweet_id)
+        # A reservation moves the stock to the reserved count instead of
+        # selling it
+        taken = {"quantity": -quantity}
+        if reserve:
+            taken["reserved"] = quantity
+
+        shards = self.sharded.get(sweet_id)
+        if shards:
+            return await self._take_sharded(sweet_id, shards, quantity, taken)
+
+        if self.coalescer and not reserve:
+            # Written together with concurrent purchases of the same sweet
+            sweet = await self.coalescer.purchase(ObjectId(sweet_id), quantity)
+        else:
+            # Single conditional update: the stock check and the decrement
+            # happen atomically on the server, so concurrent buyers can
+            # never oversell.
+            sweet = await self.collection.find_one_and_update(
+                {"_id": ObjectId(sweet_id), "quantity": {"$gte": quantity}},
+                {"$inc": taken},
+                return_document=ReturnDocument.AFTER,
+            )
 
         if not sweet:
+            # Only the failure path pays a second round trip, to tell a
+            # missing sweet apart from one without enough stock.
+            exists = await self._lookup(sweet_id)
+
+            if exists.get("shards"):
+                # Sharded by another worker since this one last saw it
+                self.sharded[sweet_id] = exists["shards"]
+                return await self._take_sharded(
+                    sweet_id, exists["shards"], quantity, taken
+                )
+
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Sweet not found",
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Sweet is out of stock",
+            )
+
+        return await self._finish_write(sweet)
+
+    async def _take_sharded(
+        self, sweet_id: str, shards: int, quantity: int, taken: dict
+    ) -> dict:
+        # Hot sweets take stock from the shards; whatever they cannot
+        # cover comes off the base counter
+        oid = ObjectId(sweet_id)
+        from_shards = await self.shards.take(oid, shards, quantity)
+        rest = quantity - from_shards
+
+        # A reserved count still moves on the sweet itself
+        moved = {k: v for k, v in taken.items() if k != "quantity"}
+        if rest:
+            moved["quantity"] = -rest
+
+        if moved:
+            query: dict = {"_id": oid}
+            if rest:
+                query["quantity"] = {"$gte": rest}
+            sweet = await self.collection.find_one_and_update(
+                query, {"$inc": moved}, return_document=ReturnDocument.AFTER
             )
+        else:
+            sweet = await self.collection.find_one({"_id": oid})
 
-        if sweet["quantity"] <= 0:
+        if not sweet:
+            # Too short all told (or gone): the shards get their part back
+            if from_shards:
+                await self._give_back([(oid, from_shards, True)])
+            await self._lookup(sweet_id)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Sweet is out of stock",
             )
+        return await self._finish_write(sweet)
+
+    # -----------------------------
+    # Reserved Stock
+    # -----------------------------
+    @profiled
+    async def reserve_stock(self, sweet_id: str, quantity: int) -> dict:
+        # Held for a cart: out of the available quantity, into reserved
+        sweet = await self._take_stock(sweet_id, quantity, reserve=True)
+        await self.ledger.record("reserve", [(sweet, quantity)])
+        return sweet
+
+    @profiled
+    async def settle_reserved(
+        self, sweet_id: ObjectId, quantity: int, sold: bool
+    ) -> None:
+        # A confirmed hold is sold and simply leaves reserved; a released
+        # one goes back on the base counter, sharded or not
+        change = {"reserved": -quantity}
+        if not sold:
+            change["quantity"] = quantity
 
-        await self.collection.update_one(
-            {"_id": ObjectId(sweet_id)},
-            {"$inc": {"quantity": -1}},
+        sweet = await self.collection.find_one_and_update(
+            {"_id": sweet_id},
+            {"$inc": change},
+            return_document=ReturnDocument.AFTER,
         )
+        if sweet:
+            self._invalidate(sweet)
+            kind = "reservation" if sold else "release"
+            await self.ledger.record(kind, [(sweet, quantity)])
+
+    async def _lookup(self, sweet_id: str) -> dict:
+        # 404 for a missing sweet; otherwise its sharding state
+        exists = await self.collection.find_one(
+            {"_id": ObjectId(sweet_id)}, {"_id": 1, "shards": 1}
+        )
+
+        if not exists:
+            self.sharded.pop(sweet_id, None)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Sweet not found",
+            )
+        if not exists.get("shards"):
+            self.sharded.pop(sweet_id, None)
+        return exists
 
-        sweet["quantity"] -= 1
+    async def _finish_write(self, sweet: dict) -> dict:
+        # Post-image of a write: real stock, caches updated, string id
+        if not sweet.get("shards"):
+            self.sharded.pop(str(sweet["_id"]), None)
+        # The snapshot keeps the stored document, base counter and all
+        self._invalidate(sweet)
+        [sweet] = await self._with_shard_totals([sweet])
         sweet["_id"] = str(sweet["_id"])
         return sweet
 
+    # -----------------------------
+    # Checkout Cart
+    # -----------------------------
+    @profiled
+    async def checkout(self, items: list[CartItem]) -> list[dict]:
+        # Merge repeated lines so each sweet is decremented exactly once
+        lines: dict[ObjectId, int] = {}
+        for item in items:
+            sweet_id = ObjectId(item.sweet_id)
+            lines[sweet_id] = lines.get(sweet_id, 0) + item.quantity
+
+        try:
+            return await self._checkout(lines)
+        except HTTPException as exc:
+            # A line looks short when another worker moved its stock to
+            # shards; learn about those and try once more
+            if exc.status_code != 400 or not await self._learn_shards(list(lines)):
+                raise
+        return await self._checkout(lines)
+
+    async def _checkout(self, lines: dict[ObjectId, int]) -> list[dict]:
+        sweet_ids = list(lines)
+        sharded = {
+            sweet_id: quantity
+            for sweet_id, quantity in lines.items()
+            if str(sweet_id) in self.sharded
+        }
+        plain_ids = [sweet_id for sweet_id in sweet_ids if sweet_id not in sharded]
+
+        if self.supports_transactions:
+            async def apply(session) -> list[dict]:
+                await self._take_shards(sharded, session=session)
+
+                # The transaction reads one snapshot, so lines that are all
+                # there and in stock here can all be decremented below
+                stock = {
+                    sweet["_id"]: sweet["quantity"]
+                    async for sweet in self.collection.find(
+                        {"_id": {"$in": plain_ids}}, {"quantity": 1},
+                        session=session,
+                    )
+                }
+                error = self._checkout_error(
+                    [
+                        (sweet_id, stock.get(sweet_id, 0) >= lines[sweet_id])
+                        for sweet_id in plain_ids
+                    ],
+                    stock,
+                )
+                if error:
+                    # Raising inside the transaction aborts it
+                    raise error
+
+                if plain_ids:
+                    await self.collection.bulk_write(
+                        [
+                            UpdateOne(
+                                {"_id": sweet_id},
+                                {"$inc": {"quantity": -lines[sweet_id]}},
+                            )
+                            for sweet_id in plain_ids
+                        ],
+                        ordered=False,
+                        session=session,
+                    )
+
+                return await self.collection.find(
+                    {"_id": {"$in": sweet_ids}}, session=session
+                ).to_list(length=None)
+
+            async with await self.client.start_session() as session:
+                sweets = await session.with_transaction(apply)
+        else:
+            taken = await self._take_shards(sharded)
+            # No transactions on a standalone server: the lines go out as one
+            # unordered bulk write of guarded updates, so the cart costs one
+            # round trip whatever its size. Each update stamps this
+            # checkout's token, which is how a short cart learns which of
+            # its lines went through.
+            token = str(ObjectId())
+            applied = 0
+            if plain_ids:
+                result = await self.collection.bulk_write(
+                    [
+                        UpdateOne(
+                            {"_id": sweet_id, "quantity": {"$gte": lines[sweet_id]}},
+                            {
+                                "$inc": {"quantity": -lines[sweet_id]},
+                                "$set": {"checkout": token},
+                            },
+                        )
+                        for sweet_id in plain_ids
+                    ],
+                    ordered=False,
+                )
+                applied = result.modified_count
+
+            if applied < len(plain_ids):
+                await self._undo_checkout(lines, plain_ids, token, applied, taken)
+
+            sweets = await self.collection.find(
+                {"_id": {"$in": sweet_ids}}
+            ).to_list(length=None)
+
+        self._invalidate(*sweets)
+        await self.ledger.record(
+            "checkout", [(sweet, lines[sweet["_id"]]) for sweet in sweets]
+        )
+        sweets = await self._with_shard_totals(sweets)
+        for sweet in sweets:
+            sweet["_id"] = str(sweet["_id"])
+        return sweets
+
+    async def _undo_checkout(
+        self,
+        lines: dict[ObjectId, int],
+        plain_ids: list[ObjectId],
+        token: str,
+        applied: int,
+        taken: list[tuple[ObjectId, int, bool]],
+    ) -> None:
+        # Failure path only: puts back the lines of a short cart that went
+        # through, then raises why the cart failed
+        stamped = {
+            sweet["_id"]
+            async for sweet in self.collection.find(
+                {"_id": {"$in": plain_ids}, "checkout": token}, {"_id": 1}
+            )
+        }
+        if len(stamped) < applied:
+            # A concurrent checkout restamped one of our lines before the
+            # read; its units stay taken rather than risk an oversell
+            logger.warning(
+                "Checkout %s could not return %d line(s)",
+                token,
+                applied - len(stamped),
+            )
+
+        if stamped:
+            await self.collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": sweet_id}, {"$inc": {"quantity": lines[sweet_id]}}
+                    )
+                    for sweet_id in stamped
+                ],
+                ordered=False,
+            )
+        await self._give_back(taken)
+        # Reads may have cached the stock levels in between
+        self._invalidate()
+
+        # A line fails because its sweet is gone or because it is short
+        outcomes = [(sweet_id, sweet_id in stamped) for sweet_id in plain_ids]
+        found = set(stamped)
+        async for sweet in self.collection.find(
+            {"_id": {"$in": [i for i, fits in outcomes if not fits]}}, {"_id": 1}
+        ):
+            found.add(sweet["_id"])
+        raise self._checkout_error(outcomes, found)
+
+    @staticmethod
+    def _checkout_error(
+        outcomes: list[tuple[ObjectId, bool]], found
+    ) -> Optional[HTTPException]:
+        # outcomes pairs each plain line with whether it fits; found holds
+        # the ids that exist. A missing sweet is reported before a short one.
+        for sweet_id, _ in outcomes:
+            if sweet_id not in found:
+                return HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Sweet {sweet_id} not found",
+                )
+
+        for sweet_id, fits in outcomes:
+            if not fits:
+                return HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Sweet {sweet_id} is out of stock",
+                )
+
+        return None
+
+    async def _take_shards(
+        self, lines: dict[ObjectId, int], session=None
+    ) -> list[tuple[ObjectId, int, bool]]:
+        # Sharded cart lines are taken one by one, from the shards and then
+        # the base counter. Outside a transaction a failing line gives back
+        # what the earlier ones took.
+        taken = []
+        try:
+            for sweet_id, quantity in lines.items():
+                shards = self.sharded[str(sweet_id)]
+                from_shards = await self.shards.take(
+                    sweet_id, shards, quantity, session=session
+                )
+                if from_shards:
+                    taken.append((sweet_id, from_shards, True))
+                rest = quantity - from_shards
+                if not rest:
+                    continue
+
+                result = await self.collection.update_one(
+                    {"_id": sweet_id, "quantity": {"$gte": rest}},
+                    {"$inc": {"quantity": -rest}},
+                    session=session,
+                )
+                if result.modified_count:
+                    taken.append((sweet_id, rest, False))
+                    continue
+
+                exists = await self.collection.find_one(
+                    {"_id": sweet_id}, {"_id": 1}, session=session
+                )
+                if not exists:
+                    self.sharded.pop(str(sweet_id), None)
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=f"Sweet {sweet_id} not found",
+                    )
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Sweet {sweet_id} is out of stock",
+                )
+        except Exception:
+            if session is None:
+                await self._give_back(taken)
+            raise
+        return taken
+
+    async def _give_back(self, taken: list[tuple[ObjectId, int, bool]]) -> None:
+        for sweet_id, quantity, from_shard in taken:
+            if from_shard:
+                quantity = await self.shards.give(sweet_id, quantity)
+            if quantity:
+                await self.collection.update_one(
+                    {"_id": sweet_id}, {"$inc": {"quantity": quantity}}
+                )
+
+    async def _learn_shards(self, sweet_ids: list[ObjectId]) -> bool:
+        # True when any of these sweets turned out to be sharded
+        learned = False
+        cursor = self.collection.find(
+            {"_id": {"$in": sweet_ids}, "shards": {"$exists": True}},
+            {"shards": 1},
+        )
+        async for sweet in cursor:
+            if str(sweet["_id"]) not in self.sharded:
+                self.sharded[str(sweet["_id"])] = sweet["shards"]
+                learned = True
+        return learned
+
     # -----------------------------
     # Restock Sweet
     # -----------------------------
+    @profiled
     async def restock(self, sweet_id: str, quantity: int) -> dict:
         if quantity <= 0:
             raise HTTPException(
@@ -97,36 +920,158 @@ class SweetRepository:
                 detail="Quantity must be greater than zero",
             )
 
-        result = await self.collection.update_one(
-            {"_id": ObjectId(sweet_id)},
+        oid = ObjectId(sweet_id)
+        restocked = quantity
+        if self.sharded.get(sweet_id):
+            # Refill the shards; whatever they could not take (the sweet
+            # was unsharded meanwhile) lands on the base counter
+            quantity = await self.shards.give(oid, quantity)
+
+        sweet = await self.collection.find_one_and_update(
+            {"_id": oid},
             {"$inc": {"quantity": quantity}},
+            return_document=ReturnDocument.AFTER,
         )
 
-        if result.matched_count == 0:
+        if not sweet:
+            self.sharded.pop(sweet_id, None)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Sweet not found",
             )
 
-        sweet = await self.collection.find_one({"_id": ObjectId(sweet_id)})
-        sweet["_id"] = str(sweet["_id"])
+        sweet = await self._finish_write(sweet)
+        await self.ledger.record("restock", [(sweet, restocked)])
         return sweet
 
+    @profiled
     async def update(self, sweet_id: str, data: dict) -> dict:
-        result = await self.collection.update_one(
-            {"_id": ObjectId(sweet_id)},
-            {"$set": data}
+        try:
+            # Only known fields are $set; unknown keys are dropped
+            changes = SweetUpdate.model_validate(data).model_dump(
+                exclude_unset=True, exclude_none=True
+            )
+        except ValidationError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=exc.errors(include_url=False, include_context=False),
+            )
+
+        if not changes:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No fields to update",
+            )
+
+        query = {"_id": ObjectId(sweet_id)}
+        if "quantity" in changes:
+            # A sharded sweet's stock is not a single field to overwrite
+            query["shards"] = {"$exists": False}
+
+        try:
+            sweet = await self.collection.find_one_and_update(
+                query,
+                {"$set": changes},
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            raise _name_taken(changes["name"])
+
+        if not sweet:
+            await self._lookup(sweet_id)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock is sharded; restock or unshard it instead",
+            )
+
+        return await self._finish_write(sweet)
+
+    @profiled
+    async def delete(self, sweet_id: str) -> None:
+        sweet = await self.collection.find_one_and_delete(
+            {"_id": ObjectId(sweet_id)}, projection={"shards": 1}
         )
 
-        if result.matched_count == 0:
+        if sweet is None:
             raise HTTPException(status_code=404, detail="Sweet not found")
 
-        sweet = await self.collection.find_one({"_id": ObjectId(sweet_id)})
-        sweet["_id"] = str(sweet["_id"])
-        return sweet
+        if sweet.get("shards"):
+            await self.shards.remove(sweet["_id"])
+        self.sharded.pop(sweet_id, None)
+        self._invalidate(deleted=sweet_id)
 
-    async def delete(self, sweet_id: str) -> None:
-        result = await self.collection.delete_one({"_id": ObjectId(sweet_id)})
+    # -----------------------------
+    # Sharded Stock
+    # -----------------------------
+    @profiled
+    async def shard_stock(self, sweet_id: str, shards: int) -> dict:
+        # Spreads a hot sweet's stock over several counters so concurrent
+        # purchases stop contending on its one document
+        if not 2 <= shards <= MAX_STOCK_SHARDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Shards must be between 2 and {MAX_STOCK_SHARDS}",
+            )
+
+        oid = _sweet_oid(sweet_id)
+        claimed = await self.collection.find_one_and_update(
+            {"_id": oid, "shards": {"$exists": False}},
+            {"$set": {"shards": shards}},
+            projection={"_id": 1},
+        )
+        if not claimed:
+            await self._lookup(sweet_id)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock is already sharded",
+            )
+
+        await self.shards.create(oid, shards, 0)
+        self.sharded[sweet_id] = shards
+
+        # Move the base stock over; buyers keep drawing on the base until
+        # it is zeroed, and on the shards from then on
+        base = await self.collection.find_one_and_update(
+            {"_id": oid}, {"$set": {"quantity": 0}}, projection={"quantity": 1}
+        )
+        leftover = await self.shards.give(oid, base["quantity"] if base else 0)
 
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Sweet not found")
\ No newline at end of file
+        sweet = await self.collection.find_one_and_update(
+            {"_id": oid},
+            {"$inc": {"quantity": leftover}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not sweet:
+            await self.shards.remove(oid)
+            await self._lookup(sweet_id)
+        return await self._finish_write(sweet)
+
+    @profiled
+    async def unshard_stock(self, sweet_id: str) -> dict:
+        # Folds the shards back into the sweet's own quantity
+        oid = _sweet_oid(sweet_id)
+        released = await self.collection.find_one_and_update(
+            {"_id": oid, "shards": {"$exists": True}},
+            {"$unset": {"shards": ""}},
+            projection={"_id": 1},
+        )
+        if not released:
+            await self._lookup(sweet_id)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock is not sharded",
+            )
+
+        self.sharded.pop(sweet_id, None)
+        # Each shard is deleted together with its stock, so late restocks
+        # from other workers miss it and fall through to the base counter
+        quantity = await self.shards.drain(oid)
+
+        sweet = await self.collection.find_one_and_update(
+            {"_id": oid},
+            {"$inc": {"quantity": quantity}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not sweet:
+            await self._lookup(sweet_id)
+        return await self._finish_write(sweet)
\ No newline at end of file
@@ -1,16 +1,28 @@
-from fastapi import Request
+from fastapi import HTTPException, Request, status
+from pymongo.errors import DuplicateKeyError
 from app.models.user import UserCreate
-from app.core.security import hash_password
+from app.core.profiling import profiled
+from app.core.security import hash_password_async
 
 
 class UserRepository:
     def __init__(self, request: Request):
         self.collection = request.app.state.db["users"]
 
+    @profiled
     async def create_user(self, user: UserCreate):
         user_dict = user.model_dump()
-        user_dict["hashed_password"] = hash_password(user_dict.pop("password"))
+        user_dict["hashed_password"] = await hash_password_async(
+            user_dict.pop("password")
+        )
+
+        try:
+            result = await self.collection.insert_one(user_dict)
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered",
+            )
 
-        result = await self.collection.insert_one(user_dict)
         user_dict["_id"] = str(result.inserted_id)
         return user_dict
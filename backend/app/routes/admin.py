@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, Request
+
+from app.core.dependencies import require_admin
+from app.core.profiling import ProfiledRoute, slow_requests
+from app.db.monitoring import pool_monitor
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["Admin"],
+    route_class=ProfiledRoute,
+)
+
+
+# -----------------------------
+# Catalogue cache stats (ADMIN)
+# -----------------------------
+@router.get("/cache")
+async def cache_stats(
+    request: Request,
+    user=Depends(require_admin),
+):
+    cache = request.app.state.catalogue_cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+# -----------------------------
+# MongoDB pool utilisation (ADMIN)
+# -----------------------------
+@router.get("/pool")
+async def pool_stats(
+    user=Depends(require_admin),
+):
+    return pool_monitor.stats()
+
+
+# -----------------------------
+# Slowest profiled requests (ADMIN)
+# -----------------------------
+@router.get("/profiles")
+async def list_profiles(
+    user=Depends(require_admin),
+):
+    return slow_requests.list()
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: int,
+    user=Depends(require_admin),
+):
+    # Includes the call-stack report, when one was taken
+    return slow_requests.get(profile_id)
+
+
+@router.delete("/profiles")
+async def clear_profiles(
+    user=Depends(require_admin),
+):
+    slow_requests.clear()
+    return {"cleared": True}
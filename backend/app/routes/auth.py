@@ -1,8 +1,17 @@
-from fastapi import APIRouter, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from app.core.profiling import ProfiledRoute
+from app.core.rate_limit import AUTH_RATE_LIMIT, RateLimit
 from app.models.user import UserCreate
 from app.services.auth_service import AuthService
 
-router = APIRouter(prefix="/api/auth", tags=["Auth"])
+# Every register/login runs an Argon2 hash, so attempts are throttled
+# per client address
+router = APIRouter(
+    prefix="/api/auth",
+    tags=["Auth"],
+    dependencies=[Depends(RateLimit("auth", AUTH_RATE_LIMIT))],
+    route_class=ProfiledRoute,
+)
 
 
 @router.post("/register", status_code=status.HTTP_201_CREATED)
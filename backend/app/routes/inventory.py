@@ -1,13 +1,35 @@
-from fastapi import APIRouter, Depends, Request, HTTPException, status
+from fastapi import APIRouter, Depends, Header, Request, HTTPException, status
 
+from app.models.checkout import CheckoutRequest
+from app.models.purchase import PurchaseRequest
+from app.models.reservation import ReservationRequest
+from app.repositories.reservation_repository import ReservationRepository
 from app.repositories.sweet_repository import SweetRepository
 from app.core.dependencies import get_current_user, require_admin
+from app.core.idempotency import run_idempotent
+from app.core.profiling import ProfiledRoute
+from app.core.rate_limit import INVENTORY_RATE_LIMIT, RateLimit
 
 router = APIRouter(
     prefix="/api/sweets",
     tags=["Inventory"],
+    dependencies=[Depends(RateLimit("inventory", INVENTORY_RATE_LIMIT))],
+    route_class=ProfiledRoute,
 )
 
+# -----------------------------
+# Checkout a cart (AUTH)
+# -----------------------------
+@router.post("/checkout")
+async def checkout_cart(
+    cart: CheckoutRequest,
+    request: Request,
+    user=Depends(get_current_user),
+):
+    repo = SweetRepository(request)
+    return {"items": await repo.checkout(cart.items)}
+
+
 # -----------------------------
 # Purchase a sweet (AUTH)
 # -----------------------------
@@ -15,10 +37,63 @@ router = APIRouter(
 async def purchase_sweet(
     sweet_id: str,
     request: Request,
+    data: PurchaseRequest | None = None,
+    idempotency_key: str | None = Header(None),
     user=Depends(get_current_user),
 ):
+    quantity = data.quantity if data else 1
+
+    # Retries carrying the same Idempotency-Key get the first result back
+    # instead of decrementing stock again
     repo = SweetRepository(request)
-    return await repo.purchase(sweet_id)
+    return await run_idempotent(
+        request,
+        idempotency_key,
+        user,
+        lambda: repo.purchase(sweet_id, quantity),
+    )
+
+
+# -----------------------------
+# Reserve a sweet for a cart (AUTH)
+# -----------------------------
+@router.post("/{sweet_id}/reserve")
+async def reserve_sweet(
+    sweet_id: str,
+    request: Request,
+    data: ReservationRequest | None = None,
+    idempotency_key: str | None = Header(None),
+    user=Depends(get_current_user),
+):
+    quantity = data.quantity if data else 1
+
+    repo = ReservationRepository(request)
+    return await run_idempotent(
+        request,
+        idempotency_key,
+        user,
+        lambda: repo.reserve(sweet_id, quantity, user["sub"]),
+    )
+
+
+@router.post("/reservations/{reservation_id}/confirm")
+async def confirm_reservation(
+    reservation_id: str,
+    request: Request,
+    user=Depends(get_current_user),
+):
+    repo = ReservationRepository(request)
+    return await repo.confirm(reservation_id, user["sub"])
+
+
+@router.post("/reservations/{reservation_id}/release")
+async def release_reservation(
+    reservation_id: str,
+    request: Request,
+    user=Depends(get_current_user),
+):
+    repo = ReservationRepository(request)
+    return await repo.release(reservation_id, user["sub"])
 
 
 # -----------------------------
@@ -29,6 +104,7 @@ async def restock_sweet(
     sweet_id: str,
     data: dict,
     request: Request,
+    idempotency_key: str | None = Header(None),
     user=Depends(require_admin),
 ):
     quantity = data.get("quantity", 0)
@@ -40,4 +116,44 @@ async def restock_sweet(
         )
 
     repo = SweetRepository(request)
-    return await repo.restock(sweet_id, quantity)
+    return await run_idempotent(
+        request,
+        idempotency_key,
+        user,
+        lambda: repo.restock(sweet_id, quantity),
+    )
+
+
+# -----------------------------
+# Shard a hot sweet's stock (ADMIN)
+# -----------------------------
+@router.post("/{sweet_id}/shards")
+async def shard_stock(
+    sweet_id: str,
+    data: dict,
+    request: Request,
+    user=Depends(require_admin),
+):
+    shards = data.get("shards", 0)
+
+    if not isinstance(shards, int):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Shards must be a whole number",
+        )
+
+    repo = SweetRepository(request)
+    return await repo.shard_stock(sweet_id, shards)
+
+
+# -----------------------------
+# Fold sharded stock back (ADMIN)
+# -----------------------------
+@router.delete("/{sweet_id}/shards")
+async def unshard_stock(
+    sweet_id: str,
+    request: Request,
+    user=Depends(require_admin),
+):
+    repo = SweetRepository(request)
+    return await repo.unshard_stock(sweet_id)
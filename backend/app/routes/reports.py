@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Request
+
+from app.core.dependencies import require_admin
+from app.core.profiling import ProfiledRoute
+from app.repositories.ledger_repository import LedgerRepository
+
+router = APIRouter(
+    prefix="/api/reports",
+    tags=["Reports"],
+    route_class=ProfiledRoute,
+)
+
+
+# -----------------------------
+# Sales by period (ADMIN)
+# -----------------------------
+@router.get("/sales")
+async def sales_report(
+    request: Request,
+    period: str = "day",
+    group: str = "category",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    category: str | None = None,
+    user=Depends(require_admin),
+):
+    # Answered from the rollups; raw events are never scanned. Events this
+    # worker still buffers are written first.
+    await request.app.state.ledger.flush()
+    repo = LedgerRepository(request.app.state.db)
+    return await repo.sales_report(period, group, start, end, category)
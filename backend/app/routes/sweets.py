@@ -1,20 +1,57 @@
+import codecs
+import csv
+from typing import AsyncIterator, Literal
+
+import orjson
+
 from fastapi import (
     APIRouter,
     Depends,
+    Query,
     Request,
     HTTPException,
     status,
 )
+from fastapi.responses import StreamingResponse
 
-from app.models.sweet import SweetCreate
+from app.core.pagination import MAX_PAGE_SIZE, SortField
+from app.core.profiling import ProfiledRoute
+from app.core.responses import cached_json_response, dumps
+from app.models.sweet import (
+    FacetedSweetPage,
+    SweetCreate,
+    SweetFacets,
+    SweetInDB,
+    SweetPage,
+)
 from app.repositories.sweet_repository import SweetRepository
 from app.core.dependencies import get_current_user, require_admin
 
 router = APIRouter(
     prefix="/api/sweets",
     tags=["Sweets"],
+    route_class=ProfiledRoute,
 )
 
+
+def parse_fields(fields: str | None) -> list[str] | None:
+    # ?fields=name,price -> ["name", "price"]
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def fields_key(fields: list[str] | None) -> tuple | None:
+    return tuple(sorted(set(fields))) if fields else None
+
+
+def search_key(name, category, min_price, max_price, match) -> tuple:
+    # Only prefix matching is case-sensitive
+    if name and match != "prefix":
+        name = name.lower()
+    return (name, category, min_price, max_price, match)
+
+
 # -----------------------------
 # Create Sweet (ADMIN)
 # -----------------------------
@@ -31,32 +68,220 @@ async def create_sweet(
     return await repo.create(sweet)
 
 
+async def iter_rows(rows: list) -> AsyncIterator:
+    for row in rows:
+        yield row
+
+
+async def iter_upload(request: Request) -> AsyncIterator:
+    # Parses the body line by line as it arrives: NDJSON by default, CSV
+    # (with a header row) when sent as text/csv. Malformed lines come out
+    # as None and are reported as row errors.
+    is_csv = request.headers.get("content-type", "").startswith("text/csv")
+    header = None
+    buffer = ""
+    # Carries a character split across chunks over to the next one; bytes
+    # that are not UTF-8 become U+FFFD and fail their line. A leading byte
+    # order mark (Excel's CSV export) is dropped.
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+
+    async def lines():
+        nonlocal buffer
+        async for chunk in request.stream():
+            buffer += decoder.decode(chunk)
+            *complete, buffer = buffer.split("\n")
+            for line in complete:
+                yield line
+        buffer += decoder.decode(b"", final=True)
+        if buffer:
+            yield buffer
+
+    async for line in lines():
+        line = line.strip()
+        if not line:
+            continue
+        if "\ufffd" in line:
+            yield None
+            continue
+
+        if not is_csv:
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                yield None
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [value.strip() for value in values]
+        elif len(values) != len(header):
+            yield None
+        else:
+            yield dict(zip(header, values))
+
+
+# -----------------------------
+# Bulk Import Sweets (ADMIN)
+# -----------------------------
+@router.post("/bulk")
+async def bulk_import_sweets(
+    rows: list[dict],
+    request: Request,
+    user=Depends(require_admin),
+):
+    repo = SweetRepository(request)
+    return await repo.bulk_upsert(iter_rows(rows))
+
+
+@router.post("/bulk/upload")
+async def bulk_upload_sweets(
+    request: Request,
+    user=Depends(require_admin),
+):
+    repo = SweetRepository(request)
+    return await repo.bulk_upsert(iter_upload(request))
+
+
+# -----------------------------
+# Bulk Update Sweets (ADMIN)
+# -----------------------------
+@router.patch("/bulk")
+async def bulk_update_sweets(
+    rows: list[dict],
+    request: Request,
+    user=Depends(require_admin),
+):
+    repo = SweetRepository(request)
+    return await repo.bulk_update(iter_rows(rows))
+
+
 # -----------------------------
 # List All Sweets (AUTH)
 # -----------------------------
-@router.get("")
+# Handlers return pre-rendered JSON directly, skipping response validation
+# and jsonable_encoder; response_model only documents the shape.
+@router.get("", response_model=list[SweetInDB] | SweetPage)
 async def list_sweets(
     request: Request,
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+    sort: SortField = "id",
+    fields: str | None = None,
     user=Depends(get_current_user),
 ):
     repo = SweetRepository(request)
-    return await repo.list_all()
+    field_list = parse_fields(fields)
+    key = ("list", fields_key(field_list), limit, after, sort)
+
+    return await cached_json_response(
+        request,
+        key,
+        lambda: repo.list_all(field_list, limit, after, sort),
+    )
 
 
 # -----------------------------
 # Search Sweets (AUTH)
 # -----------------------------
-@router.get("/search")
+@router.get(
+    "/search", response_model=list[SweetInDB] | SweetPage | FacetedSweetPage
+)
 async def search_sweets(
     request: Request,
     name: str | None = None,
     category: str | None = None,
     min_price: float | None = None,
     max_price: float | None = None,
+    match: Literal["contains", "prefix", "text"] = "contains",
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+    sort: SortField = "id",
+    fields: str | None = None,
+    facets: bool = False,
+    user=Depends(get_current_user),
+):
+    repo = SweetRepository(request)
+    field_list = parse_fields(fields)
+    name = name.strip() if name else None
+    filters = (name, category, min_price, max_price, match)
+    key = (
+        "search",
+        *search_key(*filters),
+        fields_key(field_list),
+        limit,
+        after,
+        sort,
+        facets,
+    )
+
+    async def load():
+        results = await repo.search(
+            *filters, fields=field_list, limit=limit, after=after, sort=sort
+        )
+        if not facets:
+            return results
+
+        # Always the paged shape, with the counts for the whole filter
+        page = results if isinstance(results, dict) else {
+            "items": results,
+            "next_cursor": None,
+        }
+        return {**page, "facets": await repo.facets(*filters)}
+
+    return await cached_json_response(request, key, load)
+
+
+# -----------------------------
+# Search Facets (AUTH)
+# -----------------------------
+@router.get("/facets", response_model=SweetFacets)
+async def search_facets(
+    request: Request,
+    name: str | None = None,
+    category: str | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    match: Literal["contains", "prefix", "text"] = "contains",
     user=Depends(get_current_user),
 ):
     repo = SweetRepository(request)
-    return await repo.search(name, category, min_price, max_price)
+    name = name.strip() if name else None
+    filters = (name, category, min_price, max_price, match)
+
+    return await cached_json_response(
+        request,
+        ("facets", *search_key(*filters)),
+        lambda: repo.facets(*filters),
+    )
+
+
+# -----------------------------
+# Export Sweets (AUTH)
+# -----------------------------
+@router.get("/export")
+async def export_sweets(
+    request: Request,
+    format: Literal["ndjson", "json"] = "ndjson",
+    batch_size: int = Query(default=500, ge=1, le=10_000),
+    user=Depends(get_current_user),
+):
+    repo = SweetRepository(request)
+
+    async def ndjson():
+        async for batch in repo.export(batch_size):
+            yield b"".join(dumps(sweet) + b"\n" for sweet in batch)
+
+    async def json_array():
+        separator = b""
+        yield b"["
+        async for batch in repo.export(batch_size):
+            yield separator + b",".join(dumps(sweet) for sweet in batch)
+            separator = b","
+        yield b"]"
+
+    if format == "json":
+        return StreamingResponse(json_array(), media_type="application/json")
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 
 # -----------------------------
@@ -1,5 +1,5 @@
 from fastapi import Request
-from app.core.security import verify_password
+from app.core.security import verify_and_update_password_async
 from app.core.jwt import create_access_token
 from app.repositories.user_repository import UserRepository
 from app.models.user import UserCreate
@@ -17,9 +17,19 @@ class AuthService:
         if not user:
             return None
 
-        if not verify_password(password, user["hashed_password"]):
+        valid, new_hash = await verify_and_update_password_async(
+            password, user["hashed_password"]
+        )
+        if not valid:
             return None
 
+        if new_hash:
+            # Argon2 parameters changed since this hash was made
+            await self.repo.collection.update_one(
+                {"_id": user["_id"]},
+                {"$set": {"hashed_password": new_hash}},
+            )
+
         return create_access_token(
             {"sub": user["email"], "role": user.get("role", "user")}
         )
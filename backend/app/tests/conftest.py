@@ -0,0 +1,5 @@
+import os
+
+# The suite runs on the in-process storage engine unless told otherwise;
+# STORAGE_BACKEND=mongo runs it against MONGODB_URL instead.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
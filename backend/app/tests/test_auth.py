@@ -8,6 +8,9 @@ from app.main import app
 @pytest.mark.asyncio
 async def test_register_user():
     async with LifespanManager(app):
+        # users.email is unique, so start from a clean slate on reruns
+        await app.state.db["users"].delete_one({"email": "auth@test.com"})
+
         transport = httpx.ASGITransport(app=app)
 
         async with httpx.AsyncClient(
@@ -44,3 +47,23 @@ async def test_login_user():
 
     assert response.status_code == 200
     assert "access_token" in response.json()
+
+
+@pytest.mark.asyncio
+async def test_register_duplicate_email_rejected():
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as client:
+            response = await client.post(
+                "/api/auth/register",
+                json={
+                    "email": "auth@test.com",
+                    "password": "another123"
+                }
+            )
+
+    assert response.status_code == 400
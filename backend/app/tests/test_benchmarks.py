@@ -0,0 +1,62 @@
+import os
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.benchmarks import SCENARIOS, compare, percentile, run_scenarios
+
+
+def test_percentile_uses_nearest_rank():
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 99) == 99
+    assert percentile([], 95) == 0.0
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = [
+        {"scenario": "list", "rps": 1000, "p95_ms": 10, "errors": 0},
+        {"scenario": "search", "rps": 500, "p95_ms": 20, "errors": 0},
+    ]
+    results = [
+        {"scenario": "list", "rps": 900, "p95_ms": 11, "errors": 0},
+        {"scenario": "search", "rps": 300, "p95_ms": 30, "errors": 1},
+        {"scenario": "login", "rps": 5, "p95_ms": 900, "errors": 0},
+    ]
+
+    regressions = compare(results, baseline, threshold=0.2)
+
+    assert len(regressions) == 3
+    assert all(r.startswith("search:") for r in regressions)
+
+
+@pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"),
+    reason="set RUN_BENCHMARKS=1 to run benchmarks",
+)
+@pytest.mark.asyncio
+async def test_benchmark_scenarios_run_cleanly():
+    async with LifespanManager(app):
+        app.state.rate_limit_backend = None
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            results = await run_scenarios(client, concurrency=20, scale=0.1)
+
+        leftover = await app.state.db["sweets"].count_documents(
+            {"category": "Benchmark"}
+        )
+        await app.state.db["users"].delete_one({"email": "benchmark@test.com"})
+
+    for result in results:
+        print(
+            f"\n{result['scenario']}: {result['rps']} req/s, "
+            f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms"
+        )
+
+    assert [r["scenario"] for r in results] == list(SCENARIOS)
+    assert all(r["errors"] == 0 for r in results)
+    assert leftover == 0
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.cache import TTLCache
+from app.core.jwt import create_access_token
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_entries_expire_and_stale_loads_are_dropped():
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+
+    generation = cache.generation
+    cache.clear()
+    cache.set("b", 2, generation=generation)
+
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+
+
+@pytest.mark.asyncio
+async def test_catalogue_reads_are_cached_until_a_write():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            res = await client.post(
+                "/api/sweets",
+                json={
+                    "name": "Cached Barfi",
+                    "category": "Cached",
+                    "price": 12,
+                    "quantity": 3
+                }
+            )
+            sweet_id = res.json()["_id"]
+            params = {"category": "Cached"}
+
+            first = await client.get("/api/sweets/search", params=params)
+            second = await client.get("/api/sweets/search", params=params)
+            stats = (await client.get("/api/admin/cache")).json()
+
+            await client.post(f"/api/sweets/{sweet_id}/purchase")
+            after_purchase = await client.get(
+                "/api/sweets/search", params=params
+            )
+
+        await app.state.db["sweets"].delete_many({"category": "Cached"})
+
+    assert first.json() == second.json()
+    assert stats["enabled"] is True
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert after_purchase.json()[0]["quantity"] == 2
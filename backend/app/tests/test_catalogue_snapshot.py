@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.db.catalogue_snapshot import CatalogueSnapshot
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("snapshot did not catch up")
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_picks_up_writes_from_other_workers():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        collection = app.state.db["sweets"]
+        snapshot = CatalogueSnapshot(
+            collection, use_change_stream=False, poll_interval=0.02
+        )
+        await snapshot.start()
+        app.state.catalogue_snapshot = snapshot
+
+        try:
+            await wait_for(lambda: snapshot.ready)
+
+            # Written behind this worker's back, like another process would
+            result = await collection.insert_one(
+                {
+                    "name": "Remote Rasmalai",
+                    "category": "Snapshot",
+                    "price": 18,
+                    "quantity": 7
+                }
+            )
+            sweet_id = str(result.inserted_id)
+            await wait_for(lambda: sweet_id in snapshot.sweets)
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport,
+                base_url="http://test",
+                headers={"Authorization": f"Bearer {admin_token}"}
+            ) as client:
+                await client.post(f"/api/sweets/{sweet_id}/purchase")
+                listed = await client.get("/api/sweets")
+
+            await collection.delete_one({"_id": result.inserted_id})
+            await wait_for(lambda: sweet_id not in snapshot.sweets)
+        finally:
+            await snapshot.stop()
+            app.state.catalogue_snapshot = None
+            await collection.delete_many({"category": "Snapshot"})
+
+    remote = [s for s in listed.json() if s["_id"] == sweet_id]
+    assert remote[0]["quantity"] == 6
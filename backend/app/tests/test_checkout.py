@@ -0,0 +1,194 @@
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+from bson import ObjectId
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.core.metrics import MONGO_COMMANDS
+
+
+async def create_sweets(client, *quantities):
+    sweet_ids = []
+    for index, quantity in enumerate(quantities):
+        res = await client.post(
+            "/api/sweets",
+            json={
+                "name": f"Cart Sweet {index}",
+                "category": "Indian",
+                "price": 10.0,
+                "quantity": quantity
+            }
+        )
+        sweet_ids.append(res.json()["_id"])
+    return sweet_ids
+
+
+async def stock_levels(sweet_ids):
+    sweets = app.state.db["sweets"]
+    levels = []
+    for sweet_id in sweet_ids:
+        sweet = await sweets.find_one({"_id": ObjectId(sweet_id)})
+        levels.append(sweet["quantity"])
+    return levels
+
+
+@pytest.mark.asyncio
+async def test_checkout_decrements_every_line():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+    user_token = create_access_token({"sub": "user@test.com", "role": "user"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_ids = await create_sweets(client, 5, 3)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {user_token}"}
+        ) as client:
+            response = await client.post(
+                "/api/sweets/checkout",
+                json={
+                    "items": [
+                        {"sweet_id": sweet_ids[0], "quantity": 2},
+                        {"sweet_id": sweet_ids[1], "quantity": 3},
+                        {"sweet_id": sweet_ids[0], "quantity": 1},
+                    ]
+                }
+            )
+
+        levels = await stock_levels(sweet_ids)
+        await app.state.db["sweets"].delete_many(
+            {"_id": {"$in": [ObjectId(sweet_id) for sweet_id in sweet_ids]}}
+        )
+
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 2
+    assert levels == [2, 0]
+
+
+@pytest.mark.asyncio
+async def test_checkout_is_all_or_nothing():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+    user_token = create_access_token({"sub": "user@test.com", "role": "user"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_ids = await create_sweets(client, 5, 1, 5)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {user_token}"}
+        ) as client:
+            out_of_stock = await client.post(
+                "/api/sweets/checkout",
+                json={
+                    "items": [
+                        {"sweet_id": sweet_ids[0], "quantity": 2},
+                        {"sweet_id": sweet_ids[1], "quantity": 2},
+                        {"sweet_id": sweet_ids[2], "quantity": 2},
+                    ]
+                }
+            )
+            malformed = await client.post(
+                "/api/sweets/checkout",
+                json={"items": [{"sweet_id": "zzz", "quantity": 1}]}
+            )
+            missing_id = str(ObjectId())
+            missing = await client.post(
+                "/api/sweets/checkout",
+                json={
+                    "items": [
+                        {"sweet_id": sweet_ids[0], "quantity": 1},
+                        {"sweet_id": missing_id, "quantity": 1},
+                    ]
+                }
+            )
+
+        levels = await stock_levels(sweet_ids)
+        await app.state.db["sweets"].delete_many(
+            {"_id": {"$in": [ObjectId(sweet_id) for sweet_id in sweet_ids]}}
+        )
+        phantom = await app.state.db["sweets"].find_one(
+            {"_id": ObjectId(missing_id)}
+        )
+
+    assert out_of_stock.status_code == 400
+    assert malformed.status_code == 422
+    assert missing.status_code == 404
+    assert levels == [5, 1, 5]
+    assert phantom is None
+
+
+@pytest.mark.asyncio
+async def test_checkout_writes_a_cart_in_one_round_trip():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+    user_token = create_access_token({"sub": "user@test.com", "role": "user"})
+
+    def writes():
+        return {
+            name: MONGO_COMMANDS.value(name, "success")
+            for name in ("findAndModify", "update")
+        }
+
+    async with LifespanManager(app):
+        if app.state.supports_transactions:
+            pytest.skip("measures the path without transactions")
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_ids = await create_sweets(client, *[5] * 8)
+        # The ledger is written after the requests, not during them
+        app.state.ledger.interval = 60
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {user_token}"}
+        ) as client:
+            before = writes()
+            bought = await client.post(
+                "/api/sweets/checkout",
+                json={"items": [{"sweet_id": i, "quantity": 1} for i in sweet_ids]}
+            )
+            after = writes()
+
+            # The last line is short: the other seven are put back
+            short = await client.post(
+                "/api/sweets/checkout",
+                json={
+                    "items": [
+                        {"sweet_id": i, "quantity": 1 if n < 7 else 5}
+                        for n, i in enumerate(sweet_ids)
+                    ]
+                }
+            )
+
+        levels = await stock_levels(sweet_ids)
+        await app.state.db["sweets"].delete_many(
+            {"_id": {"$in": [ObjectId(sweet_id) for sweet_id in sweet_ids]}}
+        )
+
+    assert bought.status_code == 200
+    assert after["findAndModify"] == before["findAndModify"]
+    assert after["update"] == before["update"] + 1
+    assert short.status_code == 400
+    assert levels == [4] * 8
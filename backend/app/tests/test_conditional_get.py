@@ -0,0 +1,101 @@
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.core.responses import etag_matches
+
+
+def test_if_none_match_uses_weak_comparison():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+@pytest.mark.asyncio
+async def test_unchanged_catalogue_returns_not_modified():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            res = await client.post(
+                "/api/sweets",
+                json={
+                    "name": "Etag Halwa",
+                    "category": "Etag",
+                    "price": 9,
+                    "quantity": 4
+                }
+            )
+            sweet_id = res.json()["_id"]
+            params = {"category": "Etag"}
+
+            first = await client.get("/api/sweets/search", params=params)
+            etag = first.headers["etag"]
+            revalidated = await client.get(
+                "/api/sweets/search",
+                params=params,
+                headers={"If-None-Match": etag}
+            )
+
+            await client.post(f"/api/sweets/{sweet_id}/purchase")
+            after_purchase = await client.get(
+                "/api/sweets/search",
+                params=params,
+                headers={"If-None-Match": etag}
+            )
+
+        await app.state.db["sweets"].delete_many({"category": "Etag"})
+
+    assert first.status_code == 200
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+    assert after_purchase.status_code == 200
+    assert after_purchase.headers["etag"] != etag
+    assert after_purchase.json()[0]["quantity"] == 3
+
+
+@pytest.mark.asyncio
+async def test_large_catalogue_bodies_are_compressed():
+    token = create_access_token({"sub": "user@test.com", "role": "user"})
+
+    async with LifespanManager(app):
+        await app.state.db["sweets"].insert_many(
+            [
+                {
+                    "name": f"Compressed Peda {i}",
+                    "category": "Compressed",
+                    "price": 5,
+                    "quantity": 1
+                }
+                for i in range(50)
+            ]
+        )
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Accept-Encoding": "gzip"
+            }
+        ) as client:
+            res = await client.get(
+                "/api/sweets/search", params={"category": "Compressed"}
+            )
+
+        await app.state.db["sweets"].delete_many({"category": "Compressed"})
+
+    assert res.headers["content-encoding"] == "gzip"
+    assert len(res.json()) == 50
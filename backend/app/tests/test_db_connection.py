@@ -1,4 +1,19 @@
-from app.db.mongo import get_client, get_database
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+from app.db import mongo
+from app.db.mongo import (
+    MONGODB_MAX_POOL_SIZE,
+    MONGODB_MIN_POOL_SIZE,
+    DatabaseSetup,
+    get_client,
+    get_database,
+    warm_up,
+)
+from app.db.monitoring import PoolMonitor, pool_monitor
 
 
 def test_database_connection():
@@ -8,3 +23,87 @@ def test_database_connection():
     assert db.name == "sweet_shop"
 
     client.close()
+
+
+def test_client_uses_configured_pool_and_monitor():
+    client = get_client()
+
+    assert client.options.pool_options.max_pool_size == MONGODB_MAX_POOL_SIZE
+    assert client.options.pool_options.min_pool_size == MONGODB_MIN_POOL_SIZE
+    assert pool_monitor in client.options.event_listeners
+
+    client.close()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_gives_up_without_failing_startup(monkeypatch):
+    class Unreachable:
+        async def command(self, name):
+            raise ServerSelectionTimeoutError("no servers")
+
+    class Slow:
+        async def command(self, name):
+            await asyncio.sleep(10)
+
+    monkeypatch.setattr(mongo, "MONGODB_WARM_UP_TIMEOUT_MS", 50)
+
+    assert await warm_up(SimpleNamespace(admin=Unreachable())) is False
+    assert await warm_up(SimpleNamespace(admin=Slow())) is False
+
+
+@pytest.mark.asyncio
+async def test_setup_retries_until_the_database_answers(monkeypatch):
+    attempts = 0
+
+    class Recovering:
+        async def command(self, name):
+            nonlocal attempts
+            attempts += 1
+            if attempts < 3:
+                raise ServerSelectionTimeoutError("no servers")
+            return {"setName": "rs0"}
+
+    class Client:
+        admin = Recovering()
+
+        def __getitem__(self, name):
+            return name
+
+    built = []
+
+    async def ensure_indexes(db):
+        built.append(db)
+
+    monkeypatch.setattr(mongo, "ensure_indexes", ensure_indexes)
+    ready = []
+    setup = DatabaseSetup(Client(), ready.append, interval=0.01)
+    # Unreachable at startup: nothing is tried until the first retry
+    await setup.start(reachable=False)
+    assert attempts == 0
+
+    await asyncio.wait_for(setup._task, 1)
+    await setup.stop()
+
+    assert attempts == 3
+    assert ready == [True]
+    assert built == [mongo.MONGODB_DB_NAME]
+
+
+def test_pool_monitor_tracks_checkouts():
+    monitor = PoolMonitor()
+    event = SimpleNamespace(address=("localhost", 27017))
+
+    monitor.connection_created(event)
+    monitor.connection_check_out_started(event)
+    monitor.connection_checked_out(event)
+
+    busy = monitor.stats()["localhost:27017"]
+
+    monitor.connection_checked_in(event)
+    idle = monitor.stats()["localhost:27017"]
+
+    assert busy["open"] == 1
+    assert busy["in_use"] == 1
+    assert busy["waiting"] == 0
+    assert idle["in_use"] == 0
+    assert idle["checkouts"] == 1
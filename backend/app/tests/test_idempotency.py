@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.idempotency import MemoryIdempotencyStore
+from app.core.jwt import create_access_token
+
+
+async def create_sweet(client, quantity=5):
+    res = await client.post(
+        "/api/sweets",
+        json={
+            "name": "Idempotent Imarti",
+            "category": "Idempotent",
+            "price": 11,
+            "quantity": quantity
+        }
+    )
+    return res.json()["_id"]
+
+
+@pytest.mark.asyncio
+async def test_memory_store_replays_and_releases_keys():
+    store = MemoryIdempotencyStore(ttl=60)
+
+    assert await store.claim("k", "fp") is None
+    assert (await store.claim("k", "fp"))["status"] == "pending"
+
+    await store.release("k")
+    assert await store.claim("k", "fp") is None
+
+    await store.complete("k", 200, b"{}")
+    await store.release("k")
+    record = await store.claim("k", "fp")
+    assert record["status"] == "done"
+    assert record["body"] == b"{}"
+
+
+@pytest.mark.asyncio
+async def test_retried_purchase_decrements_stock_once():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_id = await create_sweet(client)
+            headers = {"Idempotency-Key": f"purchase-{sweet_id}"}
+
+            first = await client.post(
+                f"/api/sweets/{sweet_id}/purchase",
+                json={"quantity": 2},
+                headers=headers
+            )
+            retry = await client.post(
+                f"/api/sweets/{sweet_id}/purchase",
+                json={"quantity": 2},
+                headers=headers
+            )
+            reused = await client.post(
+                f"/api/sweets/{sweet_id}/purchase",
+                json={"quantity": 3},
+                headers=headers
+            )
+            stored = await app.state.db["sweets"].find_one(
+                {"name": "Idempotent Imarti"}
+            )
+
+        await app.state.db["sweets"].delete_many({"category": "Idempotent"})
+
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert reused.status_code == 422
+    assert stored["quantity"] == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_retries_run_the_restock_once():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_id = await create_sweet(client, quantity=0)
+            headers = {"Idempotency-Key": f"restock-{sweet_id}"}
+
+            responses = await asyncio.gather(
+                *[
+                    client.post(
+                        f"/api/sweets/{sweet_id}/restock",
+                        json={"quantity": 10},
+                        headers=headers
+                    )
+                    for _ in range(5)
+                ]
+            )
+            stored = await app.state.db["sweets"].find_one(
+                {"name": "Idempotent Imarti"}
+            )
+
+        await app.state.db["sweets"].delete_many({"category": "Idempotent"})
+
+    codes = sorted(res.status_code for res in responses)
+    assert codes.count(200) >= 1
+    assert set(codes) <= {200, 409}
+    assert stored["quantity"] == 10
+
+
+@pytest.mark.asyncio
+async def test_out_of_stock_result_is_replayed():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_id = await create_sweet(client, quantity=0)
+            headers = {"Idempotency-Key": f"empty-{sweet_id}"}
+
+            first = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", headers=headers
+            )
+            retry = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", headers=headers
+            )
+
+        await app.state.db["sweets"].delete_many({"category": "Idempotent"})
+
+    assert first.status_code == 400
+    assert retry.status_code == 400
+    assert retry.json() == {"detail": "Sweet is out of stock"}
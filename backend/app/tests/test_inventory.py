@@ -36,9 +36,21 @@ async def test_purchase_sweet_decreases_quantity():
             headers={"Authorization": f"Bearer {user_token}"}
         ) as client:
             purchase = await client.post(f"/api/sweets/{sweet_id}/purchase")
+            invalid = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", json={"quantity": "two"}
+            )
+            negative = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", json={"quantity": -1}
+            )
+            numeric = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", json={"quantity": "2"}
+            )
 
     assert purchase.status_code == 200
     assert purchase.json()["quantity"] == 4
+    assert invalid.status_code == 422
+    assert negative.status_code == 422
+    assert numeric.json()["quantity"] == 2
 
 
 @pytest.mark.asyncio
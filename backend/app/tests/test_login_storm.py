@@ -0,0 +1,84 @@
+import asyncio
+import os
+import statistics
+import time
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.core.security import hash_password
+
+LOGINS = 40
+CATALOGUE_READS = 100
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"),
+    reason="set RUN_BENCHMARKS=1 to run benchmarks",
+)
+
+
+@pytest.mark.asyncio
+async def test_catalogue_latency_stays_flat_during_login_storm():
+    user_token = create_access_token({"sub": "storm@test.com", "role": "user"})
+
+    # How long one hash blocks whoever runs it
+    started = time.perf_counter()
+    hash_password("storm-password")
+    hash_ms = (time.perf_counter() - started) * 1000
+
+    async with LifespanManager(app):
+        # Every login comes from one test client address
+        app.state.rate_limit_backend = None
+        users = app.state.db["users"]
+        await users.delete_one({"email": "storm@test.com"})
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as client:
+            await client.post(
+                "/api/auth/register",
+                json={"email": "storm@test.com", "password": "storm-password"}
+            )
+
+            async def read_catalogue():
+                latencies = []
+                for _ in range(CATALOGUE_READS):
+                    started = time.perf_counter()
+                    await client.get(
+                        "/api/sweets",
+                        params={"limit": 10},
+                        headers={"Authorization": f"Bearer {user_token}"},
+                    )
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    await asyncio.sleep(0)
+                return latencies
+
+            baseline = await read_catalogue()
+
+            logins = [
+                client.post(
+                    "/api/auth/login",
+                    json={"email": "storm@test.com", "password": "storm-password"}
+                )
+                for _ in range(LOGINS)
+            ]
+            results = await asyncio.gather(read_catalogue(), *logins)
+            during_storm = results[0]
+
+        await users.delete_one({"email": "storm@test.com"})
+
+    baseline_p50 = statistics.median(baseline)
+    storm_p50 = statistics.median(during_storm)
+    print(
+        f"\none argon2 hash: {hash_ms:.1f} ms"
+        f"\nGET /api/sweets p50: {baseline_p50:.2f} ms idle, "
+        f"{storm_p50:.2f} ms during {LOGINS} concurrent logins"
+    )
+
+    # Hashing on the loop would make every read wait for at least one hash
+    assert storm_p50 < hash_ms
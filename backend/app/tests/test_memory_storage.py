@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.db.indexes import INDEXES
+from app.db.memory import MemoryClient
+
+
+async def sweets_collection():
+    collection = MemoryClient()["test"]["sweets"]
+    await collection.create_indexes(INDEXES["sweets"])
+    await collection.insert_many(
+        {
+            "name": f"Sweet {i} {'Kaju' if i % 2 else 'Gulab'}",
+            "category": ["Indian", "Bakery"][i % 2],
+            "price": float(i),
+            "quantity": 5,
+        }
+        for i in range(20)
+    )
+    return collection
+
+
+@pytest.mark.asyncio
+async def test_indexed_queries_match_full_scans():
+    collection = await sweets_collection()
+    queries = [
+        {"category": "Bakery", "price": {"$gte": 3, "$lt": 11}},
+        {"price": {"$gt": 15}},
+        {"category": {"$in": ["Indian", "Fusion"]}},
+        {"name": {"$regex": "^Sweet 1"}},
+        {"$text": {"$search": "kaju"}},
+        {"price": {"$lte": "12"}},
+    ]
+
+    for query in queries:
+        indexed = await collection.find(query).to_list(length=None)
+        scanned = await collection.find(query).hint([("$natural", 1)]).to_list(
+            length=None
+        )
+        assert indexed == scanned
+
+
+@pytest.mark.asyncio
+async def test_sort_limit_projection_and_text_ranking():
+    collection = await sweets_collection()
+    await collection.insert_one(
+        {"name": "Kaju Kaju Katli", "category": "Indian", "price": 1.0, "quantity": 1}
+    )
+
+    page = await (
+        collection.find({}, {"price": 1})
+        .sort([("price", -1), ("_id", 1)])
+        .limit(3)
+        .to_list(length=None)
+    )
+    ranked = await (
+        collection.find({"$text": {"$search": "kaju"}})
+        .sort([("score", {"$meta": "textScore"})])
+        .to_list(length=None)
+    )
+
+    assert [sweet["price"] for sweet in page] == [19.0, 18.0, 17.0]
+    assert set(page[0]) == {"_id", "price"}
+    assert ranked[0]["name"] == "Kaju Kaju Katli"
+    assert len(ranked) == 11
+
+
+@pytest.mark.asyncio
+async def test_guarded_updates_and_upsert_collisions():
+    collection = await sweets_collection()
+    sweet = await collection.find_one({"name": "Sweet 0 Gulab"})
+
+    bought = await collection.find_one_and_update(
+        {"_id": sweet["_id"], "quantity": {"$gte": 5}},
+        {"$inc": {"quantity": -5}},
+        return_document=ReturnDocument.AFTER,
+    )
+    sold_out = await collection.find_one_and_update(
+        {"_id": sweet["_id"], "quantity": {"$gte": 1}},
+        {"$inc": {"quantity": -1}},
+    )
+
+    # The checkout guard: an upsert on a sweet without stock collides
+    with pytest.raises(BulkWriteError) as exc:
+        await collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": sweet["_id"], "quantity": {"$gte": 1}},
+                    {"$inc": {"quantity": -1}},
+                    upsert=True,
+                )
+            ]
+        )
+
+    assert bought["quantity"] == 0
+    assert sold_out is None
+    assert exc.value.details["writeErrors"][0]["code"] == 11000
+
+
+@pytest.mark.asyncio
+async def test_unique_indexes_are_enforced():
+    users = MemoryClient()["test"]["users"]
+    await users.create_indexes(INDEXES["users"])
+    await users.insert_one({"email": "a@test.com"})
+
+    with pytest.raises(DuplicateKeyError):
+        await users.insert_one({"email": "a@test.com"})
+
+    other = await users.insert_one({"email": "b@test.com"})
+    with pytest.raises(DuplicateKeyError):
+        await users.update_one(
+            {"_id": other.inserted_id}, {"$set": {"email": "a@test.com"}}
+        )
+
+
+@pytest.mark.asyncio
+async def test_ttl_indexes_expire_documents():
+    collection = MemoryClient()["test"]["holds"]
+    await collection.create_indexes(
+        [IndexModel([("purge_at", ASCENDING)], expireAfterSeconds=60)]
+    )
+    now = datetime.now(timezone.utc)
+    await collection.insert_many(
+        [
+            {"purge_at": now - timedelta(minutes=2)},
+            {"purge_at": now},
+            {"status": "held"},
+        ]
+    )
+
+    # Swept on the next insert once the interval has passed
+    collection._next_expiry = 0
+    await collection.insert_one({"status": "held"})
+
+    kept = await collection.find({}, {"_id": 0}).to_list(length=None)
+    assert kept == [{"purge_at": now}, {"status": "held"}, {"status": "held"}]
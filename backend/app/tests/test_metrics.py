@@ -0,0 +1,43 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core.metrics import Counter, Histogram, REGISTRY
+
+client = TestClient(app)
+
+
+def test_metrics_endpoint_reports_route_templates():
+    client.get("/")
+    client.post("/api/sweets/some-id/purchase")
+
+    response = client.get("/metrics")
+    body = response.text
+
+    assert response.status_code == 200
+    assert 'http_requests_total{method="GET",route="/",status="200"}' in body
+    assert (
+        'http_requests_total{method="POST",'
+        'route="/api/sweets/{sweet_id}/purchase",status="401"}'
+    ) in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/",le="+Inf"}' in body
+    assert "mongodb_command_duration_seconds" in body
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_latency_seconds", "Test.", ("op",), buckets=(0.1, 1))
+    counter = Counter("test_events_total", "Test.", ("op",))
+    REGISTRY.remove(histogram)
+    REGISTRY.remove(counter)
+
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, "read")
+    counter.inc("read")
+    counter.inc("read", amount=2)
+
+    samples = histogram.samples()
+
+    assert 'test_latency_seconds_bucket{op="read",le="0.1"} 1' in samples
+    assert 'test_latency_seconds_bucket{op="read",le="1"} 2' in samples
+    assert 'test_latency_seconds_bucket{op="read",le="+Inf"} 3' in samples
+    assert 'test_latency_seconds_count{op="read"} 3' in samples
+    assert counter.value("read") == 3
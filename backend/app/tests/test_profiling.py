@@ -0,0 +1,82 @@
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.core.profiling import PROFILE_DRIVER_COMMANDS, SlowRequestLog, slow_requests
+from app.db.mongo import STORAGE_BACKEND
+
+admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+user_token = create_access_token({"sub": "profiled-user@test.com", "role": "user"})
+
+
+def test_slow_request_log_keeps_the_slowest():
+    log = SlowRequestLog(size=3)
+    for duration in (5, 1, 9, 3, 7):
+        log.add({"duration_ms": duration, "stack": "..."})
+
+    kept = log.list()
+    assert [entry["duration_ms"] for entry in kept] == [9, 7, 5]
+    assert "stack" not in kept[0]
+    assert log.get(kept[0]["id"])["stack"] == "..."
+
+
+@pytest.mark.asyncio
+async def test_admin_can_profile_a_request():
+    slow_requests.clear()
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            res = await client.post(
+                "/api/sweets",
+                json={"name": "Profiled Pedha", "category": "Profiled", "price": 3, "quantity": 5},
+            )
+            sweet_id = res.json()["_id"]
+
+            # Not an admin: the header is ignored
+            plain = await client.post(
+                f"/api/sweets/{sweet_id}/purchase",
+                headers={"Authorization": f"Bearer {user_token}", "X-Profile": "1"},
+            )
+            assert "server-timing" not in plain.headers
+            assert slow_requests.list() == []
+
+            profiled = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", headers={"X-Profile": "1"}
+            )
+            assert profiled.status_code == 200
+            assert "SweetRepository.purchase;dur=" in profiled.headers["server-timing"]
+
+            listed = await client.get("/api/admin/profiles")
+            [entry] = listed.json()
+            detail = await client.get(f"/api/admin/profiles/{entry['id']}")
+
+            await client.delete(f"/api/sweets/{sweet_id}")
+            await client.delete("/api/admin/profiles")
+
+    assert entry["route"] == "/api/sweets/{sweet_id}/purchase"
+    assert entry["status"] == 200
+    assert entry["trigger"] == "header"
+    spans = [span["name"] for span in entry["spans"]]
+    # Dependencies run while the request is validated
+    assert spans[:2] == ["validate", "auth"]
+    auth = next(s for s in entry["spans"] if s["name"] == "auth")
+    assert auth["depth"] == 1
+    assert "SweetRepository.purchase" in spans
+    assert "LedgerWriter.record" in spans
+    assert "serialize" in spans
+    # Nested inside the purchase
+    ledger = next(s for s in entry["spans"] if s["name"] == "LedgerWriter.record")
+    assert ledger["depth"] == 1
+    # One span per database round trip (always on the in-process engine)
+    if STORAGE_BACKEND == "memory" or PROFILE_DRIVER_COMMANDS:
+        assert "mongo.findAndModify" in spans
+
+    assert "stack" not in entry
+    assert "function calls" in detail.json()["stack"]
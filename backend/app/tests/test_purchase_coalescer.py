@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+from bson import ObjectId
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.core.metrics import PURCHASE_BATCH_SIZE
+from app.repositories.purchase_coalescer import PurchaseCoalescer
+
+admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+
+def batches_written() -> int:
+    state = PURCHASE_BATCH_SIZE._values.get(())
+    return state[2] if state else 0
+
+
+@pytest.mark.asyncio
+async def test_coalesced_purchases_never_oversell():
+    stock, buyers = 100, 150
+    tokens = [
+        create_access_token({"sub": f"batch-buyer{i}@test.com", "role": "user"})
+        for i in range(buyers)
+    ]
+
+    async with LifespanManager(app):
+        app.state.purchase_coalescer = PurchaseCoalescer(
+            app.state.db["sweets"], window=0.005
+        )
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            res = await client.post(
+                "/api/sweets",
+                json={
+                    "name": "Batched Ladoo",
+                    "category": "Coalesced",
+                    "price": 5.0,
+                    "quantity": stock
+                }
+            )
+            sweet_id = res.json()["_id"]
+
+            before = batches_written()
+            responses = await asyncio.gather(*[
+                client.post(
+                    f"/api/sweets/{sweet_id}/purchase",
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                for token in tokens
+            ])
+            batches = batches_written() - before
+
+            missing = await client.post(
+                f"/api/sweets/{ObjectId()}/purchase"
+            )
+
+            sweet = await app.state.db["sweets"].find_one(
+                {"_id": ObjectId(sweet_id)}
+            )
+            await client.delete(f"/api/sweets/{sweet_id}")
+
+    codes = [r.status_code for r in responses]
+    assert codes.count(200) == stock
+    assert codes.count(400) == buyers - stock
+    assert sweet["quantity"] == 0
+    # Far fewer writes than purchases
+    assert batches < buyers / 10
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_batch_serves_smallest_purchases_first():
+    async with LifespanManager(app):
+        collection = app.state.db["sweets"]
+        coalescer = PurchaseCoalescer(collection, window=0.005)
+        result = await collection.insert_one(
+            {"name": "Batched Barfi", "category": "Coalesced", "price": 4, "quantity": 5}
+        )
+        sweet_id = result.inserted_id
+
+        results = await asyncio.gather(*[
+            coalescer.purchase(sweet_id, quantity) for quantity in (3, 1, 2, 4)
+        ])
+
+        ghost = ObjectId()
+        lost = await coalescer.purchase(ghost, 1)
+        leftover = await collection.find_one({"_id": ghost})
+
+        await coalescer.close()
+        await collection.delete_one({"_id": sweet_id})
+
+    # 1 and 2 fit; 3 no longer does, and 4 is not tried
+    assert [r and r["quantity"] for r in results] == [None, 2, 2, None]
+    assert lost is None
+    assert leftover is None
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import time
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.main import app
+from app.core.jwt import create_access_token
+
+STOCK = 1000
+BUYERS = 2500
+
+
+@pytest.mark.asyncio
+async def test_concurrent_purchases_never_oversell():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+    # One token per buyer, so the per-user rate limit does not apply
+    buyer_tokens = [
+        create_access_token({"sub": f"buyer{i}@test.com", "role": "user"})
+        for i in range(BUYERS)
+    ]
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            res = await client.post(
+                "/api/sweets",
+                json={
+                    "name": "Festival Ladoo",
+                    "category": "Indian",
+                    "price": 5.0,
+                    "quantity": STOCK
+                }
+            )
+            sweet_id = res.json()["_id"]
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as client:
+            responses = await asyncio.gather(*[
+                client.post(
+                    f"/api/sweets/{sweet_id}/purchase",
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                for token in buyer_tokens
+            ])
+
+        sweet = await app.state.db["sweets"].find_one(
+            {"_id": ObjectId(sweet_id)}
+        )
+        await app.state.db["sweets"].delete_one({"_id": ObjectId(sweet_id)})
+
+    succeeded = [r for r in responses if r.status_code == 200]
+    sold_out = [r for r in responses if r.status_code == 400]
+
+    assert len(succeeded) == STOCK
+    assert len(sold_out) == BUYERS - STOCK
+    assert sweet["quantity"] == 0
+    assert min(r.json()["quantity"] for r in succeeded) == 0
+
+
+@pytest.mark.asyncio
+async def test_purchase_multiple_units():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+    user_token = create_access_token({"sub": "user@test.com", "role": "user"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            res = await client.post(
+                "/api/sweets",
+                json={
+                    "name": "Soan Papdi",
+                    "category": "Indian",
+                    "price": 9.0,
+                    "quantity": 5
+                }
+            )
+            sweet_id = res.json()["_id"]
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {user_token}"}
+        ) as client:
+            purchase = await client.post(
+                f"/api/sweets/{sweet_id}/purchase",
+                json={"quantity": 3}
+            )
+            too_many = await client.post(
+                f"/api/sweets/{sweet_id}/purchase",
+                json={"quantity": 3}
+            )
+            missing = await client.post(
+                f"/api/sweets/{ObjectId()}/purchase"
+            )
+
+    assert purchase.status_code == 200
+    assert purchase.json()["quantity"] == 2
+    assert too_many.status_code == 400
+    assert missing.status_code == 404
+
+
+@pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"),
+    reason="set RUN_BENCHMARKS=1 to run benchmarks",
+)
+# The gain is a saved network round trip, which the in-process engine
+# does not have
+@pytest.mark.skipif(
+    os.getenv("STORAGE_BACKEND") != "mongo",
+    reason="measures MongoDB; set STORAGE_BACKEND=mongo",
+)
+@pytest.mark.asyncio
+async def test_single_update_purchase_beats_read_then_write():
+    # The purchase path (one guarded findAndModify) against the read then
+    # write it replaced, for the same rush of buyers on one sweet
+    async with LifespanManager(app):
+        sweets = app.state.db["sweets"]
+
+        async def single_update(sweet_id):
+            return await sweets.find_one_and_update(
+                {"_id": sweet_id, "quantity": {"$gte": 1}},
+                {"$inc": {"quantity": -1}},
+                return_document=ReturnDocument.AFTER,
+            )
+
+        async def read_then_write(sweet_id):
+            sweet = await sweets.find_one({"_id": sweet_id})
+            if sweet["quantity"] < 1:
+                return None
+            result = await sweets.update_one(
+                {"_id": sweet_id, "quantity": {"$gte": 1}},
+                {"$inc": {"quantity": -1}},
+            )
+            return sweet if result.modified_count else None
+
+        timings = {}
+        for purchase in (single_update, read_then_write):
+            result = await sweets.insert_one(
+                {
+                    "name": f"Bench Ladoo {purchase.__name__}",
+                    "category": "Benchmark",
+                    "price": 5.0,
+                    "quantity": STOCK,
+                }
+            )
+            started = time.perf_counter()
+            bought = await asyncio.gather(
+                *[purchase(result.inserted_id) for _ in range(BUYERS)]
+            )
+            timings[purchase.__name__] = time.perf_counter() - started
+            await sweets.delete_one({"_id": result.inserted_id})
+
+            assert sum(1 for sweet in bought if sweet) == STOCK
+
+    for name, elapsed in timings.items():
+        print(
+            f"\n{name}: {BUYERS} purchases in {elapsed:.2f}s "
+            f"({elapsed / BUYERS * 1000:.3f} ms/purchase)"
+        )
+    assert timings["single_update"] < timings["read_then_write"]
@@ -0,0 +1,113 @@
+import os
+import time
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.jwt import create_access_token
+from starlette.requests import Request
+
+from app.core import rate_limit
+from app.core.rate_limit import MemoryRateLimitBackend, client_key, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("10/minute") == (10 / 60, 10)
+    assert parse_rate("20/second") == (20, 20)
+    assert parse_rate("") is None
+    with pytest.raises(ValueError):
+        parse_rate("ten/fortnight")
+
+
+def test_anonymous_callers_are_keyed_by_forwarded_address(monkeypatch):
+    def request(forwarded):
+        return Request({
+            "type": "http",
+            "headers": [(b"x-forwarded-for", forwarded.encode())],
+            "client": ("10.0.0.1", 5000),
+        })
+
+    # Without trusted proxies the header is ignored
+    assert client_key(request("203.0.113.9")) == "ip:10.0.0.1"
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    # Only the entry added by the proxy counts, not what the caller sent
+    assert client_key(request("1.2.3.4, 203.0.113.9")) == "ip:203.0.113.9"
+    assert client_key(request("203.0.113.9")) == "ip:203.0.113.9"
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", 2)
+    assert client_key(request("203.0.113.9")) == "ip:203.0.113.9"
+
+
+@pytest.mark.asyncio
+async def test_bucket_allows_a_burst_then_refills():
+    backend = MemoryRateLimitBackend()
+
+    assert [await backend.take("k", rate=100, burst=3) for _ in range(3)] == [0, 0, 0]
+    wait = await backend.take("k", rate=100, burst=3)
+    assert 0 < wait <= 0.01
+
+    time.sleep(0.02)
+    assert await backend.take("k", rate=100, burst=3) == 0
+    assert await backend.take("other", rate=100, burst=3) == 0
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_bucket_is_evicted():
+    backend = MemoryRateLimitBackend(max_keys=2)
+    await backend.take("a", rate=1, burst=1)
+    await backend.take("b", rate=1, burst=1)
+    await backend.take("a", rate=1, burst=1)
+    await backend.take("c", rate=1, burst=1)
+
+    assert list(backend._buckets) == ["a", "c"]
+
+
+@pytest.mark.asyncio
+async def test_inventory_routes_return_429_per_user():
+    token = create_access_token({"sub": "limited@test.com", "role": "user"})
+    other = create_access_token({"sub": "unlimited@test.com", "role": "user"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as client:
+            # Unknown sweet: every allowed request is a cheap 404
+            url = "/api/sweets/000000000000000000000000/purchase"
+            responses = [
+                await client.post(
+                    url, headers={"Authorization": f"Bearer {token}"}
+                )
+                for _ in range(40)
+            ]
+            other_user = await client.post(
+                url, headers={"Authorization": f"Bearer {other}"}
+            )
+
+    limited = [res for res in responses if res.status_code == 429]
+    assert limited
+    assert int(limited[0].headers["retry-after"]) >= 1
+    assert other_user.status_code == 404
+
+
+@pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"),
+    reason="set RUN_BENCHMARKS=1 to run benchmarks",
+)
+@pytest.mark.asyncio
+async def test_rate_limit_check_costs_microseconds():
+    backend = MemoryRateLimitBackend()
+    rounds = 100_000
+
+    started = time.perf_counter()
+    for i in range(rounds):
+        await backend.take(f"user:{i % 1000}", rate=1e9, burst=1e9)
+    per_call_us = (time.perf_counter() - started) / rounds * 1e6
+
+    print(f"\nrate limit check: {per_call_us:.2f} us")
+    assert per_call_us < 5
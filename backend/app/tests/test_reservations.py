@@ -0,0 +1,173 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+from bson import ObjectId
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.repositories.reservation_repository import (
+    ReservationSweeper,
+    release_expired,
+)
+
+admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+user_token = create_access_token({"sub": "shopper@test.com", "role": "user"})
+other_token = create_access_token({"sub": "other@test.com", "role": "user"})
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def stock(sweet_id):
+    sweet = await app.state.db["sweets"].find_one({"_id": ObjectId(sweet_id)})
+    return sweet["quantity"], sweet.get("reserved", 0)
+
+
+@pytest.mark.asyncio
+async def test_reservation_confirm_and_release():
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            res = await client.post(
+                "/api/sweets",
+                json={"name": "Held Halwa", "category": "Reserved", "price": 8, "quantity": 10},
+                headers=auth(admin_token),
+            )
+            sweet_id = res.json()["_id"]
+
+            held = await client.post(
+                f"/api/sweets/{sweet_id}/reserve",
+                json={"quantity": 3},
+                headers=auth(user_token),
+            )
+            assert held.status_code == 200
+            assert held.json()["status"] == "held"
+            assert held.json()["sweet"]["quantity"] == 7
+            assert await stock(sweet_id) == (7, 3)
+
+            too_many = await client.post(
+                f"/api/sweets/{sweet_id}/reserve",
+                json={"quantity": 8},
+                headers=auth(user_token),
+            )
+            assert too_many.status_code == 400
+
+            reservation_id = held.json()["_id"]
+            stranger = await client.post(
+                f"/api/sweets/reservations/{reservation_id}/confirm",
+                headers=auth(other_token),
+            )
+            assert stranger.status_code == 404
+
+            for action in ("confirm", "release"):
+                malformed = await client.post(
+                    f"/api/sweets/reservations/not-an-id/{action}",
+                    headers=auth(user_token),
+                )
+                assert malformed.status_code == 404
+            malformed = await client.post(
+                "/api/sweets/not-an-id/reserve", headers=auth(user_token)
+            )
+            assert malformed.status_code == 404
+
+            confirmed = await client.post(
+                f"/api/sweets/reservations/{reservation_id}/confirm",
+                headers=auth(user_token),
+            )
+            assert confirmed.json()["status"] == "confirmed"
+            assert await stock(sweet_id) == (7, 0)
+
+            again = await client.post(
+                f"/api/sweets/reservations/{reservation_id}/release",
+                headers=auth(user_token),
+            )
+            assert again.status_code == 409
+
+            # A released hold goes back on sale
+            held = await client.post(
+                f"/api/sweets/{sweet_id}/reserve", headers=auth(user_token)
+            )
+            assert await stock(sweet_id) == (6, 1)
+            released = await client.post(
+                f"/api/sweets/reservations/{held.json()['_id']}/release",
+                headers=auth(user_token),
+            )
+            assert released.json()["status"] == "released"
+            assert await stock(sweet_id) == (7, 0)
+
+            await client.delete(f"/api/sweets/{sweet_id}", headers=auth(admin_token))
+
+
+@pytest.mark.asyncio
+async def test_expired_reservations_are_swept_back_into_stock():
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            res = await client.post(
+                "/api/sweets",
+                json={"name": "Abandoned Kaju", "category": "Reserved", "price": 12, "quantity": 5},
+                headers=auth(admin_token),
+            )
+            sweet_id = res.json()["_id"]
+
+            held = await client.post(
+                f"/api/sweets/{sweet_id}/reserve",
+                json={"quantity": 5},
+                headers=auth(user_token),
+            )
+            reservation_id = held.json()["_id"]
+
+            # The cart is abandoned past its expiry
+            await app.state.db["reservations"].update_one(
+                {"_id": ObjectId(reservation_id)},
+                {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}},
+            )
+
+            late = await client.post(
+                f"/api/sweets/reservations/{reservation_id}/confirm",
+                headers=auth(user_token),
+            )
+            assert late.status_code == 410
+            assert await stock(sweet_id) == (0, 5)
+
+            [released] = await release_expired(app.state.db, app.state.ledger)
+            assert released["quantity"] == 5
+            assert await release_expired(app.state.db, app.state.ledger) == []
+            assert await stock(sweet_id) == (5, 0)
+
+            after = await client.post(
+                f"/api/sweets/reservations/{reservation_id}/confirm",
+                headers=auth(user_token),
+            )
+            assert after.status_code == 410
+
+            purchase = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", headers=auth(user_token)
+            )
+            assert purchase.json()["quantity"] == 4
+
+            await client.delete(f"/api/sweets/{sweet_id}", headers=auth(admin_token))
+
+
+@pytest.mark.asyncio
+async def test_sweeper_survives_unexpected_errors():
+    sweeps = 0
+
+    class BrokenDb:
+        def __getitem__(self, name):
+            nonlocal sweeps
+            sweeps += 1
+            raise KeyError(name)
+
+    sweeper = ReservationSweeper(BrokenDb(), None, interval=0.01)
+    await sweeper.start()
+    await asyncio.sleep(0.05)
+    alive = not sweeper._task.done()
+    await sweeper.stop()
+
+    assert alive
+    assert sweeps > 1
@@ -0,0 +1,67 @@
+import json
+import os
+import time
+
+import pytest
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core.responses import FastJSONResponse
+
+SWEETS = 10_000
+
+
+def make_sweets(count):
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Sweet {i}",
+            "category": "Indian",
+            "price": 10.5,
+            "quantity": i,
+        }
+        for i in range(count)
+    ]
+
+
+def test_fast_response_serialises_object_ids():
+    sweet_id = ObjectId()
+    response = FastJSONResponse([{"_id": sweet_id, "name": "Ladoo"}])
+
+    assert json.loads(response.body) == [{"_id": str(sweet_id), "name": "Ladoo"}]
+    assert response.media_type == "application/json"
+
+
+@pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"),
+    reason="set RUN_BENCHMARKS=1 to run benchmarks",
+)
+def test_fast_response_benchmark():
+    def old_path():
+        sweets = make_sweets(SWEETS)
+        for sweet in sweets:
+            sweet["_id"] = str(sweet["_id"])
+        return JSONResponse(jsonable_encoder(sweets)).body
+
+    def fast_path():
+        return FastJSONResponse(make_sweets(SWEETS)).body
+
+    def best_of(run, repeat=5):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    # Document construction is included in both, so subtract it
+    build = best_of(lambda: make_sweets(SWEETS))
+    old = best_of(old_path) - build
+    fast = best_of(fast_path) - build
+
+    print(
+        f"\nserialising {SWEETS} sweets: {old:.1f} ms via jsonable_encoder, "
+        f"{fast:.1f} ms via FastJSONResponse ({old / fast:.0f}x)"
+    )
+    assert fast < old
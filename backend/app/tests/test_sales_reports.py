@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.db.memory import MemoryClient
+from app.repositories.ledger_repository import LedgerRepository, LedgerWriter
+
+admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+user_token = create_access_token({"sub": "ledger-user@test.com", "role": "user"})
+
+
+@pytest.mark.asyncio
+async def test_sales_report_from_rollups():
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            ids = []
+            for name, price in (("Ledger Laddu", 2.5), ("Ledger Lassi", 4.0)):
+                res = await client.post(
+                    "/api/sweets",
+                    json={"name": name, "category": "Ledger", "price": price, "quantity": 20},
+                )
+                ids.append(res.json()["_id"])
+            laddu, lassi = ids
+
+            await client.post(f"/api/sweets/{laddu}/purchase", json={"quantity": 2})
+            await client.post(
+                "/api/sweets/checkout",
+                json={"items": [
+                    {"sweet_id": laddu, "quantity": 1},
+                    {"sweet_id": lassi, "quantity": 3},
+                ]},
+            )
+            await client.post(f"/api/sweets/{lassi}/restock", json={"quantity": 5})
+            # Failed purchases leave no trace
+            await client.post(f"/api/sweets/{lassi}/purchase", json={"quantity": 99})
+
+            by_category = await client.get(
+                "/api/reports/sales", params={"category": "Ledger"}
+            )
+            by_sweet = await client.get(
+                "/api/reports/sales",
+                params={"category": "Ledger", "group": "sweet", "period": "hour"},
+            )
+            bad = await client.get("/api/reports/sales", params={"period": "week"})
+            forbidden = await client.get(
+                "/api/reports/sales",
+                headers={"Authorization": f"Bearer {user_token}"},
+            )
+
+            events = await app.state.db["inventory_events"].find(
+                {"sweet_id": ObjectId(laddu)}
+            ).to_list(length=None)
+
+            for sweet_id in ids:
+                await client.delete(f"/api/sweets/{sweet_id}")
+
+    [row] = by_category.json()["rows"]
+    assert row["key"] == "Ledger"
+    assert row["units_sold"] == 6
+    assert row["revenue"] == 2.5 * 3 + 4.0 * 3
+    assert row["units_restocked"] == 5
+
+    rows = {row["name"]: row for row in by_sweet.json()["rows"]}
+    assert rows["Ledger Laddu"]["units_sold"] == 3
+    assert rows["Ledger Laddu"]["events"] == 2
+    assert rows["Ledger Lassi"]["units_sold"] == 3
+    assert rows["Ledger Lassi"]["units_restocked"] == 5
+
+    assert sorted(event["kind"] for event in events) == ["checkout", "purchase"]
+    assert bad.status_code == 400
+    assert forbidden.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_ledger_retries_what_a_failover_lost():
+    db = MemoryClient()["ledger_retry"]
+    repository = LedgerRepository(db)
+    insert_many = repository.events.insert_many
+    attempts = 0
+
+    async def failover(documents, **kwargs):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            # The server takes the first event, then the connection drops
+            await insert_many(documents[:1], **kwargs)
+            raise AutoReconnect("primary stepped down")
+        return await insert_many(documents, **kwargs)
+
+    repository.events.insert_many = failover
+    writer = LedgerWriter(repository, interval=0.01)
+    sweet = {"_id": ObjectId(), "name": "Retry Rasgulla", "category": "Retry", "price": 2}
+
+    await writer.record("purchase", [(sweet, 1)])
+    await writer.record("purchase", [(sweet, 2)])
+    await writer.flush()
+    assert await db["inventory_events"].count_documents({}) == 1
+    assert await db["sales_rollups"].count_documents({}) == 0
+
+    # Back in the buffer, and written on the retry after the backoff
+    await asyncio.sleep(0.1)
+    await writer.flush()
+
+    assert attempts == 2
+    assert await db["inventory_events"].count_documents({}) == 2
+    rollup = await db["sales_rollups"].find_one(
+        {"period": "day", "scope": "sweet", "key": str(sweet["_id"])}
+    )
+    assert rollup["units_sold"] == 3
+    assert rollup["events"] == 2
@@ -0,0 +1,76 @@
+import os
+import time
+
+import pytest
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.db.indexes import INDEXES
+
+SWEETS = 100_000
+CATEGORIES = ["Indian", "Bakery", "Chocolate", "Candy", "Fusion"]
+
+pytestmark = [
+    pytest.mark.skipif(
+        not os.getenv("RUN_BENCHMARKS"),
+        reason="set RUN_BENCHMARKS=1 to run benchmarks",
+    ),
+    # Compares MongoDB's query plans, not the in-process engine's
+    pytest.mark.skipif(
+        os.getenv("STORAGE_BACKEND") != "mongo",
+        reason="measures MongoDB; set STORAGE_BACKEND=mongo",
+    ),
+]
+
+
+async def timed(cursor, repeat=5):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await cursor.clone().to_list(length=None)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+@pytest.mark.asyncio
+async def test_indexed_search_beats_collection_scan():
+    async with LifespanManager(app):
+        collection = app.state.db["sweets_index_benchmark"]
+        await collection.drop()
+        await collection.insert_many(
+            {
+                "name": f"Sweet {i} {CATEGORIES[i % 5]} delight",
+                "category": CATEGORIES[i % 5],
+                "price": float(i % 500),
+                "quantity": i % 50,
+            }
+            for i in range(SWEETS)
+        )
+        await collection.create_indexes(INDEXES["sweets"])
+
+        by_category = {"category": "Bakery", "price": {"$gte": 10, "$lte": 12}}
+        scan_filter = await timed(
+            collection.find(by_category).hint([("$natural", 1)])
+        )
+        index_filter = await timed(collection.find(by_category))
+
+        scan_name = await timed(
+            collection.find({"name": {"$regex": "Sweet 4242 ", "$options": "i"}})
+        )
+        index_name = await timed(
+            collection.find({"$text": {"$search": "4242"}})
+        )
+        prefix_name = await timed(
+            collection.find({"name": {"$regex": "^Sweet 4242 "}})
+        )
+
+        await collection.drop()
+
+    print(
+        f"\n{SWEETS} sweets (ms/query)"
+        f"\n  category+price  scan {scan_filter:8.2f}  index {index_filter:8.2f}"
+        f"\n  name            regex {scan_name:7.2f}  text {index_name:9.2f}"
+        f"  prefix {prefix_name:.2f}"
+    )
+
+    assert index_filter < scan_filter
+    assert index_name < scan_name
+    assert prefix_name < scan_name
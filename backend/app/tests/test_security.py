@@ -1,4 +1,17 @@
-from app.core.security import hash_password, verify_password
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.core import security
+from app.core.security import (
+    hash_password,
+    hash_password_async,
+    verify_and_update_password,
+    verify_and_update_password_async,
+    verify_password,
+)
 
 
 def test_password_is_hashed():
@@ -20,3 +33,41 @@ def test_verify_password_failure():
     hashed = hash_password("secret123")
 
     assert verify_password("wrongpassword", hashed) is False
+
+
+@pytest.mark.asyncio
+async def test_async_hashing_runs_off_the_event_loop():
+    hashed = await hash_password_async("secret123")
+    valid, new_hash = await verify_and_update_password_async("secret123", hashed)
+
+    assert valid is True
+    assert new_hash is None
+
+
+def test_outdated_hash_is_upgraded_on_verify():
+    cheap_context = CryptContext(
+        schemes=["argon2"], argon2__rounds=1, argon2__memory_cost=1024
+    )
+    old_hash = cheap_context.hash("secret123")
+
+    valid, new_hash = verify_and_update_password("secret123", old_hash)
+
+    assert valid is True
+    assert new_hash != old_hash
+    assert verify_password("secret123", new_hash) is True
+
+
+@pytest.mark.asyncio
+async def test_pool_sheds_load_beyond_queue_limit(monkeypatch):
+    monkeypatch.setattr(security, "PASSWORD_HASH_QUEUE_LIMIT", 0)
+    monkeypatch.setattr(security, "PASSWORD_HASH_WORKERS", 1)
+
+    results = await asyncio.gather(
+        hash_password_async("one"),
+        hash_password_async("two"),
+        return_exceptions=True,
+    )
+
+    assert results[0].startswith("$argon2")
+    assert isinstance(results[1], HTTPException)
+    assert results[1].status_code == 503
@@ -0,0 +1,293 @@
+import asyncio
+import os
+import time
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+from bson import ObjectId
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.repositories.stock_shard_repository import fill_levels
+
+admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+
+def test_fill_levels_raises_the_lowest_shards_first():
+    assert fill_levels([0, 0, 0], 7) == [3, 2, 2]
+    assert fill_levels([5, 0, 1], 4) == [0, 3, 1]
+    # Never takes from a shard, even when they are uneven
+    assert fill_levels([9, 0], 1) == [0, 1]
+    assert fill_levels([], 5) == []
+
+
+async def create_sweet(client, name, quantity):
+    res = await client.post(
+        "/api/sweets",
+        json={"name": name, "category": "Sharded", "price": 5, "quantity": quantity},
+    )
+    return res.json()["_id"]
+
+
+async def shard_levels(sweet_id):
+    shards = await app.state.db["stock_shards"].find(
+        {"sweet_id": ObjectId(sweet_id)}
+    ).to_list(length=None)
+    return sorted(shard["quantity"] for shard in shards)
+
+
+@pytest.mark.asyncio
+async def test_sharded_stock_lifecycle():
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_id = await create_sweet(client, "Sharded Barfi", 10)
+
+            res = await client.post(
+                f"/api/sweets/{sweet_id}/shards", json={"shards": 4}
+            )
+            assert res.status_code == 200
+            assert res.json()["quantity"] == 10
+            assert res.json()["shards"] == 4
+            assert await shard_levels(sweet_id) == [2, 2, 3, 3]
+
+            again = await client.post(
+                f"/api/sweets/{sweet_id}/shards", json={"shards": 4}
+            )
+            assert again.status_code == 409
+
+            malformed = await client.post(
+                "/api/sweets/not-an-id/shards", json={"shards": 4}
+            )
+            assert malformed.status_code == 404
+            malformed = await client.delete("/api/sweets/not-an-id/shards")
+            assert malformed.status_code == 404
+
+            # Listings report the shards added up, with or without fields
+            listed = await client.get(
+                "/api/sweets/search", params={"category": "Sharded"}
+            )
+            assert listed.json()[0]["quantity"] == 10
+            projected = await client.get(
+                "/api/sweets/search",
+                params={"category": "Sharded", "fields": "name,quantity"},
+            )
+            assert projected.json()[0] == {
+                "_id": sweet_id, "name": "Sharded Barfi", "quantity": 10
+            }
+
+            purchased = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", json={"quantity": 2}
+            )
+            assert purchased.json()["quantity"] == 8
+
+            restocked = await client.post(
+                f"/api/sweets/{sweet_id}/restock", json={"quantity": 4}
+            )
+            assert restocked.json()["quantity"] == 12
+            assert await shard_levels(sweet_id) == [3, 3, 3, 3]
+
+            # The quantity cannot be overwritten while it is sharded
+            update = await client.put(
+                f"/api/sweets/{sweet_id}", json={"quantity": 50}
+            )
+            assert update.status_code == 409
+
+            # Nor through the bulk paths, which report the row instead
+            bulk_set = await client.patch(
+                "/api/sweets/bulk",
+                json=[
+                    {"name": "Sharded Barfi", "quantity": 5},
+                    {"name": "Sharded Barfi", "price": 6},
+                ],
+            )
+            assert [e["row"] for e in bulk_set.json()["errors"]] == [0]
+            assert bulk_set.json()["modified"] == 1
+            bulk_upsert = await client.post(
+                "/api/sweets/bulk",
+                json=[
+                    {"name": "Sharded Barfi", "category": "Sharded", "price": 5, "quantity": 5}
+                ],
+            )
+            [error] = bulk_upsert.json()["errors"]
+            assert error["errors"].startswith("Stock is sharded")
+            assert bulk_upsert.json()["upserted"] == 0
+
+            cart = await client.post(
+                "/api/sweets/checkout",
+                json={"items": [{"sweet_id": sweet_id, "quantity": 3}]},
+            )
+            assert cart.json()["items"][0]["quantity"] == 9
+
+            res = await client.delete(f"/api/sweets/{sweet_id}/shards")
+            assert res.status_code == 200
+            assert res.json()["quantity"] == 9
+            assert "shards" not in res.json()
+            assert await shard_levels(sweet_id) == []
+
+            sweet = await app.state.db["sweets"].find_one(
+                {"_id": ObjectId(sweet_id)}
+            )
+            assert sweet["quantity"] == 9
+
+            await client.delete(f"/api/sweets/{sweet_id}")
+
+
+@pytest.mark.asyncio
+async def test_sharded_purchases_never_oversell():
+    stock, buyers = 100, 160
+    tokens = [
+        create_access_token({"sub": f"shard-buyer{i}@test.com", "role": "user"})
+        for i in range(buyers)
+    ]
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_id = await create_sweet(client, "Sharded Peda", stock)
+            await client.post(f"/api/sweets/{sweet_id}/shards", json={"shards": 8})
+
+            responses = await asyncio.gather(*[
+                client.post(
+                    f"/api/sweets/{sweet_id}/purchase",
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                for token in tokens
+            ])
+
+            # The last units sit on uneven shards; none may be stranded
+            assert [r.status_code for r in responses].count(200) == stock
+            assert await shard_levels(sweet_id) == [0] * 8
+
+            await client.delete(f"/api/sweets/{sweet_id}")
+            assert await shard_levels(sweet_id) == []
+
+
+@pytest.mark.asyncio
+async def test_purchases_larger_than_any_shard():
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_id = await create_sweet(client, "Sharded Soan Papdi", 8)
+            await client.post(f"/api/sweets/{sweet_id}/shards", json={"shards": 8})
+            # Base counter 2, and every shard holds 1
+            await app.state.db["sweets"].update_one(
+                {"_id": ObjectId(sweet_id)}, {"$inc": {"quantity": 2}}
+            )
+
+            purchase = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", json={"quantity": 3}
+            )
+            assert purchase.status_code == 200
+            assert purchase.json()["quantity"] == 7
+            assert await shard_levels(sweet_id) == [0, 0, 0, 1, 1, 1, 1, 1]
+
+            too_many = await client.post(
+                f"/api/sweets/{sweet_id}/purchase", json={"quantity": 10}
+            )
+            assert too_many.status_code == 400
+            # Nothing taken by the failed purchase is lost
+            assert sum(await shard_levels(sweet_id)) == 5
+
+            cart = await client.post(
+                "/api/sweets/checkout",
+                json={"items": [{"sweet_id": sweet_id, "quantity": 7}]},
+            )
+            assert cart.status_code == 200
+            assert cart.json()["items"][0]["quantity"] == 0
+            assert await shard_levels(sweet_id) == [0] * 8
+
+            await client.delete(f"/api/sweets/{sweet_id}")
+
+
+@pytest.mark.asyncio
+async def test_checkout_learns_about_shards_from_other_workers():
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            sweet_id = await create_sweet(client, "Sharded Jalebi", 6)
+            await client.post(f"/api/sweets/{sweet_id}/shards", json={"shards": 2})
+            # This worker forgets, as if another one had sharded it
+            app.state.sharded_sweets.clear()
+
+            cart = await client.post(
+                "/api/sweets/checkout",
+                json={"items": [{"sweet_id": sweet_id, "quantity": 3}]},
+            )
+            assert cart.status_code == 200
+            assert cart.json()["items"][0]["quantity"] == 3
+
+            app.state.sharded_sweets.clear()
+            purchase = await client.post(f"/api/sweets/{sweet_id}/purchase")
+            assert purchase.json()["quantity"] == 2
+
+            await client.delete(f"/api/sweets/{sweet_id}")
+
+
+@pytest.mark.skipif(
+    os.getenv("RUN_BENCHMARKS") != "1", reason="set RUN_BENCHMARKS=1 to run"
+)
+# Shards pay off on server-side write contention, which the in-process
+# engine does not have
+@pytest.mark.skipif(
+    os.getenv("STORAGE_BACKEND") != "mongo",
+    reason="measures MongoDB; set STORAGE_BACKEND=mongo",
+)
+@pytest.mark.asyncio
+async def test_sharded_counter_throughput():
+    buyers = 2000
+    tokens = [
+        create_access_token({"sub": f"bench-buyer{i}@test.com", "role": "user"})
+        for i in range(buyers)
+    ]
+    timings = {}
+
+    async with LifespanManager(app):
+        app.state.rate_limit_backend = None
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            for shards in (0, 16):
+                sweet_id = await create_sweet(client, f"Hot Ladoo {shards}", buyers)
+                if shards:
+                    await client.post(
+                        f"/api/sweets/{sweet_id}/shards", json={"shards": shards}
+                    )
+
+                started = time.perf_counter()
+                responses = await asyncio.gather(*[
+                    client.post(
+                        f"/api/sweets/{sweet_id}/purchase",
+                        headers={"Authorization": f"Bearer {token}"}
+                    )
+                    for token in tokens
+                ])
+                timings[shards] = time.perf_counter() - started
+
+                assert all(r.status_code == 200 for r in responses)
+                await client.delete(f"/api/sweets/{sweet_id}")
+
+    print(
+        f"\n{buyers} purchases: single counter {timings[0]:.2f}s, "
+        f"16 shards {timings[16]:.2f}s"
+    )
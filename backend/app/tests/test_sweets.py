@@ -28,9 +28,21 @@ async def test_create_sweet_admin_only():
                     "quantity": 100
                 }
             )
+            # Names identify sweets (bulk imports upsert by name)
+            duplicate = await client.post(
+                "/api/sweets",
+                json={
+                    "name": "Ladoo",
+                    "category": "Indian",
+                    "price": 12.0,
+                    "quantity": 5
+                }
+            )
+            await client.delete(f"/api/sweets/{response.json()['_id']}")
 
     assert response.status_code == 201
     assert response.json()["name"] == "Ladoo"
+    assert duplicate.status_code == 409
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,133 @@
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.jwt import create_access_token
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_upserts_by_name_and_reports_bad_rows():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            imported = await client.post(
+                "/api/sweets/bulk",
+                json=[
+                    {"name": "Bulk Chikki", "category": "Bulk", "price": 4, "quantity": 10},
+                    {"name": "Bulk Pinni", "category": "Bulk", "price": "cheap", "quantity": 5},
+                    {"name": "Bulk Chikki", "category": "Bulk", "price": 5, "quantity": 12},
+                ]
+            )
+            repriced = await client.patch(
+                "/api/sweets/bulk",
+                json=[
+                    {"name": "Bulk Chikki", "price": 6},
+                    {"name": "Bulk Chikki"},
+                ]
+            )
+            chikki = await app.state.db["sweets"].find(
+                {"name": "Bulk Chikki"}
+            ).to_list(length=None)
+
+        await app.state.db["sweets"].delete_many({"category": "Bulk"})
+
+    report = imported.json()
+    assert imported.status_code == 200
+    assert report["received"] == 3
+    assert [error["row"] for error in report["errors"]] == [1]
+    assert repriced.json()["modified"] == 1
+    assert [error["row"] for error in repriced.json()["errors"]] == [1]
+    assert len(chikki) == 1
+    assert chikki[0]["price"] == 6
+    assert chikki[0]["quantity"] == 12
+
+
+@pytest.mark.asyncio
+async def test_bulk_upload_streams_ndjson_and_csv():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+    ndjson = (
+        '{"name": "Upload Kheer", "category": "Upload", "price": 7, "quantity": 3}\n'
+        "not json\n"
+        '{"name": "Upload Phirni", "category": "Upload", "price": 8, "quantity": 2}\n'
+    )
+    # With the byte order mark Excel puts in front of its CSV exports
+    csv_body = (
+        "\ufeffname,category,price,quantity\n"
+        "Upload Sandesh,Upload,9.5,4\n"
+        '"Upload Mysore Pak, Ghee",Upload,11,1\n'
+    )
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            from_ndjson = await client.post(
+                "/api/sweets/bulk/upload",
+                content=ndjson,
+                headers={"Content-Type": "application/x-ndjson"}
+            )
+            from_csv = await client.post(
+                "/api/sweets/bulk/upload",
+                content=csv_body,
+                headers={"Content-Type": "text/csv"}
+            )
+            uploaded = await app.state.db["sweets"].count_documents(
+                {"category": "Upload"}
+            )
+
+        await app.state.db["sweets"].delete_many({"category": "Upload"})
+
+    assert from_ndjson.json()["received"] == 3
+    assert [error["row"] for error in from_ndjson.json()["errors"]] == [1]
+    assert from_csv.json()["received"] == 2
+    assert from_csv.json()["errors"] == []
+    assert uploaded == 4
+
+
+@pytest.mark.asyncio
+async def test_bulk_upload_decodes_characters_split_across_chunks():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+    body = (
+        '{"name": "Upload Rasgull\u0101", "category": "Upload", "price": 6, "quantity": 4}\n'
+    ).encode()
+    split = body.index("\u0101".encode()) + 1
+
+    async def chunks():
+        # The two bytes of the accented letter arrive separately
+        yield body[:split]
+        yield body[split:]
+        yield b'{"name": "Upload \xff", "category": "Upload", "price": 1, "quantity": 1}\n'
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            uploaded = await client.post(
+                "/api/sweets/bulk/upload",
+                content=chunks(),
+                headers={"Content-Type": "application/x-ndjson"}
+            )
+            sweet = await app.state.db["sweets"].find_one({"category": "Upload"})
+
+        await app.state.db["sweets"].delete_many({"category": "Upload"})
+
+    assert uploaded.status_code == 200
+    assert uploaded.json()["received"] == 2
+    assert [error["row"] for error in uploaded.json()["errors"]] == [1]
+    assert sweet["name"] == "Upload Rasgull\u0101"
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.jwt import create_access_token
+
+
+@pytest.mark.asyncio
+async def test_export_streams_whole_catalogue():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            for index in range(3):
+                await client.post(
+                    "/api/sweets",
+                    json={
+                        "name": f"Export Sweet {index}",
+                        "category": "Exported",
+                        "price": 5,
+                        "quantity": 10
+                    }
+                )
+
+            async with client.stream(
+                "GET", "/api/sweets/export", params={"batch_size": 2}
+            ) as response:
+                lines = [line async for line in response.aiter_lines() if line]
+
+            as_array = await client.get(
+                "/api/sweets/export", params={"format": "json", "batch_size": 2}
+            )
+
+        await app.state.db["sweets"].delete_many({"category": "Exported"})
+
+    exported = [json.loads(line) for line in lines]
+    names = {s["name"] for s in exported if s["category"] == "Exported"}
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert names == {"Export Sweet 0", "Export Sweet 1", "Export Sweet 2"}
+    assert len(as_array.json()) == len(exported)
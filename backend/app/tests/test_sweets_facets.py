@@ -0,0 +1,117 @@
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.jwt import create_access_token
+from app.repositories import sweet_repository
+
+SWEETS = [
+    ("Facet Barfi", "FacetIndian", 4, 3),
+    ("Facet Jalebi", "FacetIndian", 8, 0),
+    ("Facet Laddu", "FacetIndian", 15, 2),
+    ("Facet Brownie", "FacetBakery", 9, 5),
+    ("Facet Truffle", "FacetBakery", 120, 1),
+]
+
+
+@pytest.mark.asyncio
+async def test_facets_count_categories_prices_and_stock(monkeypatch):
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            await client.post(
+                "/api/sweets/bulk",
+                json=[
+                    {"name": n, "category": c, "price": p, "quantity": q}
+                    for n, c, p, q in SWEETS
+                ]
+            )
+
+            facets = await client.get(
+                "/api/sweets/facets", params={"name": "Facet", "match": "prefix"}
+            )
+            bakery = await client.get(
+                "/api/sweets/facets", params={"category": "FacetBakery"}
+            )
+            # Ranges that do not start at 0: the 4.00 barfi is below them,
+            # not in the open-ended top range
+            monkeypatch.setattr(
+                sweet_repository, "PRICE_FACET_BOUNDARIES", [5, 10, 100]
+            )
+            if app.state.catalogue_cache:
+                app.state.catalogue_cache.clear()
+            narrowed = await client.get(
+                "/api/sweets/facets", params={"name": "Facet", "match": "prefix"}
+            )
+            searched = await client.get(
+                "/api/sweets/search",
+                params={"category": "FacetIndian", "max_price": 10, "facets": "true"}
+            )
+
+        await app.state.db["sweets"].delete_many(
+            {"category": {"$in": ["FacetIndian", "FacetBakery"]}}
+        )
+
+    body = facets.json()
+    assert body["total"] == 5
+    assert body["in_stock"] == 4
+    assert body["categories"] == [
+        {"category": "FacetIndian", "count": 3},
+        {"category": "FacetBakery", "count": 2},
+    ]
+    counts = {r["min"]: r["count"] for r in body["price_ranges"]}
+    assert counts == {0: 1, 5: 2, 10: 1, 20: 0, 50: 0, 100: 1}
+    assert body["price_ranges"][-1]["max"] is None
+    assert body["prices_out_of_range"] == 0
+
+    narrowed = narrowed.json()
+    counts = {r["min"]: r["count"] for r in narrowed["price_ranges"]}
+    assert counts == {5: 2, 10: 1, 100: 1}
+    assert narrowed["prices_out_of_range"] == 1
+
+    assert bakery.json()["total"] == 2
+
+    page = searched.json()
+    assert sorted(s["name"] for s in page["items"]) == ["Facet Barfi", "Facet Jalebi"]
+    assert page["next_cursor"] is None
+    assert page["facets"]["total"] == 2
+    assert page["facets"]["in_stock"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sold_out_sharded_sweets_are_not_in_stock():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            res = await client.post(
+                "/api/sweets",
+                json={"name": "Facet Peda", "category": "FacetSharded", "price": 6, "quantity": 2}
+            )
+            sweet_id = res.json()["_id"]
+            await client.post(f"/api/sweets/{sweet_id}/shards", json={"shards": 2})
+
+            params = {"category": "FacetSharded"}
+            stocked = await client.get("/api/sweets/facets", params=params)
+            await client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 2})
+            sold_out = await client.get("/api/sweets/facets", params=params)
+
+            await client.delete(f"/api/sweets/{sweet_id}")
+
+    assert stocked.json()["in_stock"] == 1
+    assert sold_out.json()["total"] == 1
+    assert sold_out.json()["in_stock"] == 0
@@ -0,0 +1,71 @@
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.core.jwt import create_access_token
+
+
+@pytest.mark.asyncio
+async def test_search_pages_with_cursor_and_projection():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            for index, price in enumerate([40, 10, 30, 10, 20]):
+                await client.post(
+                    "/api/sweets",
+                    json={
+                        "name": f"Paged Sweet {index}",
+                        "category": "Paginated",
+                        "price": price,
+                        "quantity": 1
+                    }
+                )
+
+            pages = []
+            after = None
+            while True:
+                params = {
+                    "category": "Paginated",
+                    "limit": 2,
+                    "sort": "price",
+                    "fields": "name",
+                }
+                if after:
+                    params["after"] = after
+                response = await client.get("/api/sweets/search", params=params)
+                assert response.status_code == 200
+                pages.append(response.json()["items"])
+                after = response.json()["next_cursor"]
+                if not after:
+                    break
+
+            bad_cursor = await client.get(
+                "/api/sweets", params={"limit": 2, "after": "not-a-cursor"}
+            )
+            bad_field = await client.get(
+                "/api/sweets", params={"limit": 2, "fields": "secret"}
+            )
+
+        await app.state.db["sweets"].delete_many({"category": "Paginated"})
+
+    names = [sweet["name"] for page in pages for sweet in page]
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert names == [
+        "Paged Sweet 1",
+        "Paged Sweet 3",
+        "Paged Sweet 4",
+        "Paged Sweet 2",
+        "Paged Sweet 0",
+    ]
+    assert set(pages[0][0]) == {"_id", "name"}
+    assert bad_cursor.status_code == 400
+    assert bad_field.status_code == 400
@@ -18,7 +18,7 @@ async def test_search_sweets_by_name():
             base_url="http://test",
             headers={"Authorization": f"Bearer {admin_token}"}
         ) as client:
-            await client.post(
+            created = await client.post(
                 "/api/sweets",
                 json={
                     "name": "Kaju Katli",
@@ -31,6 +31,12 @@ async def test_search_sweets_by_name():
             response = await client.get(
                 "/api/sweets/search?name=Kaju"
             )
+            # Without a match mode the name is a case-insensitive substring
+            substring = await client.get(
+                "/api/sweets/search?name=ju kat"
+            )
+            await client.delete(f"/api/sweets/{created.json()['_id']}")
 
     assert response.status_code == 200
     assert len(response.json()) >= 1
+    assert "Kaju Katli" in [sweet["name"] for sweet in substring.json()]
@@ -4,6 +4,7 @@ from asgi_lifespan import LifespanManager
 
 from app.main import app
 from app.core.jwt import create_access_token
+from app.core.metrics import MONGO_COMMANDS
 
 
 @pytest.mark.asyncio
@@ -71,3 +72,70 @@ async def test_delete_sweet_admin_only():
             delete_res = await client.delete(f"/api/sweets/{sweet_id}")
 
     assert delete_res.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_update_and_restock_take_one_round_trip():
+    admin_token = create_access_token({"sub": "admin@test.com", "role": "admin"})
+
+    def commands():
+        return {
+            name: MONGO_COMMANDS.value(name, "success")
+            for name in ("findAndModify", "find", "update", "insert")
+        }
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ) as client:
+            res = await client.post(
+                "/api/sweets",
+                json={
+                    "name": "Gulab Jamun",
+                    "category": "Indian",
+                    "price": 15,
+                    "quantity": 4
+                }
+            )
+            sweet_id = res.json()["_id"]
+            # The ledger is written after the requests, not during them
+            app.state.ledger.interval = 60
+
+            before = commands()
+            updated = await client.put(
+                f"/api/sweets/{sweet_id}",
+                json={"price": 18, "secret": "ignored"}
+            )
+            restocked = await client.post(
+                f"/api/sweets/{sweet_id}/restock",
+                json={"quantity": 6}
+            )
+            after = commands()
+            await app.state.ledger.flush()
+            flushed = commands()
+
+            invalid = await client.put(
+                f"/api/sweets/{sweet_id}",
+                json={"price": "expensive"}
+            )
+            empty = await client.put(f"/api/sweets/{sweet_id}", json={})
+
+            await client.delete(f"/api/sweets/{sweet_id}")
+
+    assert updated.status_code == 200
+    assert updated.json()["price"] == 18
+    assert "secret" not in updated.json()
+    assert restocked.json()["quantity"] == 10
+    assert after["findAndModify"] - before["findAndModify"] == 2
+    assert after["find"] == before["find"]
+    assert after["update"] == before["update"]
+    assert after["insert"] == before["insert"]
+    # One event insert and one rollup bulk_write for the restock
+    assert flushed["insert"] - after["insert"] == 1
+    assert flushed["update"] - after["update"] == 1
+    assert invalid.status_code == 422
+    assert empty.status_code == 400
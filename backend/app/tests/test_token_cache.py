@@ -0,0 +1,89 @@
+import os
+import time
+from datetime import timedelta
+
+import pytest
+import httpx
+from asgi_lifespan import LifespanManager
+from fastapi import HTTPException
+
+from app.main import app
+from app.core import dependencies
+from app.core.jwt import create_access_token
+
+
+def test_verified_claims_are_cached():
+    token = create_access_token({"sub": "cache@test.com", "role": "user"})
+
+    first = dependencies.verify_token(token)
+    second = dependencies.verify_token(token)
+
+    assert first["sub"] == "cache@test.com"
+    assert second is first
+
+
+def test_tampered_and_expired_tokens_are_rejected():
+    token = create_access_token({"sub": "cache@test.com", "role": "user"})
+    dependencies.verify_token(token)
+    expired = create_access_token(
+        {"sub": "cache@test.com", "role": "user"},
+        expires_delta=timedelta(seconds=-1),
+    )
+
+    with pytest.raises(HTTPException) as tampered_error:
+        dependencies.verify_token(token[:-2] + "xx")
+    with pytest.raises(HTTPException) as expired_error:
+        dependencies.verify_token(expired)
+
+    assert tampered_error.value.status_code == 401
+    assert expired_error.value.status_code == 401
+
+
+@pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"),
+    reason="set RUN_BENCHMARKS=1 to run benchmarks",
+)
+@pytest.mark.asyncio
+async def test_token_cache_throughput(monkeypatch):
+    token = create_access_token({"sub": "bench@test.com", "role": "user"})
+    requests = 2000
+
+    async def requests_per_second(client):
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get("/api/sweets", params={"limit": 1})
+            assert response.status_code == 200
+        return requests / (time.perf_counter() - started)
+
+    def verify_micros():
+        started = time.perf_counter()
+        for _ in range(requests):
+            dependencies.verify_token(token)
+        return (time.perf_counter() - started) / requests * 1e6
+
+    cache = dependencies.token_cache
+
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {token}"}
+        ) as client:
+            await requests_per_second(client)  # warm-up
+
+            monkeypatch.setattr(dependencies, "token_cache", None)
+            uncached = await requests_per_second(client)
+            uncached_verify = verify_micros()
+
+            monkeypatch.setattr(dependencies, "token_cache", cache)
+            cached = await requests_per_second(client)
+            cached_verify = verify_micros()
+
+    print(
+        f"\nGET /api/sweets: {uncached:.0f} req/s without token cache, "
+        f"{cached:.0f} req/s with it"
+        f"\nverify_token: {uncached_verify:.1f} us without cache, "
+        f"{cached_verify:.1f} us with it"
+    )
+    assert cached_verify < uncached_verify